@@ -1,5 +1,6 @@
 import os
 import numpy as np
+import load_trace
 
 
 RANDOM_SEED = 42
@@ -18,6 +19,122 @@ NOISE_HIGH = 1.1
 VIDEO_FOLDER = './videos/'
 COOKED_TRACE_FOLDER = './cooked_traces/'
 
+
+def make_trace_index(cooked_time, cooked_bw):
+	"""
+	Returns (slot_time, slot_bw, cum_bytes) as numpy arrays, where
+	cum_bytes[i] is the number of bytes deliverable in mahimahi slots
+	1..i. Slot i ends at cooked_time[i] and starts at cooked_time[i - 1],
+	except slot 1 which starts at time 0 (it is only downloaded in full
+	after looping back to the beginning of the trace).
+	"""
+	slot_time = np.asarray(cooked_time, dtype=np.float64)
+	slot_bw = np.asarray(cooked_bw, dtype=np.float64)
+	assert len(slot_time) == len(slot_bw)
+
+	duration = np.zeros(len(slot_time))
+	duration[1] = slot_time[1]
+	duration[2:] = slot_time[2:] - slot_time[1:-1]
+
+	throughput = slot_bw * B_IN_MB / BITS_IN_BYTE
+	packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+	packet_payload[0] = 0
+
+	return slot_time, slot_bw, np.cumsum(packet_payload)
+
+
+def download_chunk(trace_index, mahimahi_ptr, last_mahimahi_time, video_chunk_size):
+	"""
+	Delivers video_chunk_size bytes starting from last_mahimahi_time
+	within slot mahimahi_ptr. The slot where the download completes is
+	found by a binary search on the cumulative bytes.
+	Returns (delay in sec, mahimahi_ptr, last_mahimahi_time).
+	"""
+	slot_time, slot_bw, cum_bytes = trace_index
+
+	# the current slot is partly used already
+	throughput = slot_bw[mahimahi_ptr] * B_IN_MB / BITS_IN_BYTE
+	duration = slot_time[mahimahi_ptr] - last_mahimahi_time
+
+	packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+
+	if packet_payload > video_chunk_size:
+		fractional_time = video_chunk_size / throughput / PACKET_PAYLOAD_PORTION
+		return fractional_time, mahimahi_ptr, last_mahimahi_time + fractional_time
+
+	video_chunk_counter_sent = packet_payload  # in bytes
+	delay = duration  # in sec
+	last_mahimahi_time = slot_time[mahimahi_ptr]
+	mahimahi_ptr += 1
+
+	if mahimahi_ptr >= len(slot_bw):
+		# loop back in the beginning
+		# note: trace file starts with time 0
+		mahimahi_ptr = 1
+		last_mahimahi_time = 0
+
+	while True:
+		target = video_chunk_size - video_chunk_counter_sent + cum_bytes[mahimahi_ptr - 1]
+		if cum_bytes[-1] > target:
+			break
+
+		# the rest of the trace is not enough, loop back in the beginning
+		video_chunk_counter_sent += cum_bytes[-1] - cum_bytes[mahimahi_ptr - 1]
+		delay += slot_time[-1] - last_mahimahi_time
+		mahimahi_ptr = 1
+		last_mahimahi_time = 0
+
+	# first slot in which the sent bytes exceed the chunk size
+	end_ptr = max(int(np.searchsorted(cum_bytes, target, side='right')), mahimahi_ptr)
+	if end_ptr > mahimahi_ptr:
+		video_chunk_counter_sent += cum_bytes[end_ptr - 1] - cum_bytes[mahimahi_ptr - 1]
+		delay += slot_time[end_ptr - 1] - last_mahimahi_time
+		last_mahimahi_time = slot_time[end_ptr - 1]
+		mahimahi_ptr = end_ptr
+
+	throughput = slot_bw[mahimahi_ptr] * B_IN_MB / BITS_IN_BYTE
+	fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
+					  throughput / PACKET_PAYLOAD_PORTION
+	delay += fractional_time
+	last_mahimahi_time += fractional_time
+
+	return delay, mahimahi_ptr, last_mahimahi_time
+
+
+def skip_trace(trace_index, mahimahi_ptr, last_mahimahi_time, sleep_time):
+	"""
+	Skips sleep_time (in ms) of the trace without downloading. The slot
+	where the sleep ends is found by a binary search on the slot times.
+	Returns (sleep time left in the final slot in ms, mahimahi_ptr,
+	last_mahimahi_time).
+	"""
+	slot_time = trace_index[0]
+
+	while True:
+		target = last_mahimahi_time + sleep_time / MILLISECONDS_IN_SECOND
+		if slot_time[-1] > target:
+			break
+
+		# sleep beyond the end of the trace
+		sleep_time -= (slot_time[-1] - last_mahimahi_time) * MILLISECONDS_IN_SECOND
+
+		# loop back in the beginning
+		# note: trace file starts with time 0
+		mahimahi_ptr = 1
+		last_mahimahi_time = 0
+
+	# first slot that ends after the sleep
+	end_ptr = max(int(np.searchsorted(slot_time, target, side='right')), mahimahi_ptr)
+	if end_ptr > mahimahi_ptr:
+		sleep_time -= (slot_time[end_ptr - 1] - last_mahimahi_time) * MILLISECONDS_IN_SECOND
+		last_mahimahi_time = slot_time[end_ptr - 1]
+		mahimahi_ptr = end_ptr
+
+	last_mahimahi_time += sleep_time / MILLISECONDS_IN_SECOND
+
+	return sleep_time, mahimahi_ptr, last_mahimahi_time
+
+
 class Environment:
 	def __init__(self, 
 				 random_seed=RANDOM_SEED, 
@@ -32,23 +149,10 @@ class Environment:
 		self.video_folder = video_folder
 
 		# -- network traces --
-		cooked_files = os.listdir(self.trace_folder)
-		self.all_cooked_time = []
-		self.all_cooked_bw = []
-		self.all_file_names = []
-		for cooked_file in cooked_files:
-			file_path = self.trace_folder + cooked_file
-			cooked_time = []
-			cooked_bw = []
-			# print file_path
-			with open(file_path, 'rb') as f:
-				for line in f:
-					parse = line.split()
-					cooked_time.append(float(parse[0]))
-					cooked_bw.append(float(parse[1]))
-			self.all_cooked_time.append(cooked_time)
-			self.all_cooked_bw.append(cooked_bw)
-			self.all_file_names.append(cooked_file)
+		self.all_cooked_time, self.all_cooked_bw, self.all_file_names = \
+			load_trace.load_trace(self.trace_folder)
+		self.all_trace_index = [make_trace_index(cooked_time, cooked_bw) for
+								cooked_time, cooked_bw in zip(self.all_cooked_time, self.all_cooked_bw)]
 
 		if self.fixed_env:
 			self.trace_idx = 0
@@ -57,6 +161,7 @@ class Environment:
 			
 		self.cooked_time = self.all_cooked_time[self.trace_idx]
 		self.cooked_bw = self.all_cooked_bw[self.trace_idx]
+		self.trace_index = self.all_trace_index[self.trace_idx]
 
 		if self.fixed_env:
 			self.mahimahi_ptr = 1
@@ -128,36 +233,10 @@ class Environment:
 		video_chunk_size = self.video_sizes[self.video_idx][self.chunk_idx][quality] * B_IN_MB  # in bytes
 		
 		# use the delivery opportunity in mahimahi
-		delay = 0.0  # in ms
-		video_chunk_counter_sent = 0  # in bytes
-		
-		while True:  # download video chunk over mahimahi
-			throughput = self.cooked_bw[self.mahimahi_ptr] \
-						 * B_IN_MB / BITS_IN_BYTE
-			duration = self.cooked_time[self.mahimahi_ptr] \
-					   - self.last_mahimahi_time
-		
-			packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
-
-			if video_chunk_counter_sent + packet_payload > video_chunk_size:
-
-				fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
-								  throughput / PACKET_PAYLOAD_PORTION
-				delay += fractional_time
-				self.last_mahimahi_time += fractional_time
-				assert(self.last_mahimahi_time <= self.cooked_time[self.mahimahi_ptr])
-				break
-
-			video_chunk_counter_sent += packet_payload
-			delay += duration
-			self.last_mahimahi_time = self.cooked_time[self.mahimahi_ptr]
-			self.mahimahi_ptr += 1
-
-			if self.mahimahi_ptr >= len(self.cooked_bw):
-				# loop back in the beginning
-				# note: trace file starts with time 0
-				self.mahimahi_ptr = 1
-				self.last_mahimahi_time = 0
+		delay, self.mahimahi_ptr, self.last_mahimahi_time = \
+			download_chunk(self.trace_index, self.mahimahi_ptr,
+						   self.last_mahimahi_time, video_chunk_size)  # in sec
+		assert(self.last_mahimahi_time <= self.cooked_time[self.mahimahi_ptr])
 
 		delay *= MILLISECONDS_IN_SECOND
 		delay += LINK_RTT
@@ -186,21 +265,9 @@ class Environment:
 						 DRAIN_BUFFER_SLEEP_TIME
 			self.buffer_size -= sleep_time
 
-			while True:
-				duration = self.cooked_time[self.mahimahi_ptr] \
-						   - self.last_mahimahi_time
-				if duration > sleep_time / MILLISECONDS_IN_SECOND:
-					self.last_mahimahi_time += sleep_time / MILLISECONDS_IN_SECOND
-					break
-				sleep_time -= duration * MILLISECONDS_IN_SECOND
-				self.last_mahimahi_time = self.cooked_time[self.mahimahi_ptr]
-				self.mahimahi_ptr += 1
-
-				if self.mahimahi_ptr >= len(self.cooked_bw):
-					# loop back in the beginning
-					# note: trace file starts with time 0
-					self.mahimahi_ptr = 1
-					self.last_mahimahi_time = 0
+			sleep_time, self.mahimahi_ptr, self.last_mahimahi_time = \
+				skip_trace(self.trace_index, self.mahimahi_ptr,
+						   self.last_mahimahi_time, sleep_time)
 
 		# the "last buffer size" return to the controller
 		# Note: in old version of dash the lowest buffer is 0.
@@ -227,6 +294,7 @@ class Environment:
 
 			self.cooked_time = self.all_cooked_time[self.trace_idx]
 			self.cooked_bw = self.all_cooked_bw[self.trace_idx]
+			self.trace_index = self.all_trace_index[self.trace_idx]
 
 			if self.fixed_env:
 				self.mahimahi_ptr = 1
@@ -0,0 +1,161 @@
+import os
+import sys
+import Queue
+import time
+import struct
+import threading
+
+
+# chunk decision log of the ABR servers, written by a background thread:
+# a request only puts a record on a bounded queue, the thread drains the
+# queue, writes what it got in one go, flushes and sleeps for a while. records
+# are fixed-width binary (RECORD) or the tab separated text columns of
+# plot_results.py; read_log.py converts binary logs to the text columns
+# in format of time_stamp bit_rate buffer_size rebuffer_time video_chunk_size download_time reward [session]
+CHUNK = 0
+END_OF_VIDEO = 1  # a blank line in the text log
+SESSION = 2  # names the session index of the records that follow
+# kind, time_stamp (sec), bit_rate (Kbps), buffer_size (sec), rebuffer_time (sec),
+# video_chunk_size (bytes), download_time (ms), reward, session index (0 for none)
+RECORD = struct.Struct('<BdHddIddI')
+# kind, session index, name length, followed by the name
+SESSION_RECORD = struct.Struct('<BIH')
+MAX_SESSIONS = 10000  # session names kept by the writer, then the indices start over
+QUEUE_SIZE = 10000  # records, a full queue blocks the requests
+WRITE_BATCH = 1000  # records per write
+WRITE_INTERVAL = 0.1  # sec, the writer sleeps between writes to batch more records
+BINARY_DIR_SUFFIX = '_binary'
+MAX_BIT_RATE = 2 ** 16 - 1  # Kbps, the 'H' of RECORD
+MAX_CHUNK_SIZE = 2 ** 32 - 1  # bytes, the 'I' of RECORD
+
+
+def get_binary_path(log_file_path):
+    # ./results/log_RL_trace -> ./results_binary/log_RL_trace, so that the
+    # results folder only holds text logs
+    log_dir, log_name = os.path.split(log_file_path)
+    return os.path.join(log_dir + BINARY_DIR_SUFFIX, log_name)
+
+
+def format_record(record, to_string=str):
+    # the line of the record in the text log, read_log.py passes repr so
+    # that the floats of a binary log keep all their digits
+    if record[0] == END_OF_VIDEO:
+        return '\n'  # so that in the log we know where video ends
+    line = '\t'.join(to_string(value) for value in record[1:-1])
+    if record[-1]:
+        line += '\t' + record[-1]
+    return line + '\n'
+
+
+def read_records(log_file):
+    # chunk and end of video records of a binary log with their session
+    # names, a partly written last record is skipped
+    sessions = {0: ''}
+    while True:
+        kind = log_file.read(1)
+        if not kind:
+            break
+        if ord(kind) == SESSION:
+            data = kind + log_file.read(SESSION_RECORD.size - 1)
+            if len(data) < SESSION_RECORD.size:
+                break
+            _, index, length = SESSION_RECORD.unpack(data)
+            sessions[index] = log_file.read(length)
+            continue
+        data = kind + log_file.read(RECORD.size - 1)
+        if len(data) < RECORD.size:
+            break
+        record = list(RECORD.unpack(data))
+        record[-1] = sessions[record[-1]]
+        yield record
+
+
+class AbrLogger(object):
+    def __init__(self, log_file_path, binary=True, queue_size=QUEUE_SIZE):
+        self.binary = binary
+        self.log_file_path = log_file_path
+        if binary:
+            self.log_file_path = get_binary_path(log_file_path)
+        log_dir = os.path.dirname(self.log_file_path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        self.log_file = open(self.log_file_path, 'wb')
+
+        self.sessions = {'': 0}  # session name -> index, only used by the writer
+
+        self.records = Queue.Queue(queue_size)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def log_chunk(self, bit_rate, buffer_size, rebuffer_time, video_chunk_size,
+                  download_time, reward, session=''):
+        # converted and written by the writer thread
+        self.records.put((CHUNK, time.time(), bit_rate, buffer_size, rebuffer_time,
+                          video_chunk_size, download_time, reward, session))
+
+    def log_end_of_video(self, session=''):
+        self.records.put((END_OF_VIDEO, time.time(), 0, 0, 0, 0, 0, 0, session))
+
+    def pack_record(self, record):
+        kind, time_stamp, bit_rate, buffer_size, rebuffer_time, \
+            video_chunk_size, download_time, reward, session = record
+        session = str(session)
+        new_session = session not in self.sessions
+        if new_session and len(self.sessions) > MAX_SESSIONS:
+            self.sessions = {'': 0}
+        index = self.sessions.get(session, len(self.sessions))
+        # clamped to what RECORD holds, the text log keeps the raw values
+        bit_rate = min(max(int(bit_rate), 0), MAX_BIT_RATE)
+        rebuffer_time = max(float(rebuffer_time), 0.0)
+        video_chunk_size = min(max(int(video_chunk_size), 0), MAX_CHUNK_SIZE)
+        # packed before the session is kept, so a record that fails leaves no
+        # session without its SESSION record
+        data = RECORD.pack(kind, float(time_stamp), bit_rate, float(buffer_size),
+                           rebuffer_time, video_chunk_size, float(download_time),
+                           float(reward), index)
+        if new_session:
+            self.sessions[session] = index
+            data = SESSION_RECORD.pack(SESSION, index, len(session)) + session + data
+        return data
+
+    def write_record(self, record):
+        # the data of the record, a record that cannot be written is dropped
+        # so that the writer keeps going and the requests never block
+        try:
+            if self.binary:
+                return self.pack_record(record)
+            return format_record(record)
+        except (struct.error, TypeError, ValueError) as e:
+            sys.stderr.write('abr_log: dropped ' + repr(record) + ': ' + str(e) + '\n')
+            return ''
+
+    def run(self):
+        closed = False
+        while not closed:
+            records = [self.records.get()]
+            while len(records) < WRITE_BATCH:
+                try:
+                    records.append(self.records.get_nowait())
+                except Queue.Empty:
+                    break
+
+            # close() puts None after the last record
+            closed = records[-1] is None
+            records = [record for record in records if record is not None]
+            self.log_file.write(''.join(self.write_record(record) for record in records))
+            self.log_file.flush()
+            if not closed:
+                time.sleep(WRITE_INTERVAL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # writes the records still queued and closes the file
+        self.records.put(None)
+        self.thread.join()
+        self.log_file.close()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import SocketServer
+import sys
+import os
+import json
+import time
+import threading
+os.environ['CUDA_VISIBLE_DEVICES']=''
+
+import numpy as np
+import multiprocessing as mp
+import mpc_planner
+import mpc_table
+import video_sizes
+import abr_log
+import session_state
+
+
+# one server process for many concurrent dash.js players: requests are
+# handled in threads, the state of each player (robust_mpc_server.py,
+# mpc_server.py or rl_server_no_training.py keep a single one) is kept
+# per session, and the MPC search or the actor runs in a pool of worker
+# processes. a session is the 'sessionID' of the POST, else the
+# X-Session-Id header, else the client address
+# usage: python abr_server.py [robust_mpc|mpc|rl] [port] [num_workers]
+ABR = 'robust_mpc'
+PORT = 8333
+NUM_WORKERS = 4
+SESSION_TIMEOUT = 600  # sec, sessions idle for longer are dropped
+REQUEST_QUEUE_SIZE = 1024  # pending connections
+MPC_S_INFO = 5  # bit_rate, buffer_size, rebuffering_time, bandwidth_measurement, chunk_til_video_end
+RL_S_INFO = 6  # bit_rate, buffer_size, throughput, download_time, next_chunk_sizes, chunk_til_video_end
+S_LEN = 8  # take how many frames in the past
+A_DIM = 6
+MPC_FUTURE_CHUNK_COUNT = 5
+PAST_BANDWIDTHS = 5  # harmonic mean of the last 5 throughputs, robustMPC errors of the last 5
+VIDEO_BIT_RATE = [300,750,1200,1850,2850,4300]  # Kbps
+BITRATE_REWARD = [1, 2, 3, 12, 15, 20]
+M_IN_K = 1000.0
+BUFFER_NORM_FACTOR = 10.0
+CHUNK_TIL_VIDEO_END_CAP = 48.0
+TOTAL_VIDEO_CHUNKS = 48
+DEFAULT_QUALITY = 0  # default video quality without agent
+# kilo byte / ms, the bandwidth estimate while no chunk of the video was measured
+DEFAULT_BANDWIDTH_EST = VIDEO_BIT_RATE[DEFAULT_QUALITY] / 8.0 / M_IN_K
+REBUF_PENALTY = 4.3  # 1 sec rebuffering -> this number of Mbps
+SMOOTH_PENALTY = 1
+ACTOR_LR_RATE = 0.0001
+RANDOM_SEED = 42
+RAND_RANGE = 1000
+SUMMARY_DIR = './results'
+LOG_FILE = './results/log'
+# fixed-width records in ./results_binary, python read_log.py writes the text logs
+BINARY_LOG = True
+# in format of time_stamp bit_rate buffer_size rebuffer_time video_chunk_size download_time reward session
+NN_MODEL = '../rl_server/results/pretrain_linear_reward.ckpt'
+VIDEO_MANIFEST = '../video_server/Manifest.mpd'
+MPC_TABLE = mpc_table.MPC_TABLE  # used by mpc if it exists
+
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+class Session(session_state.SessionState):
+    def __init__(self, s_info):
+        session_state.SessionState.__init__(self, s_info, S_LEN, PAST_BANDWIDTHS)
+        self.lock = threading.Lock()
+        self.last_seen = time.time()
+
+
+class SessionStore(object):
+    def __init__(self, s_info, timeout=SESSION_TIMEOUT):
+        self.s_info = s_info
+        self.timeout = timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.last_expired = time.time()
+
+    def get(self, session_id):
+        with self.lock:
+            now = time.time()
+            if now - self.last_expired > self.timeout:
+                for idle_id in [i for i, s in self.sessions.iteritems()
+                                if now - s.last_seen > self.timeout]:
+                    del self.sessions[idle_id]
+                self.last_expired = now
+
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = Session(self.s_info)
+                self.sessions[session_id] = session
+            session.last_seen = now
+            return session
+
+
+# the model or the chunk sizes of one worker process
+worker_state = {}
+
+
+def init_worker(abr, video_path, nn_model):
+    np.random.seed(RANDOM_SEED + os.getpid())
+    worker_state['video_size'] = video_sizes.load_video(path=video_path)
+    if abr == 'rl':
+        # tensorflow is only needed by the rl workers
+        import tensorflow as tf
+        import a3c
+        sess = tf.Session()
+        actor = a3c.ActorNetwork(sess,
+                                 state_dim=[RL_S_INFO, S_LEN], action_dim=A_DIM,
+                                 learning_rate=ACTOR_LR_RATE)
+        sess.run(tf.global_variables_initializer())
+        if nn_model is not None:
+            tf.train.Saver().restore(sess, nn_model)
+        worker_state['actor'] = actor
+
+
+def mpc_decision(last_index, future_chunk_length, last_quality, start_buffer, future_bandwidth):
+    chunk_sizes = video_sizes.get_future_chunk_sizes(
+        worker_state['video_size'], last_index, future_chunk_length)
+    download_times = mpc_planner.get_download_times(chunk_sizes, future_bandwidth)
+    # hd reward, as the mpc servers
+    best_quality, _ = mpc_planner.plan(download_times, last_quality, start_buffer,
+                                       BITRATE_REWARD, 8, utility_scale=1.)
+    return best_quality
+
+
+def rl_decision(state):
+    action_prob = worker_state['actor'].predict(np.reshape(state, (1, RL_S_INFO, S_LEN)))
+    action_cumsum = np.cumsum(action_prob)
+    return int((action_cumsum > np.random.randint(1, RAND_RANGE) / float(RAND_RANGE)).argmax())
+
+
+def get_session_id(request, post_data):
+    if 'sessionID' in post_data:
+        return str(post_data['sessionID'])
+    if request.headers.get('X-Session-Id') is not None:
+        return request.headers.get('X-Session-Id')
+    return request.client_address[0]
+
+
+def update_mpc_state(session, post_data, rebuffer_time, video_chunk_size,
+                     video_chunk_fetch_time, video_chunk_remain, robust):
+    # as robust_mpc_server.py and mpc_server.py, returns the predicted bandwidth
+    try:
+        bandwidth = float(video_chunk_size) / float(video_chunk_fetch_time) / M_IN_K  # kilo byte / ms
+        curr_error = 0
+        if len(session.past_bandwidth_ests) > 0:
+            curr_error = abs(session.past_bandwidth_ests[-1] - bandwidth) / float(bandwidth)
+        session.push([VIDEO_BIT_RATE[post_data['lastquality']] / float(np.max(VIDEO_BIT_RATE)),
+                      post_data['buffer'] / BUFFER_NORM_FACTOR,
+                      rebuffer_time / M_IN_K,
+                      bandwidth,
+                      np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)])
+        session.past_errors.append(curr_error)
+    except ZeroDivisionError:
+        # keep the last observation
+        session.past_errors.append(0)
+
+    past_bandwidths = session.state[3, -PAST_BANDWIDTHS:]
+    while len(past_bandwidths) > 0 and past_bandwidths[0] == 0.0:
+        past_bandwidths = past_bandwidths[1:]
+    if len(past_bandwidths) == 0:
+        # every chunk of the video so far was a dash glitch, nothing measured yet
+        harmonic_bandwidth = DEFAULT_BANDWIDTH_EST
+    else:
+        bandwidth_sum = 0
+        for past_val in past_bandwidths:
+            bandwidth_sum += (1 / float(past_val))
+        harmonic_bandwidth = 1.0 / (bandwidth_sum / len(past_bandwidths))
+
+    if not robust:
+        return harmonic_bandwidth
+    max_error = float(max(session.past_errors))
+    session.past_bandwidth_ests.append(harmonic_bandwidth)
+    return harmonic_bandwidth / (1 + max_error)
+
+
+def update_rl_state(session, post_data, video_size, video_chunk_size,
+                    video_chunk_fetch_time, video_chunk_remain):
+    # as rl_server_no_training.py
+    next_video_chunk_sizes = []
+    for i in xrange(A_DIM):
+        next_video_chunk_sizes.append(video_sizes.get_chunk_size(
+            video_size, i, session.video_chunk_count))
+    try:
+        session.push([VIDEO_BIT_RATE[post_data['lastquality']] / float(np.max(VIDEO_BIT_RATE)),
+                      post_data['buffer'] / BUFFER_NORM_FACTOR,
+                      float(video_chunk_size) / float(video_chunk_fetch_time) / M_IN_K,  # kilo byte / ms
+                      float(video_chunk_fetch_time) / M_IN_K / BUFFER_NORM_FACTOR,  # 10 sec
+                      session.state[4, 0],  # overwritten below, as np.roll left it
+                      np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)])
+        session.state[4, :A_DIM] = np.array(next_video_chunk_sizes) / M_IN_K / M_IN_K  # mega byte
+    except ZeroDivisionError:
+        # keep the last observation
+        pass
+
+
+def make_request_handler(input_dict):
+
+    class Request_Handler(BaseHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            self.input_dict = input_dict
+            self.abr = input_dict['abr']
+            self.sessions = input_dict['sessions']
+            self.pool = input_dict['pool']
+            BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
+
+        def do_POST(self):
+            content_length = int(self.headers['Content-Length'])
+            post_data = json.loads(self.rfile.read(content_length))
+
+            if ( 'pastThroughput' in post_data ):
+                # summary of throughput/quality at the end of the load, no quality to send back
+                print "Summary: ", post_data
+                return
+
+            session_id = get_session_id(self, post_data)
+            session = self.sessions.get(session_id)
+            with session.lock:
+                send_data = self.decide(session, session_id, post_data)
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', len(send_data))
+            self.send_header('Access-Control-Allow-Origin', "*")
+            self.end_headers()
+            self.wfile.write(send_data)
+
+        def decide(self, session, session_id, post_data):
+            rebuffer_time = float(post_data['RebufferTime'] - session.last_total_rebuf)
+
+            # --linear reward--
+            reward = VIDEO_BIT_RATE[post_data['lastquality']] / M_IN_K \
+                - REBUF_PENALTY * rebuffer_time / M_IN_K \
+                - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[post_data['lastquality']] -
+                                          session.last_bit_rate) / M_IN_K
+
+            session.last_bit_rate = VIDEO_BIT_RATE[post_data['lastquality']]
+            session.last_total_rebuf = post_data['RebufferTime']
+
+            video_chunk_fetch_time = post_data['lastChunkFinishTime'] - post_data['lastChunkStartTime']
+            video_chunk_size = post_data['lastChunkSize']
+            video_chunk_remain = TOTAL_VIDEO_CHUNKS - session.video_chunk_count
+            session.video_chunk_count += 1
+
+            if self.abr == 'rl':
+                update_rl_state(session, post_data, self.input_dict['video_size'],
+                                video_chunk_size, video_chunk_fetch_time, video_chunk_remain)
+            else:
+                future_bandwidth = update_mpc_state(
+                    session, post_data, rebuffer_time, video_chunk_size,
+                    video_chunk_fetch_time, video_chunk_remain, self.abr == 'robust_mpc')
+
+            # log wall_time, bit_rate, buffer_size, rebuffer_time, video_chunk_size, download_time, reward, session
+            self.input_dict['logger'].log_chunk(VIDEO_BIT_RATE[post_data['lastquality']], post_data['buffer'],
+                                                rebuffer_time / M_IN_K, video_chunk_size,
+                                                video_chunk_fetch_time, reward, session_id)
+
+            if self.abr == 'rl':
+                bit_rate = self.pool.apply(rl_decision, (session.state,))
+            else:
+                last_index = int(post_data['lastRequest'])
+                last_quality = int(post_data['lastquality'])
+                start_buffer = float(post_data['buffer'])
+                if self.abr == 'robust_mpc':
+                    future_chunk_length = MPC_FUTURE_CHUNK_COUNT
+                    if ( TOTAL_VIDEO_CHUNKS - last_index < 5 ):
+                        future_chunk_length = TOTAL_VIDEO_CHUNKS - last_index
+                else:
+                    future_chunk_length = mpc_table.get_future_chunk_length(last_index)
+
+                if self.abr == 'mpc' and self.input_dict['mpc_table'] is not None:
+                    bit_rate = mpc_table.lookup(self.input_dict['mpc_table'], last_index,
+                                                last_quality, future_bandwidth, start_buffer)
+                else:
+                    bit_rate = self.pool.apply(mpc_decision, (last_index, future_chunk_length,
+                                                              last_quality, start_buffer,
+                                                              future_bandwidth))
+            send_data = str(bit_rate)
+
+            if ( post_data['lastRequest'] == TOTAL_VIDEO_CHUNKS ):
+                send_data = "REFRESH"
+                session.reset()
+                self.input_dict['logger'].log_end_of_video(session_id)  # so that in the log we know where video ends
+
+            return send_data
+
+        def do_GET(self):
+            print >> sys.stderr, 'GOT REQ'
+            self.send_response(200)
+            self.send_header('Cache-Control', 'max-age=3000')
+            self.send_header('Content-Length', 20)
+            self.end_headers()
+            self.wfile.write("console.log('here');")
+
+        def log_message(self, format, *args):
+            return
+
+    return Request_Handler
+
+
+def run(abr=ABR, port=PORT, num_workers=NUM_WORKERS, log_file_path=LOG_FILE):
+
+    np.random.seed(RANDOM_SEED)
+    assert abr in ['robust_mpc', 'mpc', 'rl']
+
+    if not os.path.exists(SUMMARY_DIR):
+        os.makedirs(SUMMARY_DIR)
+
+    nn_model = None
+    if abr == 'rl':
+        nn_model = NN_MODEL
+    pool = mp.Pool(num_workers, initializer=init_worker,
+                   initargs=(abr, VIDEO_MANIFEST, nn_model))
+
+    with abr_log.AbrLogger(log_file_path, BINARY_LOG) as logger:
+
+        s_info = MPC_S_INFO
+        if abr == 'rl':
+            s_info = RL_S_INFO
+
+        input_dict = {'abr': abr,
+                      'logger': logger,
+                      'sessions': SessionStore(s_info),
+                      'pool': pool,
+                      'video_size': video_sizes.load_video(path=VIDEO_MANIFEST),
+                      'mpc_table': None}
+        if abr == 'mpc' and os.path.exists(MPC_TABLE):
+            input_dict['mpc_table'] = mpc_table.load_table(MPC_TABLE)
+            print 'Loaded MPC table ' + MPC_TABLE
+
+        handler_class = make_request_handler(input_dict=input_dict)
+
+        server_address = ('localhost', port)
+        httpd = ThreadedHTTPServer(server_address, handler_class)
+        print 'Listening on port ' + str(port) + ' (' + abr + ', ' + str(num_workers) + ' workers)'
+        try:
+            httpd.serve_forever()
+        finally:
+            pool.terminate()
+
+
+def main():
+    abr = ABR
+    port = PORT
+    num_workers = NUM_WORKERS
+    if len(sys.argv) > 1:
+        abr = sys.argv[1]
+    if len(sys.argv) > 2:
+        port = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        num_workers = int(sys.argv[3])
+    run(abr, port, num_workers, log_file_path=LOG_FILE + '_' + abr + '_threaded')
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print "Keyboard interrupted."
+        try:
+            sys.exit(0)
+        except SystemExit:
+            os._exit(0)
@@ -0,0 +1,83 @@
+import time
+import Queue
+import threading
+import collections
+import numpy as np
+
+
+# coalesces the states of concurrent requests into one actor.predict, so
+# the server pays the session overhead once per batch instead of once per
+# request: a batch runs BATCH_WINDOW after its first state or as soon as
+# it holds MAX_BATCH states
+BATCH_WINDOW = 0.002  # sec
+MAX_BATCH = 64
+LATENCY_HISTORY = 10000  # latencies kept for the percentiles
+M_IN_K = 1000.0
+
+
+class InferenceBatcher(object):
+    def __init__(self, predict, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.predict_batch = predict
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.requests = Queue.Queue()
+
+        self.stats_lock = threading.Lock()
+        self.batch_sizes = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_HISTORY)
+
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def predict(self, state):
+        # the (1, A_DIM) action probabilities of one state, as actor.predict
+        request = {'state': state, 'done': threading.Event(), 'start': time.time()}
+        self.requests.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return request['action_prob']
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except Queue.Empty:
+                    break
+
+            try:
+                action_probs = self.predict_batch(np.array([request['state'] for request in batch]))
+                for i in xrange(len(batch)):
+                    batch[i]['action_prob'] = action_probs[i:i + 1]
+            except Exception as e:
+                for request in batch:
+                    request['error'] = e
+
+            end = time.time()
+            with self.stats_lock:
+                self.batch_sizes[len(batch)] += 1
+                for request in batch:
+                    self.latencies.append(end - request['start'])
+            for request in batch:
+                request['done'].set()
+
+    def get_stats(self):
+        # latency percentiles over the last LATENCY_HISTORY requests and the batch sizes
+        with self.stats_lock:
+            latencies = np.array(self.latencies)
+            batch_sizes = dict(self.batch_sizes)
+        stats = {'batches': sum(batch_sizes.values()),
+                 'batch_sizes': batch_sizes,
+                 'p50_ms': 0.0,
+                 'p99_ms': 0.0}
+        if len(latencies) > 0:
+            stats['p50_ms'] = np.percentile(latencies, 50) * M_IN_K
+            stats['p99_ms'] = np.percentile(latencies, 99) * M_IN_K
+        return stats
@@ -11,7 +11,10 @@ os.environ['CUDA_VISIBLE_DEVICES']=''
 
 import numpy as np
 import time
-import itertools
+import mpc_planner
+import mpc_table
+import video_sizes
+import abr_log
 
 ######################## FAST MPC #######################
 
@@ -26,6 +29,8 @@ BUFFER_NORM_FACTOR = 10.0
 CHUNK_TIL_VIDEO_END_CAP = 48.0
 TOTAL_VIDEO_CHUNKS = 48
 DEFAULT_QUALITY = 0  # default video quality without agent
+# kilo byte / ms, the bandwidth estimate while no chunk of the video was measured
+DEFAULT_BANDWIDTH_EST = VIDEO_BIT_RATE[DEFAULT_QUALITY] / 8.0 / M_IN_K
 REBUF_PENALTY = 4.3  # 1 sec rebuffering -> this number of Mbps
 SMOOTH_PENALTY = 1
 TRAIN_SEQ_LEN = 100  # take as a train batch
@@ -34,32 +39,24 @@ RANDOM_SEED = 42
 RAND_RANGE = 1000
 SUMMARY_DIR = './results'
 LOG_FILE = './results/log'
+# fixed-width records in ./results_binary, python read_log.py writes the text logs
+BINARY_LOG = True
 # in format of time_stamp bit_rate buffer_size rebuffer_time video_chunk_size download_time reward
 NN_MODEL = None
 
-CHUNK_COMBO_OPTIONS = []
+# chunk sizes of every bitrate, loaded once from the segments of the manifest
+VIDEO_MANIFEST = '../video_server/Manifest.mpd'
+# decisions precomputed by mpc_table.py, answered with one lookup, the
+# search runs online if there is no table
+MPC_TABLE = mpc_table.MPC_TABLE
 
-# video chunk sizes
-size_video1 = [2354772, 2123065, 2177073, 2160877, 2233056, 1941625, 2157535, 2290172, 2055469, 2169201, 2173522, 2102452, 2209463, 2275376, 2005399, 2152483, 2289689, 2059512, 2220726, 2156729, 2039773, 2176469, 2221506, 2044075, 2186790, 2105231, 2395588, 1972048, 2134614, 2164140, 2113193, 2147852, 2191074, 2286761, 2307787, 2143948, 1919781, 2147467, 2133870, 2146120, 2108491, 2184571, 2121928, 2219102, 2124950, 2246506, 1961140, 2155012, 1433658]
-size_video2 = [1728879, 1431809, 1300868, 1520281, 1472558, 1224260, 1388403, 1638769, 1348011, 1429765, 1354548, 1519951, 1422919, 1578343, 1231445, 1471065, 1491626, 1358801, 1537156, 1336050, 1415116, 1468126, 1505760, 1323990, 1383735, 1480464, 1547572, 1141971, 1498470, 1561263, 1341201, 1497683, 1358081, 1587293, 1492672, 1439896, 1139291, 1499009, 1427478, 1402287, 1339500, 1527299, 1343002, 1587250, 1464921, 1483527, 1231456, 1364537, 889412]
-size_video3 = [1034108, 957685, 877771, 933276, 996749, 801058, 905515, 1060487, 852833, 913888, 939819, 917428, 946851, 1036454, 821631, 923170, 966699, 885714, 987708, 923755, 891604, 955231, 968026, 874175, 897976, 905935, 1076599, 758197, 972798, 975811, 873429, 954453, 885062, 1035329, 1026056, 943942, 728962, 938587, 908665, 930577, 858450, 1025005, 886255, 973972, 958994, 982064, 830730, 846370, 598850]
-size_video4 = [668286, 611087, 571051, 617681, 652874, 520315, 561791, 709534, 584846, 560821, 607410, 594078, 624282, 687371, 526950, 587876, 617242, 581493, 639204, 586839, 601738, 616206, 656471, 536667, 587236, 590335, 696376, 487160, 622896, 641447, 570392, 620283, 584349, 670129, 690253, 598727, 487812, 575591, 605884, 587506, 566904, 641452, 599477, 634861, 630203, 638661, 538612, 550906, 391450]
-size_video5 = [450283, 398865, 350812, 382355, 411561, 318564, 352642, 437162, 374758, 362795, 353220, 405134, 386351, 434409, 337059, 366214, 360831, 372963, 405596, 350713, 386472, 399894, 401853, 343800, 359903, 379700, 425781, 277716, 400396, 400508, 358218, 400322, 369834, 412837, 401088, 365161, 321064, 361565, 378327, 390680, 345516, 384505, 372093, 438281, 398987, 393804, 331053, 314107, 255954]
-size_video6 = [181801, 155580, 139857, 155432, 163442, 126289, 153295, 173849, 150710, 139105, 141840, 156148, 160746, 179801, 140051, 138313, 143509, 150616, 165384, 140881, 157671, 157812, 163927, 137654, 146754, 153938, 181901, 111155, 153605, 149029, 157421, 157488, 143881, 163444, 179328, 159914, 131610, 124011, 144254, 149991, 147968, 161857, 145210, 172312, 167025, 160064, 137507, 118421, 112270]
-
-def get_chunk_size(quality, index):
-    if ( index < 0 or index > 48 ):
-        return 0
-    # note that the quality and video labels are inverted (i.e., quality 8 is highest and this pertains to video1)
-    sizes = {5: size_video1[index], 4: size_video2[index], 3: size_video3[index], 2: size_video4[index], 1: size_video5[index], 0: size_video6[index]}
-    return sizes[quality]
 
 def make_request_handler(input_dict):
 
     class Request_Handler(BaseHTTPRequestHandler):
         def __init__(self, *args, **kwargs):
             self.input_dict = input_dict
-            self.log_file = input_dict['log_file']
+            self.logger = input_dict['logger']
             #self.saver = input_dict['saver']
             self.s_batch = input_dict['s_batch']
             #self.a_batch = input_dict['a_batch']
@@ -69,7 +66,6 @@ def make_request_handler(input_dict):
         def do_POST(self):
             content_length = int(self.headers['Content-Length'])
             post_data = json.loads(self.rfile.read(content_length))
-            print post_data
 
             if ( 'pastThroughput' in post_data ):
                 # @Hongzi: this is just the summary of throughput/quality at the end of the load
@@ -142,28 +138,27 @@ def make_request_handler(input_dict):
                         state = np.array(self.s_batch[-1], copy=True)
 
                 # log wall_time, bit_rate, buffer_size, rebuffer_time, video_chunk_size, download_time, reward
-                self.log_file.write(str(time.time()) + '\t' +
-                                    str(VIDEO_BIT_RATE[post_data['lastquality']]) + '\t' +
-                                    str(post_data['buffer']) + '\t' +
-                                    str(rebuffer_time / M_IN_K) + '\t' +
-                                    str(video_chunk_size) + '\t' +
-                                    str(video_chunk_fetch_time) + '\t' +
-                                    str(reward) + '\n')
-                self.log_file.flush()
+                self.logger.log_chunk(VIDEO_BIT_RATE[post_data['lastquality']], post_data['buffer'],
+                                      rebuffer_time / M_IN_K, video_chunk_size,
+                                      video_chunk_fetch_time, reward)
 
                 # pick bitrate according to MPC           
                 # first get harmonic mean of last 5 bandwidths
                 past_bandwidths = state[3,-5:]
-                while past_bandwidths[0] == 0.0:
+                while len(past_bandwidths) > 0 and past_bandwidths[0] == 0.0:
                     past_bandwidths = past_bandwidths[1:]
                 #if ( len(state) < 5 ):
                 #    past_bandwidths = state[3,-len(state):]
                 #else:
                 #    past_bandwidths = state[3,-5:]
-                bandwidth_sum = 0
-                for past_val in past_bandwidths:
-                    bandwidth_sum += (1/float(past_val))
-                future_bandwidth = 1.0/(bandwidth_sum/len(past_bandwidths))
+                if len(past_bandwidths) == 0:
+                    # every chunk of the video so far was a dash glitch, nothing measured yet
+                    future_bandwidth = DEFAULT_BANDWIDTH_EST
+                else:
+                    bandwidth_sum = 0
+                    for past_val in past_bandwidths:
+                        bandwidth_sum += (1/float(past_val))
+                    future_bandwidth = 1.0/(bandwidth_sum/len(past_bandwidths))
 
                 # future chunks length (try 4 if that many remaining)
                 last_index = int(post_data['lastRequest'])
@@ -171,66 +166,25 @@ def make_request_handler(input_dict):
                 if ( TOTAL_VIDEO_CHUNKS - last_index < 4 ):
                     future_chunk_length = TOTAL_VIDEO_CHUNKS - last_index
 
-                # all possible combinations of 5 chunk bitrates (9^5 options)
-                # iterate over list and for each, compute reward and store max reward combination
-                max_reward = -100000000
-                best_combo = ()
                 start_buffer = float(post_data['buffer'])
-                #start = time.time()
-                for full_combo in CHUNK_COMBO_OPTIONS:
-                    combo = full_combo[0:future_chunk_length]
-                    # calculate total rebuffer time for this combination (start with start_buffer and subtract
-                    # each download time and add 2 seconds in that order)
-                    curr_rebuffer_time = 0
-                    curr_buffer = start_buffer
-                    bitrate_sum = 0
-                    smoothness_diffs = 0
-                    last_quality = int(post_data['lastquality'])
-                    for position in range(0, len(combo)):
-                        chunk_quality = combo[position]
-                        index = last_index + position + 1 # e.g., if last chunk is 3, then first iter is 3+0+1=4
-                        download_time = (get_chunk_size(chunk_quality, index)/1000000.)/future_bandwidth # this is MB/MB/s --> seconds
-                        if ( curr_buffer < download_time ):
-                            curr_rebuffer_time += (download_time - curr_buffer)
-                            curr_buffer = 0
-                        else:
-                            curr_buffer -= download_time
-                        curr_buffer += 4
-                        
-                        # linear reward
-                        #bitrate_sum += VIDEO_BIT_RATE[chunk_quality]
-                        #smoothness_diffs += abs(VIDEO_BIT_RATE[chunk_quality] - VIDEO_BIT_RATE[last_quality])
-
-                        # log reward
-                        # log_bit_rate = np.log(VIDEO_BIT_RATE[chunk_quality] / float(VIDEO_BIT_RATE[0]))
-                        # log_last_bit_rate = np.log(VIDEO_BIT_RATE[last_quality] / float(VIDEO_BIT_RATE[0]))
-                        # bitrate_sum += log_bit_rate
-                        # smoothness_diffs += abs(log_bit_rate - log_last_bit_rate)
-
-                        # hd reward
-                        bitrate_sum += BITRATE_REWARD[chunk_quality]
-                        smoothness_diffs += abs(BITRATE_REWARD[chunk_quality] - BITRATE_REWARD[last_quality])
-
-                        last_quality = chunk_quality
-                    # compute reward for this combination (one reward per 5-chunk combo)
-                    # bitrates are in Mbits/s, rebuffer in seconds, and smoothness_diffs in Mbits/s
-
-                    # linear reward 
-                    #reward = (bitrate_sum/1000.) - (4.3*curr_rebuffer_time) - (smoothness_diffs/1000.)
-
-                    # log reward
-                    # reward = (bitrate_sum) - (4.3*curr_rebuffer_time) - (smoothness_diffs)
-
-                    # hd reward
-                    reward = bitrate_sum - (8*curr_rebuffer_time) - (smoothness_diffs)
-
-                    if ( reward > max_reward ):
-                        max_reward = reward
-                        best_combo = combo
+                if self.input_dict['mpc_table'] is not None:
+                    best_quality = mpc_table.lookup(
+                        self.input_dict['mpc_table'], last_index, int(post_data['lastquality']),
+                        future_bandwidth, start_buffer)
+                else:
+                    # best combination of the future chunk bitrates, found by
+                    # branch and bound instead of trying all 6^5 of them
+                    chunk_sizes = video_sizes.get_future_chunk_sizes(
+                        self.input_dict['video_size'], last_index, future_chunk_length)
+                    download_times = mpc_planner.get_download_times(chunk_sizes, future_bandwidth)
+
+                    # hd reward, bitrate_sum - (8*curr_rebuffer_time) - (smoothness_diffs)
+                    # linear reward would be VIDEO_BIT_RATE, 4.3, utility_scale=1000.
+                    best_quality, max_reward = mpc_planner.plan(
+                        download_times, int(post_data['lastquality']), start_buffer,
+                        BITRATE_REWARD, 8, utility_scale=1.)
                 # send data to html side (first chunk of best combo)
-                send_data = 0 # no combo had reward better than -1000000 (ERROR) so send 0
-                if ( best_combo != () ): # some combo was good
-                    send_data = str(best_combo[0])
+                send_data = str(best_quality)
 
                 end = time.time()
                 #print "TOOK: " + str(end-start)
@@ -242,7 +196,7 @@ def make_request_handler(input_dict):
                     self.input_dict['last_total_rebuf'] = 0
                     self.input_dict['last_bit_rate'] = DEFAULT_QUALITY
                     self.input_dict['video_chunk_coount'] = 0
-                    self.log_file.write('\n')  # so that in the log we know where video ends
+                    self.logger.log_end_of_video()  # so that in the log we know where video ends
 
                 self.send_response(200)
                 self.send_header('Content-Type', 'text/plain')
@@ -281,11 +235,7 @@ def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
     if not os.path.exists(SUMMARY_DIR):
         os.makedirs(SUMMARY_DIR)
 
-    # make chunk combination options
-    for combo in itertools.product([0,1,2,3,4,5], repeat=5):
-        CHUNK_COMBO_OPTIONS.append(combo)
-
-    with open(log_file_path, 'wb') as log_file:
+    with abr_log.AbrLogger(log_file_path, BINARY_LOG) as logger:
 
         s_batch = [np.zeros((S_INFO, S_LEN))]
 
@@ -296,11 +246,16 @@ def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
 
         video_chunk_count = 0
 
-        input_dict = {'log_file': log_file,
+        input_dict = {'logger': logger,
                       'last_bit_rate': last_bit_rate,
                       'last_total_rebuf': last_total_rebuf,
                       'video_chunk_coount': video_chunk_count,
-                      's_batch': s_batch}
+                      's_batch': s_batch,
+                      'video_size': video_sizes.load_video(path=VIDEO_MANIFEST),
+                      'mpc_table': None}
+        if os.path.exists(MPC_TABLE):
+            input_dict['mpc_table'] = mpc_table.load_table(MPC_TABLE)
+            print 'Loaded MPC table ' + MPC_TABLE
 
         # interface to abr_rl server
         handler_class = make_request_handler(input_dict=input_dict)
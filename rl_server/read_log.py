@@ -0,0 +1,44 @@
+import os
+import sys
+import abr_log
+
+
+# converts the binary logs of the ABR servers to the tab separated text
+# logs of plot_results.py, a folder of logs or a single one
+# usage: python read_log.py [binary log or folder] [text log or folder]
+BINARY_RESULTS = './results' + abr_log.BINARY_DIR_SUFFIX
+TEXT_RESULTS = './results'
+
+
+def convert(binary_log_path, text_log_path):
+    records = 0
+    with open(binary_log_path, 'rb') as binary_log, open(text_log_path, 'wb') as text_log:
+        for record in abr_log.read_records(binary_log):
+            text_log.write(abr_log.format_record(record, repr))
+            records += 1
+    return records
+
+
+def main():
+    binary_path = BINARY_RESULTS
+    text_path = TEXT_RESULTS
+    if len(sys.argv) > 1:
+        binary_path = sys.argv[1]
+    if len(sys.argv) > 2:
+        text_path = sys.argv[2]
+
+    if os.path.isdir(binary_path):
+        if not os.path.exists(text_path):
+            os.makedirs(text_path)
+        log_files = [(os.path.join(binary_path, log_file), os.path.join(text_path, log_file))
+                     for log_file in sorted(os.listdir(binary_path))]
+    else:
+        log_files = [(binary_path, text_path)]
+
+    for binary_log_path, text_log_path in log_files:
+        records = convert(binary_log_path, text_log_path)
+        print(binary_log_path + ' -> ' + text_log_path + ': ' + str(records) + ' records')
+
+
+if __name__ == '__main__':
+    main()
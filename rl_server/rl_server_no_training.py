@@ -10,8 +10,12 @@ os.environ['CUDA_VISIBLE_DEVICES']=''
 
 import numpy as np
 import tensorflow as tf
-import time
+import threading
 import a3c
+import video_sizes
+import abr_log
+import session_state
+import inference_batcher
 
 
 S_INFO = 6  # bit_rate, buffer_size, rebuffering_time, bandwidth_measurement, chunk_til_video_end
@@ -35,25 +39,26 @@ RANDOM_SEED = 42
 RAND_RANGE = 1000
 SUMMARY_DIR = './results'
 LOG_FILE = './results/log'
+# fixed-width records in ./results_binary, python read_log.py writes the text logs
+BINARY_LOG = True
 # in format of time_stamp bit_rate buffer_size rebuffer_time video_chunk_size download_time reward
 # NN_MODEL = None
 NN_MODEL = '../rl_server/results/pretrain_linear_reward.ckpt'
 
-# video chunk sizes
-size_video1 = [2354772, 2123065, 2177073, 2160877, 2233056, 1941625, 2157535, 2290172, 2055469, 2169201, 2173522, 2102452, 2209463, 2275376, 2005399, 2152483, 2289689, 2059512, 2220726, 2156729, 2039773, 2176469, 2221506, 2044075, 2186790, 2105231, 2395588, 1972048, 2134614, 2164140, 2113193, 2147852, 2191074, 2286761, 2307787, 2143948, 1919781, 2147467, 2133870, 2146120, 2108491, 2184571, 2121928, 2219102, 2124950, 2246506, 1961140, 2155012, 1433658]
-size_video2 = [1728879, 1431809, 1300868, 1520281, 1472558, 1224260, 1388403, 1638769, 1348011, 1429765, 1354548, 1519951, 1422919, 1578343, 1231445, 1471065, 1491626, 1358801, 1537156, 1336050, 1415116, 1468126, 1505760, 1323990, 1383735, 1480464, 1547572, 1141971, 1498470, 1561263, 1341201, 1497683, 1358081, 1587293, 1492672, 1439896, 1139291, 1499009, 1427478, 1402287, 1339500, 1527299, 1343002, 1587250, 1464921, 1483527, 1231456, 1364537, 889412]
-size_video3 = [1034108, 957685, 877771, 933276, 996749, 801058, 905515, 1060487, 852833, 913888, 939819, 917428, 946851, 1036454, 821631, 923170, 966699, 885714, 987708, 923755, 891604, 955231, 968026, 874175, 897976, 905935, 1076599, 758197, 972798, 975811, 873429, 954453, 885062, 1035329, 1026056, 943942, 728962, 938587, 908665, 930577, 858450, 1025005, 886255, 973972, 958994, 982064, 830730, 846370, 598850]
-size_video4 = [668286, 611087, 571051, 617681, 652874, 520315, 561791, 709534, 584846, 560821, 607410, 594078, 624282, 687371, 526950, 587876, 617242, 581493, 639204, 586839, 601738, 616206, 656471, 536667, 587236, 590335, 696376, 487160, 622896, 641447, 570392, 620283, 584349, 670129, 690253, 598727, 487812, 575591, 605884, 587506, 566904, 641452, 599477, 634861, 630203, 638661, 538612, 550906, 391450]
-size_video5 = [450283, 398865, 350812, 382355, 411561, 318564, 352642, 437162, 374758, 362795, 353220, 405134, 386351, 434409, 337059, 366214, 360831, 372963, 405596, 350713, 386472, 399894, 401853, 343800, 359903, 379700, 425781, 277716, 400396, 400508, 358218, 400322, 369834, 412837, 401088, 365161, 321064, 361565, 378327, 390680, 345516, 384505, 372093, 438281, 398987, 393804, 331053, 314107, 255954]
-size_video6 = [181801, 155580, 139857, 155432, 163442, 126289, 153295, 173849, 150710, 139105, 141840, 156148, 160746, 179801, 140051, 138313, 143509, 150616, 165384, 140881, 157671, 157812, 163927, 137654, 146754, 153938, 181901, 111155, 153605, 149029, 157421, 157488, 143881, 163444, 179328, 159914, 131610, 124011, 144254, 149991, 147968, 161857, 145210, 172312, 167025, 160064, 137507, 118421, 112270]
+# chunk sizes of every bitrate, loaded once from the segments of the manifest
+VIDEO_MANIFEST = '../video_server/Manifest.mpd'
+# run the actor on the states of concurrent requests at once, a batch
+# waits at most BATCH_WINDOW for MAX_BATCH states; GET STATS_PATH returns
+# the latency percentiles and batch sizes
+BATCH_INFERENCE = True
+BATCH_WINDOW = inference_batcher.BATCH_WINDOW  # sec
+MAX_BATCH = inference_batcher.MAX_BATCH
+STATS_PATH = '/stats'
 
 
-def get_chunk_size(quality, index):
-    if ( index < 0 or index > 48 ):
-        return 0
-    # note that the quality and video labels are inverted (i.e., quality 8 is highest and this pertains to video1)
-    sizes = {5: size_video1[index], 4: size_video2[index], 3: size_video3[index], 2: size_video4[index], 1: size_video5[index], 0: size_video6[index]}
-    return sizes[quality]
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
 
 def make_request_handler(input_dict):
 
@@ -61,11 +66,11 @@ def make_request_handler(input_dict):
         def __init__(self, *args, **kwargs):
             self.input_dict = input_dict
             self.sess = input_dict['sess']
-            self.log_file = input_dict['log_file']
+            self.logger = input_dict['logger']
             self.actor = input_dict['actor']
             self.critic = input_dict['critic']
             self.saver = input_dict['saver']
-            self.s_batch = input_dict['s_batch']
+            self.session = input_dict['session']
             self.a_batch = input_dict['a_batch']
             self.r_batch = input_dict['r_batch']
             BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
@@ -73,94 +78,93 @@ def make_request_handler(input_dict):
         def do_POST(self):
             content_length = int(self.headers['Content-Length'])
             post_data = json.loads(self.rfile.read(content_length))
-            print post_data
 
             if ( 'pastThroughput' in post_data ):
                 # @Hongzi: this is just the summary of throughput/quality at the end of the load
                 # so we don't want to use this information to send back a new quality
                 print "Summary: ", post_data
             else:
-                # option 1. reward for just quality
-                # reward = post_data['lastquality']
-                # option 2. combine reward for quality and rebuffer time
-                #           tune up the knob on rebuf to prevent it more
-                # reward = post_data['lastquality'] - 0.1 * (post_data['RebufferTime'] - self.input_dict['last_total_rebuf'])
-                # option 3. give a fixed penalty if video is stalled
-                #           this can reduce the variance in reward signal
-                # reward = post_data['lastquality'] - 10 * ((post_data['RebufferTime'] - self.input_dict['last_total_rebuf']) > 0)
-
-                # option 4. use the metric in SIGCOMM MPC paper
-                rebuffer_time = float(post_data['RebufferTime'] -self.input_dict['last_total_rebuf'])
-
-                # --linear reward--
-                reward = VIDEO_BIT_RATE[post_data['lastquality']] / M_IN_K \
-                        - REBUF_PENALTY * rebuffer_time / M_IN_K \
-                        - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[post_data['lastquality']] -
-                                                  self.input_dict['last_bit_rate']) / M_IN_K
-
-                # --log reward--
-                # log_bit_rate = np.log(VIDEO_BIT_RATE[post_data['lastquality']] / float(VIDEO_BIT_RATE[0]))   
-                # log_last_bit_rate = np.log(self.input_dict['last_bit_rate'] / float(VIDEO_BIT_RATE[0]))
-
-                # reward = log_bit_rate \
-                #          - 4.3 * rebuffer_time / M_IN_K \
-                #          - SMOOTH_PENALTY * np.abs(log_bit_rate - log_last_bit_rate)
-
-                # --hd reward--
-                # reward = BITRATE_REWARD[post_data['lastquality']] \
-                #         - 8 * rebuffer_time / M_IN_K - np.abs(BITRATE_REWARD[post_data['lastquality']] - BITRATE_REWARD_MAP[self.input_dict['last_bit_rate']])
-
-                self.input_dict['last_bit_rate'] = VIDEO_BIT_RATE[post_data['lastquality']]
-                self.input_dict['last_total_rebuf'] = post_data['RebufferTime']
-
-                # retrieve previous state
-                if len(self.s_batch) == 0:
-                    state = [np.zeros((S_INFO, S_LEN))]
+                # requests are handled in threads, one at a time updates the shared state
+                with self.input_dict['state_lock']:
+                    # option 1. reward for just quality
+                    # reward = post_data['lastquality']
+                    # option 2. combine reward for quality and rebuffer time
+                    #           tune up the knob on rebuf to prevent it more
+                    # reward = post_data['lastquality'] - 0.1 * (post_data['RebufferTime'] - self.input_dict['last_total_rebuf'])
+                    # option 3. give a fixed penalty if video is stalled
+                    #           this can reduce the variance in reward signal
+                    # reward = post_data['lastquality'] - 10 * ((post_data['RebufferTime'] - self.input_dict['last_total_rebuf']) > 0)
+
+                    # option 4. use the metric in SIGCOMM MPC paper
+                    rebuffer_time = float(post_data['RebufferTime'] - self.session.last_total_rebuf)
+
+                    # --linear reward--
+                    reward = VIDEO_BIT_RATE[post_data['lastquality']] / M_IN_K \
+                            - REBUF_PENALTY * rebuffer_time / M_IN_K \
+                            - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[post_data['lastquality']] -
+                                                      self.session.last_bit_rate) / M_IN_K
+
+                    # --log reward--
+                    # log_bit_rate = np.log(VIDEO_BIT_RATE[post_data['lastquality']] / float(VIDEO_BIT_RATE[0]))   
+                    # log_last_bit_rate = np.log(self.input_dict['last_bit_rate'] / float(VIDEO_BIT_RATE[0]))
+
+                    # reward = log_bit_rate \
+                    #          - 4.3 * rebuffer_time / M_IN_K \
+                    #          - SMOOTH_PENALTY * np.abs(log_bit_rate - log_last_bit_rate)
+
+                    # --hd reward--
+                    # reward = BITRATE_REWARD[post_data['lastquality']] \
+                    #         - 8 * rebuffer_time / M_IN_K - np.abs(BITRATE_REWARD[post_data['lastquality']] - BITRATE_REWARD_MAP[self.input_dict['last_bit_rate']])
+
+                    self.session.last_bit_rate = VIDEO_BIT_RATE[post_data['lastquality']]
+                    self.session.last_total_rebuf = post_data['RebufferTime']
+
+                    # compute bandwidth measurement
+                    video_chunk_fetch_time = post_data['lastChunkFinishTime'] - post_data['lastChunkStartTime']
+                    video_chunk_size = post_data['lastChunkSize']
+
+                    # compute number of video chunks left
+                    video_chunk_remain = TOTAL_VIDEO_CHUNKS - self.session.video_chunk_count
+                    self.session.video_chunk_count += 1
+
+                    next_video_chunk_sizes = []
+                    for i in xrange(A_DIM):
+                        next_video_chunk_sizes.append(video_sizes.get_chunk_size(
+                            self.input_dict['video_size'], i, self.session.video_chunk_count))
+
+                    # this should be S_INFO number of terms, the history is
+                    # only shifted once the observation is known to be valid
+                    try:
+                        self.session.push([VIDEO_BIT_RATE[post_data['lastquality']] / float(np.max(VIDEO_BIT_RATE)),
+                                           post_data['buffer'] / BUFFER_NORM_FACTOR,
+                                           float(video_chunk_size) / float(video_chunk_fetch_time) / M_IN_K,  # kilo byte / ms
+                                           float(video_chunk_fetch_time) / M_IN_K / BUFFER_NORM_FACTOR,  # 10 sec
+                                           self.session.state[4, 0],  # overwritten below, as np.roll left it
+                                           np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)])
+                        self.session.state[4, :A_DIM] = np.array(next_video_chunk_sizes) / M_IN_K / M_IN_K  # mega byte
+                    except ZeroDivisionError:
+                        # this should occur VERY rarely (1 out of 3000), should be a dash issue
+                        # in this case we ignore the observation and keep the earlier one
+                        pass
+                    # other requests keep updating the history during inference
+                    state = np.array(self.session.state, copy=True)
+
+                    # log wall_time, bit_rate, buffer_size, rebuffer_time, video_chunk_size, download_time, reward
+                    self.logger.log_chunk(VIDEO_BIT_RATE[post_data['lastquality']], post_data['buffer'],
+                                          rebuffer_time / M_IN_K, video_chunk_size,
+                                          video_chunk_fetch_time, reward)
+
+                    # the last chunk is decided on the copy, so the next video
+                    # starts from a fresh history before the lock is released
+                    if ( post_data['lastRequest'] == TOTAL_VIDEO_CHUNKS ):
+                        self.session.reset()
+                        self.logger.log_end_of_video()  # so that in the log we know where video ends
+
+                if self.input_dict['batcher'] is not None:
+                    # in one sess.run with the states of concurrent requests
+                    action_prob = self.input_dict['batcher'].predict(state)
                 else:
-                    state = np.array(self.s_batch[-1], copy=True)
-
-                # compute bandwidth measurement
-                video_chunk_fetch_time = post_data['lastChunkFinishTime'] - post_data['lastChunkStartTime']
-                video_chunk_size = post_data['lastChunkSize']
-
-                # compute number of video chunks left
-                video_chunk_remain = TOTAL_VIDEO_CHUNKS - self.input_dict['video_chunk_coount']
-                self.input_dict['video_chunk_coount'] += 1
-
-                # dequeue history record
-                state = np.roll(state, -1, axis=1)
-
-                next_video_chunk_sizes = []
-                for i in xrange(A_DIM):
-                    next_video_chunk_sizes.append(get_chunk_size(i, self.input_dict['video_chunk_coount']))
-
-                # this should be S_INFO number of terms
-                try:
-                    state[0, -1] = VIDEO_BIT_RATE[post_data['lastquality']] / float(np.max(VIDEO_BIT_RATE))
-                    state[1, -1] = post_data['buffer'] / BUFFER_NORM_FACTOR
-                    state[2, -1] = float(video_chunk_size) / float(video_chunk_fetch_time) / M_IN_K  # kilo byte / ms
-                    state[3, -1] = float(video_chunk_fetch_time) / M_IN_K / BUFFER_NORM_FACTOR  # 10 sec
-                    state[4, :A_DIM] = np.array(next_video_chunk_sizes) / M_IN_K / M_IN_K  # mega byte
-                    state[5, -1] = np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)
-                except ZeroDivisionError:
-                    # this should occur VERY rarely (1 out of 3000), should be a dash issue
-                    # in this case we ignore the observation and roll back to an eariler one
-                    if len(self.s_batch) == 0:
-                        state = [np.zeros((S_INFO, S_LEN))]
-                    else:
-                        state = np.array(self.s_batch[-1], copy=True)
-
-                # log wall_time, bit_rate, buffer_size, rebuffer_time, video_chunk_size, download_time, reward
-                self.log_file.write(str(time.time()) + '\t' +
-                                    str(VIDEO_BIT_RATE[post_data['lastquality']]) + '\t' +
-                                    str(post_data['buffer']) + '\t' +
-                                    str(rebuffer_time / M_IN_K) + '\t' +
-                                    str(video_chunk_size) + '\t' +
-                                    str(video_chunk_fetch_time) + '\t' +
-                                    str(reward) + '\n')
-                self.log_file.flush()
-
-                action_prob = self.actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
+                    action_prob = self.actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
                 action_cumsum = np.cumsum(action_prob)
                 bit_rate = (action_cumsum > np.random.randint(1, RAND_RANGE) / float(RAND_RANGE)).argmax()
                 # Note: we need to discretize the probability into 1/RAND_RANGE steps,
@@ -169,14 +173,8 @@ def make_request_handler(input_dict):
                 # send data to html side
                 send_data = str(bit_rate)
 
-                end_of_video = False
                 if ( post_data['lastRequest'] == TOTAL_VIDEO_CHUNKS ):
                     send_data = "REFRESH"
-                    end_of_video = True
-                    self.input_dict['last_total_rebuf'] = 0
-                    self.input_dict['last_bit_rate'] = DEFAULT_QUALITY
-                    self.input_dict['video_chunk_coount'] = 0
-                    self.log_file.write('\n')  # so that in the log we know where video ends
 
                 self.send_response(200)
                 self.send_header('Content-Type', 'text/plain')
@@ -185,15 +183,17 @@ def make_request_handler(input_dict):
                 self.end_headers()
                 self.wfile.write(send_data)
 
-                # record [state, action, reward]
-                # put it here after training, notice there is a shift in reward storage
-
-                if end_of_video:
-                    self.s_batch = [np.zeros((S_INFO, S_LEN))]
-                else:
-                    self.s_batch.append(state)
-
         def do_GET(self):
+            if self.path == STATS_PATH and self.input_dict['batcher'] is not None:
+                # latency percentiles and batch size histogram of the inference batches
+                send_data = json.dumps(self.input_dict['batcher'].get_stats())
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', len(send_data))
+                self.end_headers()
+                self.wfile.write(send_data)
+                return
+
             print >> sys.stderr, 'GOT REQ'
             self.send_response(200)
             #self.send_header('Cache-Control', 'Cache-Control: no-cache, no-store, must-revalidate max-age=0')
@@ -208,7 +208,7 @@ def make_request_handler(input_dict):
     return Request_Handler
 
 
-def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
+def run(server_class=ThreadedHTTPServer, port=8333, log_file_path=LOG_FILE):
 
     np.random.seed(RANDOM_SEED)
 
@@ -217,7 +217,7 @@ def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
     if not os.path.exists(SUMMARY_DIR):
         os.makedirs(SUMMARY_DIR)
 
-    with tf.Session() as sess, open(log_file_path, 'wb') as log_file:
+    with tf.Session() as sess, abr_log.AbrLogger(log_file_path, BINARY_LOG) as logger:
 
         actor = a3c.ActorNetwork(sess,
                                  state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
@@ -238,26 +238,26 @@ def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
         init_action = np.zeros(A_DIM)
         init_action[DEFAULT_QUALITY] = 1
 
-        s_batch = [np.zeros((S_INFO, S_LEN))]
         a_batch = [init_action]
         r_batch = []
 
         train_counter = 0
 
-        last_bit_rate = DEFAULT_QUALITY
-        last_total_rebuf = 0
-        # need this storage, because observation only contains total rebuffering time
-        # we compute the difference to get
-
-        video_chunk_count = 0
+        # last bit rate, total rebuffering time (observations only contain the
+        # total, we compute the difference), chunk count and state history
+        session = session_state.SessionState(S_INFO, S_LEN)
 
-        input_dict = {'sess': sess, 'log_file': log_file,
+        input_dict = {'sess': sess, 'logger': logger,
                       'actor': actor, 'critic': critic,
                       'saver': saver, 'train_counter': train_counter,
-                      'last_bit_rate': last_bit_rate,
-                      'last_total_rebuf': last_total_rebuf,
-                      'video_chunk_coount': video_chunk_count,
-                      's_batch': s_batch, 'a_batch': a_batch, 'r_batch': r_batch}
+                      'session': session,
+                      'a_batch': a_batch, 'r_batch': r_batch,
+                      'video_size': video_sizes.load_video(path=VIDEO_MANIFEST),
+                      'state_lock': threading.Lock(),
+                      'batcher': None}
+        if BATCH_INFERENCE:
+            input_dict['batcher'] = inference_batcher.InferenceBatcher(
+                actor.predict, BATCH_WINDOW, MAX_BATCH)
 
         # interface to abr_rl server
         handler_class = make_request_handler(input_dict=input_dict)
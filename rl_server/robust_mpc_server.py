@@ -11,7 +11,11 @@ os.environ['CUDA_VISIBLE_DEVICES']=''
 
 import numpy as np
 import time
-import itertools
+import mpc_planner
+import mpc_cache
+import session_state
+import video_sizes
+import abr_log
 
 ################## ROBUST MPC ###################
 
@@ -26,6 +30,8 @@ BUFFER_NORM_FACTOR = 10.0
 CHUNK_TIL_VIDEO_END_CAP = 48.0
 TOTAL_VIDEO_CHUNKS = 48
 DEFAULT_QUALITY = 0  # default video quality without agent
+# kilo byte / ms, the bandwidth estimate while no chunk of the video was measured
+DEFAULT_BANDWIDTH_EST = VIDEO_BIT_RATE[DEFAULT_QUALITY] / 8.0 / M_IN_K
 REBUF_PENALTY = 4.3  # 1 sec rebuffering -> this number of Mbps
 SMOOTH_PENALTY = 1
 TRAIN_SEQ_LEN = 100  # take as a train batch
@@ -34,38 +40,34 @@ RANDOM_SEED = 42
 RAND_RANGE = 1000
 SUMMARY_DIR = './results'
 LOG_FILE = './results/log'
+# fixed-width records in ./results_binary, python read_log.py writes the text logs
+BINARY_LOG = True
 # in format of time_stamp bit_rate buffer_size rebuffer_time video_chunk_size download_time reward
 NN_MODEL = None
+# evaluate all bitrate combinations at once with numpy instead of
+# the branch and bound of mpc_planner.plan, both pick the same bitrate
+VECTORIZED_MPC = False
+# reuse the decision for requests whose quantized state was seen recently,
+# see test/mpc_cache_loss.py for the reward lost with each bucket width;
+# off, since on the test traces it hits under 2% of the decisions
+DECISION_CACHE = False
+CACHE_SIZE = mpc_cache.CACHE_SIZE
+BUFFER_BUCKET = mpc_cache.BUFFER_BUCKET  # sec
+BANDWIDTH_BUCKET = mpc_cache.BANDWIDTH_BUCKET  # relative
+CACHE_STATS_INTERVAL = 1000  # print the cache counters every this many decisions
+
+# chunk sizes of every bitrate, loaded once from the segments of the manifest
+VIDEO_MANIFEST = '../video_server/Manifest.mpd'
 
-CHUNK_COMBO_OPTIONS = []
-
-# past errors in bandwidth
-past_errors = []
-past_bandwidth_ests = []
-
-# video chunk sizes
-size_video1 = [2354772, 2123065, 2177073, 2160877, 2233056, 1941625, 2157535, 2290172, 2055469, 2169201, 2173522, 2102452, 2209463, 2275376, 2005399, 2152483, 2289689, 2059512, 2220726, 2156729, 2039773, 2176469, 2221506, 2044075, 2186790, 2105231, 2395588, 1972048, 2134614, 2164140, 2113193, 2147852, 2191074, 2286761, 2307787, 2143948, 1919781, 2147467, 2133870, 2146120, 2108491, 2184571, 2121928, 2219102, 2124950, 2246506, 1961140, 2155012, 1433658]
-size_video2 = [1728879, 1431809, 1300868, 1520281, 1472558, 1224260, 1388403, 1638769, 1348011, 1429765, 1354548, 1519951, 1422919, 1578343, 1231445, 1471065, 1491626, 1358801, 1537156, 1336050, 1415116, 1468126, 1505760, 1323990, 1383735, 1480464, 1547572, 1141971, 1498470, 1561263, 1341201, 1497683, 1358081, 1587293, 1492672, 1439896, 1139291, 1499009, 1427478, 1402287, 1339500, 1527299, 1343002, 1587250, 1464921, 1483527, 1231456, 1364537, 889412]
-size_video3 = [1034108, 957685, 877771, 933276, 996749, 801058, 905515, 1060487, 852833, 913888, 939819, 917428, 946851, 1036454, 821631, 923170, 966699, 885714, 987708, 923755, 891604, 955231, 968026, 874175, 897976, 905935, 1076599, 758197, 972798, 975811, 873429, 954453, 885062, 1035329, 1026056, 943942, 728962, 938587, 908665, 930577, 858450, 1025005, 886255, 973972, 958994, 982064, 830730, 846370, 598850]
-size_video4 = [668286, 611087, 571051, 617681, 652874, 520315, 561791, 709534, 584846, 560821, 607410, 594078, 624282, 687371, 526950, 587876, 617242, 581493, 639204, 586839, 601738, 616206, 656471, 536667, 587236, 590335, 696376, 487160, 622896, 641447, 570392, 620283, 584349, 670129, 690253, 598727, 487812, 575591, 605884, 587506, 566904, 641452, 599477, 634861, 630203, 638661, 538612, 550906, 391450]
-size_video5 = [450283, 398865, 350812, 382355, 411561, 318564, 352642, 437162, 374758, 362795, 353220, 405134, 386351, 434409, 337059, 366214, 360831, 372963, 405596, 350713, 386472, 399894, 401853, 343800, 359903, 379700, 425781, 277716, 400396, 400508, 358218, 400322, 369834, 412837, 401088, 365161, 321064, 361565, 378327, 390680, 345516, 384505, 372093, 438281, 398987, 393804, 331053, 314107, 255954]
-size_video6 = [181801, 155580, 139857, 155432, 163442, 126289, 153295, 173849, 150710, 139105, 141840, 156148, 160746, 179801, 140051, 138313, 143509, 150616, 165384, 140881, 157671, 157812, 163927, 137654, 146754, 153938, 181901, 111155, 153605, 149029, 157421, 157488, 143881, 163444, 179328, 159914, 131610, 124011, 144254, 149991, 147968, 161857, 145210, 172312, 167025, 160064, 137507, 118421, 112270]
-
-def get_chunk_size(quality, index):
-    if ( index < 0 or index > 48 ):
-        return 0
-    # note that the quality and video labels are inverted (i.e., quality 8 is highest and this pertains to video1)
-    sizes = {5: size_video1[index], 4: size_video2[index], 3: size_video3[index], 2: size_video4[index], 1: size_video5[index], 0: size_video6[index]}
-    return sizes[quality]
 
 def make_request_handler(input_dict):
 
     class Request_Handler(BaseHTTPRequestHandler):
         def __init__(self, *args, **kwargs):
             self.input_dict = input_dict
-            self.log_file = input_dict['log_file']
+            self.logger = input_dict['logger']
             #self.saver = input_dict['saver']
-            self.s_batch = input_dict['s_batch']
+            self.session = input_dict['session']
             #self.a_batch = input_dict['a_batch']
             #self.r_batch = input_dict['r_batch']
             BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
@@ -73,7 +75,6 @@ def make_request_handler(input_dict):
         def do_POST(self):
             content_length = int(self.headers['Content-Length'])
             post_data = json.loads(self.rfile.read(content_length))
-            print post_data
 
             if ( 'pastThroughput' in post_data ):
                 # @Hongzi: this is just the summary of throughput/quality at the end of the load
@@ -90,13 +91,13 @@ def make_request_handler(input_dict):
                 # reward = post_data['lastquality'] - 10 * ((post_data['RebufferTime'] - self.input_dict['last_total_rebuf']) > 0)
 
                 # option 4. use the metric in SIGCOMM MPC paper
-                rebuffer_time = float(post_data['RebufferTime'] -self.input_dict['last_total_rebuf'])
+                rebuffer_time = float(post_data['RebufferTime'] - self.session.last_total_rebuf)
 
                 # --linear reward--
                 reward = VIDEO_BIT_RATE[post_data['lastquality']] / M_IN_K \
                         - REBUF_PENALTY * rebuffer_time / M_IN_K \
                         - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[post_data['lastquality']] -
-                                                  self.input_dict['last_bit_rate']) / M_IN_K
+                                                  self.session.last_bit_rate) / M_IN_K
 
                 # --log reward--
                 # log_bit_rate = np.log(VIDEO_BIT_RATE[post_data['lastquality']] / float(VIDEO_BIT_RATE[0]))   
@@ -110,79 +111,64 @@ def make_request_handler(input_dict):
                 # reward = BITRATE_REWARD[post_data['lastquality']] \
                 #         - 8 * rebuffer_time / M_IN_K - np.abs(BITRATE_REWARD[post_data['lastquality']] - BITRATE_REWARD_MAP[self.input_dict['last_bit_rate']])
 
-                self.input_dict['last_bit_rate'] = VIDEO_BIT_RATE[post_data['lastquality']]
-                self.input_dict['last_total_rebuf'] = post_data['RebufferTime']
-
-                # retrieve previous state
-                if len(self.s_batch) == 0:
-                    state = [np.zeros((S_INFO, S_LEN))]
-                else:
-                    state = np.array(self.s_batch[-1], copy=True)
+                self.session.last_bit_rate = VIDEO_BIT_RATE[post_data['lastquality']]
+                self.session.last_total_rebuf = post_data['RebufferTime']
 
                 # compute bandwidth measurement
                 video_chunk_fetch_time = post_data['lastChunkFinishTime'] - post_data['lastChunkStartTime']
                 video_chunk_size = post_data['lastChunkSize']
 
                 # compute number of video chunks left
-                video_chunk_remain = TOTAL_VIDEO_CHUNKS - self.input_dict['video_chunk_coount']
-                self.input_dict['video_chunk_coount'] += 1
-
-                # dequeue history record
-                state = np.roll(state, -1, axis=1)
+                video_chunk_remain = TOTAL_VIDEO_CHUNKS - self.session.video_chunk_count
+                self.session.video_chunk_count += 1
 
-                # this should be S_INFO number of terms
+                # this should be S_INFO number of terms, the history is
+                # only shifted once the observation is known to be valid
                 try:
-                    state[0, -1] = VIDEO_BIT_RATE[post_data['lastquality']] / float(np.max(VIDEO_BIT_RATE))
-                    state[1, -1] = post_data['buffer'] / BUFFER_NORM_FACTOR
-                    state[2, -1] = rebuffer_time / M_IN_K
-                    state[3, -1] = float(video_chunk_size) / float(video_chunk_fetch_time) / M_IN_K  # kilo byte / ms
-                    state[4, -1] = np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)
+                    bandwidth = float(video_chunk_size) / float(video_chunk_fetch_time) / M_IN_K  # kilo byte / ms
                     curr_error = 0 # defualt assumes that this is the first request so error is 0 since we have never predicted bandwidth
-                    if ( len(past_bandwidth_ests) > 0 ):
-                        curr_error  = abs(past_bandwidth_ests[-1]-state[3,-1])/float(state[3,-1])
-                    past_errors.append(curr_error)
+                    if ( len(self.session.past_bandwidth_ests) > 0 ):
+                        curr_error  = abs(self.session.past_bandwidth_ests[-1]-bandwidth)/float(bandwidth)
+                    self.session.push([VIDEO_BIT_RATE[post_data['lastquality']] / float(np.max(VIDEO_BIT_RATE)),
+                                       post_data['buffer'] / BUFFER_NORM_FACTOR,
+                                       rebuffer_time / M_IN_K,
+                                       bandwidth,
+                                       np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)])
+                    self.session.past_errors.append(curr_error)
                 except ZeroDivisionError:
                     # this should occur VERY rarely (1 out of 3000), should be a dash issue
-                    # in this case we ignore the observation and roll back to an eariler one
-                    past_errors.append(0)
-                    if len(self.s_batch) == 0:
-                        state = [np.zeros((S_INFO, S_LEN))]
-                    else:
-                        state = np.array(self.s_batch[-1], copy=True)
+                    # in this case we ignore the observation and keep the earlier one
+                    self.session.past_errors.append(0)
+                state = self.session.state
 
                 # log wall_time, bit_rate, buffer_size, rebuffer_time, video_chunk_size, download_time, reward
-                self.log_file.write(str(time.time()) + '\t' +
-                                    str(VIDEO_BIT_RATE[post_data['lastquality']]) + '\t' +
-                                    str(post_data['buffer']) + '\t' +
-                                    str(rebuffer_time / M_IN_K) + '\t' +
-                                    str(video_chunk_size) + '\t' +
-                                    str(video_chunk_fetch_time) + '\t' +
-                                    str(reward) + '\n')
-                self.log_file.flush()
+                self.logger.log_chunk(VIDEO_BIT_RATE[post_data['lastquality']], post_data['buffer'],
+                                      rebuffer_time / M_IN_K, video_chunk_size,
+                                      video_chunk_fetch_time, reward)
 
                 # pick bitrate according to MPC           
                 # first get harmonic mean of last 5 bandwidths
                 past_bandwidths = state[3,-5:]
-                while past_bandwidths[0] == 0.0:
+                while len(past_bandwidths) > 0 and past_bandwidths[0] == 0.0:
                     past_bandwidths = past_bandwidths[1:]
                 #if ( len(state) < 5 ):
                 #    past_bandwidths = state[3,-len(state):]
                 #else:
                 #    past_bandwidths = state[3,-5:]
-                bandwidth_sum = 0
-                for past_val in past_bandwidths:
-                    bandwidth_sum += (1/float(past_val))
-                harmonic_bandwidth = 1.0/(bandwidth_sum/len(past_bandwidths))
+                if len(past_bandwidths) == 0:
+                    # every chunk of the video so far was a dash glitch, nothing measured yet
+                    harmonic_bandwidth = DEFAULT_BANDWIDTH_EST
+                else:
+                    bandwidth_sum = 0
+                    for past_val in past_bandwidths:
+                        bandwidth_sum += (1/float(past_val))
+                    harmonic_bandwidth = 1.0/(bandwidth_sum/len(past_bandwidths))
 
                 # future bandwidth prediction
                 # divide by 1 + max of last 5 (or up to 5) errors
-                max_error = 0
-                error_pos = -5
-                if ( len(past_errors) < 5 ):
-                    error_pos = -len(past_errors)
-                max_error = float(max(past_errors[error_pos:]))
+                max_error = float(max(self.session.past_errors))
                 future_bandwidth = harmonic_bandwidth/(1+max_error)
-                past_bandwidth_ests.append(harmonic_bandwidth)
+                self.session.past_bandwidth_ests.append(harmonic_bandwidth)
 
 
                 # future chunks length (try 4 if that many remaining)
@@ -191,78 +177,45 @@ def make_request_handler(input_dict):
                 if ( TOTAL_VIDEO_CHUNKS - last_index < 5 ):
                     future_chunk_length = TOTAL_VIDEO_CHUNKS - last_index
 
-                # all possible combinations of 5 chunk bitrates (9^5 options)
-                # iterate over list and for each, compute reward and store max reward combination
-                max_reward = -100000000
-                best_combo = ()
+                # best combination of the future chunk bitrates, found by
+                # branch and bound instead of trying all 6^5 of them
                 start_buffer = float(post_data['buffer'])
-                #start = time.time()
-                for full_combo in CHUNK_COMBO_OPTIONS:
-                    combo = full_combo[0:future_chunk_length]
-                    # calculate total rebuffer time for this combination (start with start_buffer and subtract
-                    # each download time and add 2 seconds in that order)
-                    curr_rebuffer_time = 0
-                    curr_buffer = start_buffer
-                    bitrate_sum = 0
-                    smoothness_diffs = 0
-                    last_quality = int(post_data['lastquality'])
-                    for position in range(0, len(combo)):
-                        chunk_quality = combo[position]
-                        index = last_index + position + 1 # e.g., if last chunk is 3, then first iter is 3+0+1=4
-                        download_time = (get_chunk_size(chunk_quality, index)/1000000.)/future_bandwidth # this is MB/MB/s --> seconds
-                        if ( curr_buffer < download_time ):
-                            curr_rebuffer_time += (download_time - curr_buffer)
-                            curr_buffer = 0
-                        else:
-                            curr_buffer -= download_time
-                        curr_buffer += 4
-                        
-                        # linear reward
-                        #bitrate_sum += VIDEO_BIT_RATE[chunk_quality]
-                        #smoothness_diffs += abs(VIDEO_BIT_RATE[chunk_quality] - VIDEO_BIT_RATE[last_quality])
-
-                        # log reward
-                        # log_bit_rate = np.log(VIDEO_BIT_RATE[chunk_quality] / float(VIDEO_BIT_RATE[0]))
-                        # log_last_bit_rate = np.log(VIDEO_BIT_RATE[last_quality] / float(VIDEO_BIT_RATE[0]))
-                        # bitrate_sum += log_bit_rate
-                        # smoothness_diffs += abs(log_bit_rate - log_last_bit_rate)
-
-                        # hd reward
-                        bitrate_sum += BITRATE_REWARD[chunk_quality]
-                        smoothness_diffs += abs(BITRATE_REWARD[chunk_quality] - BITRATE_REWARD[last_quality])
-
-                        last_quality = chunk_quality
-                    # compute reward for this combination (one reward per 5-chunk combo)
-                    # bitrates are in Mbits/s, rebuffer in seconds, and smoothness_diffs in Mbits/s
-                    
-                    # linear reward 
-                    #reward = (bitrate_sum/1000.) - (4.3*curr_rebuffer_time) - (smoothness_diffs/1000.)
-
-                    # log reward
-                    # reward = (bitrate_sum) - (4.3*curr_rebuffer_time) - (smoothness_diffs)
-
-                    # hd reward
-                    reward = bitrate_sum - (8*curr_rebuffer_time) - (smoothness_diffs)
-
-                    if ( reward > max_reward ):
-                        max_reward = reward
-                        best_combo = combo
+                last_quality = int(post_data['lastquality'])
+
+                def plan():
+                    chunk_sizes = video_sizes.get_future_chunk_sizes(
+                        self.input_dict['video_size'], last_index, future_chunk_length)
+                    download_times = mpc_planner.get_download_times(chunk_sizes, future_bandwidth)
+
+                    # hd reward, bitrate_sum - (8*curr_rebuffer_time) - (smoothness_diffs)
+                    # linear reward would be VIDEO_BIT_RATE, 4.3, utility_scale=1000.
+                    planner = mpc_planner.plan
+                    if VECTORIZED_MPC:
+                        planner = mpc_planner.plan_vectorized
+                    best_quality, max_reward = planner(
+                        download_times, last_quality, start_buffer,
+                        BITRATE_REWARD, 8, utility_scale=1.)
+                    return best_quality
+
+                decision_cache = self.input_dict['decision_cache']
+                if decision_cache is None:
+                    best_quality = plan()
+                else:
+                    best_quality = decision_cache.decide(
+                        start_buffer, last_quality, last_index, future_bandwidth, plan)
+                    stats = decision_cache.get_stats()
+                    if stats['lookups'] % CACHE_STATS_INTERVAL == 0:
+                        print 'Decision cache: ', stats
                 # send data to html side (first chunk of best combo)
-                send_data = 0 # no combo had reward better than -1000000 (ERROR) so send 0
-                if ( best_combo != () ): # some combo was good
-                    send_data = str(best_combo[0])
+                send_data = str(best_quality)
 
                 end = time.time()
                 #print "TOOK: " + str(end-start)
 
-                end_of_video = False
                 if ( post_data['lastRequest'] == TOTAL_VIDEO_CHUNKS ):
                     send_data = "REFRESH"
-                    end_of_video = True
-                    self.input_dict['last_total_rebuf'] = 0
-                    self.input_dict['last_bit_rate'] = DEFAULT_QUALITY
-                    self.input_dict['video_chunk_coount'] = 0
-                    self.log_file.write('\n')  # so that in the log we know where video ends
+                    self.session.reset()
+                    self.logger.log_end_of_video()  # so that in the log we know where video ends
 
                 self.send_response(200)
                 self.send_header('Content-Type', 'text/plain')
@@ -271,14 +224,6 @@ def make_request_handler(input_dict):
                 self.end_headers()
                 self.wfile.write(send_data)
 
-                # record [state, action, reward]
-                # put it here after training, notice there is a shift in reward storage
-
-                if end_of_video:
-                    self.s_batch = [np.zeros((S_INFO, S_LEN))]
-                else:
-                    self.s_batch.append(state)
-
         def do_GET(self):
             print >> sys.stderr, 'GOT REQ'
             self.send_response(200)
@@ -301,26 +246,19 @@ def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
     if not os.path.exists(SUMMARY_DIR):
         os.makedirs(SUMMARY_DIR)
 
-    # make chunk combination options
-    for combo in itertools.product([0,1,2,3,4,5], repeat=5):
-        CHUNK_COMBO_OPTIONS.append(combo)
-
-    with open(log_file_path, 'wb') as log_file:
-
-        s_batch = [np.zeros((S_INFO, S_LEN))]
-
-        last_bit_rate = DEFAULT_QUALITY
-        last_total_rebuf = 0
-        # need this storage, because observation only contains total rebuffering time
-        # we compute the difference to get
+    with abr_log.AbrLogger(log_file_path, BINARY_LOG) as logger:
 
-        video_chunk_count = 0
+        # last bit rate, total rebuffering time (observations only contain the
+        # total, we compute the difference), chunk count and state history
+        session = session_state.SessionState(S_INFO, S_LEN)
 
-        input_dict = {'log_file': log_file,
-                      'last_bit_rate': last_bit_rate,
-                      'last_total_rebuf': last_total_rebuf,
-                      'video_chunk_coount': video_chunk_count,
-                      's_batch': s_batch}
+        input_dict = {'logger': logger,
+                      'session': session,
+                      'video_size': video_sizes.load_video(path=VIDEO_MANIFEST),
+                      'decision_cache': None}
+        if DECISION_CACHE:
+            input_dict['decision_cache'] = mpc_cache.DecisionCache(
+                CACHE_SIZE, BUFFER_BUCKET, BANDWIDTH_BUCKET)
 
         # interface to abr_rl server
         handler_class = make_request_handler(input_dict=input_dict)
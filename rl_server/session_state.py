@@ -0,0 +1,35 @@
+import collections
+import numpy as np
+
+
+# state of one player with a bounded history: the (s_info, s_len) state
+# is preallocated and shifted in place, and the past robustMPC errors and
+# bandwidth estimates are ring buffers of the few entries that are read,
+# so a long running server keeps flat memory and a constant cost per request
+PAST_BANDWIDTHS = 5  # robustMPC reads the last 5
+DEFAULT_QUALITY = 0
+
+
+class SessionState(object):
+    def __init__(self, s_info, s_len, history=PAST_BANDWIDTHS):
+        self.state = np.zeros((s_info, s_len))
+        # kept across videos
+        self.past_errors = collections.deque(maxlen=history)
+        self.past_bandwidth_ests = collections.deque(maxlen=history)
+        self.reset()
+
+    def reset(self):
+        # at the start of every video
+        self.last_bit_rate = DEFAULT_QUALITY
+        self.last_total_rebuf = 0
+        self.video_chunk_count = 0
+        self.state.fill(0)
+
+    def push(self, column):
+        """
+        Shifts the history one step to the left in place and writes
+        column (s_info values) as the newest one, the same as np.roll
+        by -1 and setting state[:, -1].
+        """
+        self.state[:, :-1] = self.state[:, 1:]
+        self.state[:, -1] = column
@@ -10,7 +10,7 @@ import json
 
 from collections import deque
 import numpy as np
-import time
+import abr_log
 
 
 VIDEO_BIT_RATE = [300,750,1200,1850,2850,4300]  # Kbps
@@ -23,6 +23,8 @@ SMOOTH_PENALTY = 1
 TOTAL_VIDEO_CHUNKS = 48
 SUMMARY_DIR = './results'
 LOG_FILE = './results/log'
+# fixed-width records in ./results_binary, python read_log.py writes the text logs
+BINARY_LOG = True
 # in format of time_stamp bit_rate buffer_size rebuffer_time video_chunk_size download_time reward
 
 
@@ -31,14 +33,13 @@ def make_request_handler(input_dict):
     class Request_Handler(BaseHTTPRequestHandler):
         def __init__(self, *args, **kwargs):
             self.input_dict = input_dict
-            self.log_file = input_dict['log_file']
+            self.logger = input_dict['logger']
             BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
 
         def do_POST(self):
             content_length = int(self.headers['Content-Length'])
             post_data = json.loads(self.rfile.read(content_length))
             
-            print post_data
             send_data = ""
 
             if ( 'lastquality' in post_data ):
@@ -55,14 +56,9 @@ def make_request_handler(input_dict):
                 video_chunk_size = post_data['lastChunkSize']
                 
                 # log wall_time, bit_rate, buffer_size, rebuffer_time, video_chunk_size, download_time, reward
-                self.log_file.write(str(time.time()) + '\t' +
-                                    str(VIDEO_BIT_RATE[post_data['lastquality']]) + '\t' +
-                                    str(post_data['buffer']) + '\t' +
-                                    str(float(post_data['RebufferTime'] - self.input_dict['last_total_rebuf']) / M_IN_K) + '\t' +
-                                    str(video_chunk_size) + '\t' +
-                                    str(video_chunk_fetch_time) + '\t' +
-                                    str(reward) + '\n')
-                self.log_file.flush()
+                self.logger.log_chunk(VIDEO_BIT_RATE[post_data['lastquality']], post_data['buffer'],
+                                      rebuffer_time / M_IN_K, video_chunk_size,
+                                      video_chunk_fetch_time, reward)
 
                 self.input_dict['last_total_rebuf'] = post_data['RebufferTime']
                 self.input_dict['last_bit_rate'] = VIDEO_BIT_RATE[post_data['lastquality']]
@@ -71,7 +67,7 @@ def make_request_handler(input_dict):
                     send_data = "REFRESH"
                     self.input_dict['last_total_rebuf'] = 0
                     self.input_dict['last_bit_rate'] = DEFAULT_QUALITY
-                    self.log_file.write('\n')  # so that in the log we know where video ends
+                    self.logger.log_end_of_video()  # so that in the log we know where video ends
 
             self.send_response(200)
             self.send_header('Content-Type', 'text/plain')
@@ -100,11 +96,11 @@ def run(server_class=HTTPServer, port=8333, log_file_path=LOG_FILE):
     if not os.path.exists(SUMMARY_DIR):
         os.makedirs(SUMMARY_DIR)
 
-    with open(log_file_path, 'wb') as log_file:
+    with abr_log.AbrLogger(log_file_path, BINARY_LOG) as logger:
 
         last_bit_rate = DEFAULT_QUALITY
         last_total_rebuf = 0 
-        input_dict = {'log_file': log_file,
+        input_dict = {'logger': logger,
                       'last_bit_rate': last_bit_rate,
                       'last_total_rebuf': last_total_rebuf}
 
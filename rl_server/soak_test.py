@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import urllib2
+import subprocess
+import numpy as np
+
+
+# starts an ABR server and plays videos against it for a long time from
+# one client, printing the memory of the server and the latency of the
+# requests as it goes: both should stay flat
+# usage: python soak_test.py [server script] [num_requests]
+SERVER = 'robust_mpc_server.py'
+SERVER_URL = 'http://localhost:8333'
+NUM_REQUESTS = 100000
+REPORT_INTERVAL = 5000  # requests
+SERVER_START_TIME = 5.0  # sec, wait before the first request
+MIN_CHUNK_SIZE = 100000  # bytes
+MAX_CHUNK_SIZE = 2500000  # bytes
+MIN_FETCH_TIME = 200  # ms
+MAX_FETCH_TIME = 5000  # ms
+MAX_BUFFER = 60.0  # sec
+M_IN_K = 1000.0
+RANDOM_SEED = 42
+
+
+def get_memory(pid):
+    # resident memory of the process in MB
+    with open('/proc/' + str(pid) + '/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / M_IN_K
+    return 0.0
+
+
+def main():
+    server = SERVER
+    num_requests = NUM_REQUESTS
+    if len(sys.argv) > 1:
+        server = sys.argv[1]
+    if len(sys.argv) > 2:
+        num_requests = int(sys.argv[2])
+
+    np.random.seed(RANDOM_SEED)
+
+    with open(os.devnull, 'wb') as devnull:
+        server_process = subprocess.Popen([sys.executable, server], stdout=devnull, stderr=devnull)
+    time.sleep(SERVER_START_TIME)
+
+    try:
+        last_quality = 0
+        chunk_index = 1
+        rebuffer_time = 0
+        chunk_time = 0
+        latencies = []
+        start = time.time()
+
+        for i in xrange(num_requests):
+            fetch_time = np.random.randint(MIN_FETCH_TIME, MAX_FETCH_TIME)
+            post_data = {'lastquality': last_quality,
+                         'buffer': np.random.uniform(0, MAX_BUFFER),
+                         'RebufferTime': rebuffer_time,
+                         'lastChunkStartTime': chunk_time,
+                         'lastChunkFinishTime': chunk_time + fetch_time,
+                         'lastChunkSize': np.random.randint(MIN_CHUNK_SIZE, MAX_CHUNK_SIZE),
+                         'lastRequest': chunk_index}
+            chunk_time += fetch_time
+
+            request_start = time.time()
+            response = urllib2.urlopen(SERVER_URL, json.dumps(post_data)).read()
+            latencies.append(time.time() - request_start)
+
+            if response == 'REFRESH':
+                last_quality = 0
+                chunk_index = 1
+                rebuffer_time = 0
+            else:
+                last_quality = int(response)
+                chunk_index += 1
+                if np.random.randint(10) == 0:
+                    rebuffer_time += np.random.randint(MAX_FETCH_TIME)
+
+            if (i + 1) % REPORT_INTERVAL == 0:
+                print('requests: ' + str(i + 1) +
+                      '\telapsed: ' + str(time.time() - start) + ' sec' +
+                      '\tserver memory: ' + str(get_memory(server_process.pid)) + ' MB' +
+                      '\tlatency p50: ' + str(np.percentile(latencies, 50) * M_IN_K) + ' ms' +
+                      '\tp99: ' + str(np.percentile(latencies, 99) * M_IN_K) + ' ms')
+                sys.stdout.flush()
+                latencies = []
+    finally:
+        server_process.terminate()
+
+
+if __name__ == '__main__':
+    main()
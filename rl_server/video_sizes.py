@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import xml.etree.ElementTree as ET
+
+
+# chunk sizes of a video as one [bitrate levels, chunks] matrix in bytes,
+# quality 0 being the lowest bitrate, loaded once instead of hard-coded
+# lists, and a registry of these matrices by video title
+VIDEO_SIZE_FILE = './video_size_'
+VIDEO_MANIFEST = '../video_server/Manifest.mpd'
+BITRATE_LEVELS = 6
+MPD_NAMESPACE = '{urn:mpeg:dash:schema:mpd:2011}'
+DEFAULT_VIDEO = 'default'
+
+# title -> chunk size matrix
+video_size_registry = {}
+
+
+def load_video_size(video_size_file=VIDEO_SIZE_FILE, bitrate_levels=BITRATE_LEVELS):
+    # from the video_size_[quality] files written by get_video_sizes.py
+    video_size = []
+    for bitrate in xrange(bitrate_levels):
+        video_size.append([])
+        with open(video_size_file + str(bitrate)) as f:
+            for line in f:
+                video_size[bitrate].append(int(line.split()[0]))
+    return np.array(video_size, dtype=np.int64)
+
+
+def load_manifest(manifest_path=VIDEO_MANIFEST):
+    """
+    From the segment files of a DASH manifest with a SegmentTemplate,
+    e.g. video_server/Manifest.mpd, representations sorted by bandwidth.
+    """
+    video_dir = os.path.dirname(manifest_path)
+    mpd = ET.parse(manifest_path).getroot()
+
+    video_size = []
+    for adaptation_set in mpd.iter(MPD_NAMESPACE + 'AdaptationSet'):
+        template = adaptation_set.find(MPD_NAMESPACE + 'SegmentTemplate')
+        representations = adaptation_set.findall(MPD_NAMESPACE + 'Representation')
+        representations.sort(key=lambda r: int(r.get('bandwidth')))
+        for representation in representations:
+            sizes = []
+            chunk_num = int(template.get('startNumber', 1))
+            while True:
+                chunk_path = os.path.join(
+                    video_dir, template.get('media')
+                    .replace('$RepresentationID$', representation.get('id'))
+                    .replace('$Number$', str(chunk_num)))
+                if not os.path.exists(chunk_path):
+                    break
+                sizes.append(os.path.getsize(chunk_path))
+                chunk_num += 1
+            video_size.append(sizes)
+
+    assert len(set([len(sizes) for sizes in video_size])) == 1
+    return np.array(video_size, dtype=np.int64)
+
+
+def register_video(title, video_size):
+    video_size_registry[title] = np.asarray(video_size, dtype=np.int64)
+    return video_size_registry[title]
+
+
+def load_video(title=DEFAULT_VIDEO, path=VIDEO_SIZE_FILE):
+    # path is a manifest (.mpd) or the prefix of the video_size files
+    if path.endswith('.mpd'):
+        return register_video(title, load_manifest(path))
+    return register_video(title, load_video_size(path))
+
+
+def get_video_size(title=DEFAULT_VIDEO):
+    return video_size_registry[title]
+
+
+def get_chunk_size(video_size, quality, index):
+    # 0 past either end of the video
+    if index < 0 or index >= video_size.shape[1]:
+        return 0
+    return int(video_size[quality, index])
+
+
+def get_future_chunk_sizes(video_size, last_index, horizon):
+    """
+    Sizes of the horizon chunks after last_index, as lists of python
+    ints per position and quality for the MPC planner.
+    """
+    indices = last_index + 1 + np.arange(horizon)
+    valid = (indices >= 0) & (indices < video_size.shape[1])
+    chunk_sizes = np.zeros((horizon, video_size.shape[0]), dtype=np.int64)
+    chunk_sizes[valid] = video_size[:, indices[valid]].T
+    return chunk_sizes.tolist()
@@ -1,6 +1,6 @@
-import os
 import numpy as np
 import matplotlib.pyplot as plt
+import results_loader
 
 
 RESULTS_FOLDER = './results/'
@@ -14,28 +14,17 @@ def main():
 	total_reward_all['FESTIVE'] = {}
 	total_reward_all['BOLA'] = {}
 
-	log_files = os.listdir(RESULTS_FOLDER)
-	for log_file in log_files:
+	all_videos = results_loader.load_results(RESULTS_FOLDER)
+	for log_file in all_videos:
 
-		R = 0
-		with open(RESULTS_FOLDER + log_file, 'rb') as f:
-			for line in f:
-				parse = line.split()
-				R += float(parse[-1])
+		# the rewards of all videos in the log
+		R = np.sum([np.sum(video[:, results_loader.REWARD]) for video in all_videos[log_file]])
 		
 		print log_file
 
-		if 'BB' in log_file:
-			total_reward_all['BB'][log_file[7:]] = R
-		elif 'RB' in log_file:
-			total_reward_all['RB'][log_file[7:]] = R
-		elif 'FIXED' in log_file:
-			total_reward_all['FIXED'][log_file[10:]] = R
-		elif 'FESTIVE' in log_file:
-			total_reward_all['FESTIVE'][log_file[12:]] = R
-		elif 'BOLA' in log_file:
-			total_reward_all['BOLA'][log_file[9:]] = R
-
+		scheme, trace = results_loader.match_scheme(log_file, total_reward_all.keys())
+		if scheme is not None:
+			total_reward_all[scheme][trace] = R
 		else:
 			print "Error: log name doesn't contain proper abr schemes."
 		
@@ -1,6 +1,6 @@
-import os
 import numpy as np
 import matplotlib.pyplot as plt
+import results_loader
 
 
 INPUT_FOLDER = './results/'
@@ -17,24 +17,12 @@ def main():
 	for scheme in SCHEMES:
 		all_total_reward[scheme] = {}
 
-	log_files = os.listdir(INPUT_FOLDER)
-	for log_file in log_files:
+	all_videos = results_loader.load_results(INPUT_FOLDER)
+	for log_file in all_videos:
 
-		bit_rate = []
-		rebuf_time = []
-
-		with open(INPUT_FOLDER + log_file, 'rb') as f: 
-			for line in f:
-				parse = line.split()
-
-				if len(parse) < 4:
-					break
-
-				bit_rate.append(float(parse[1]))
-				rebuf_time.append(float(parse[3]))
-
-		bit_rate = np.array(bit_rate) / K_IN_M
-		rebuf_time = np.array(rebuf_time)
+		video = results_loader.get_video(all_videos[log_file])
+		bit_rate = video[:, results_loader.BIT_RATE] / K_IN_M
+		rebuf_time = video[:, results_loader.REBUFFER_TIME]
 
 		smooth = np.abs(bit_rate[1:] - bit_rate[:-1]) 
 
@@ -63,11 +51,9 @@ def main():
 
 		total_reward = np.sum(reward)
 
-		for scheme in SCHEMES:
-			if scheme in log_file:
-				start_pt = len('log_') + len(scheme) + 1
-				all_total_reward[scheme][log_file[start_pt:]] = total_reward
-				break
+		scheme, trace = results_loader.match_scheme(log_file, SCHEMES)
+		if scheme is not None:
+			all_total_reward[scheme][trace] = total_reward
 
 	# align all records
 	all_common_total_rewards = {}
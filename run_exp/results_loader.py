@@ -0,0 +1,196 @@
+import os
+import re
+import numpy as np
+
+
+# reads the text logs of a results folder into numpy arrays: a log is parsed
+# in bulk instead of line by line and split into videos at the blank lines.
+# the arrays of all logs are kept in a results store next to the folder,
+# e.g. ./results.npy holds [total_rows, NUM_COLUMNS] float64 of all logs
+# back to back and ./results.index.npz the file names and offsets of the
+# logs and their videos with the modification time and size every log had
+# when it was parsed; only the logs that changed since are parsed again
+# log in format of time_stamp bit_rate buffer_size rebuffer_time chunk_size download_time reward
+# and the logs of dp.cc in format of chunk time_idx buffer_idx time buffer bandwidth bit_rate,
+# from the last chunk to the first after a line with the total reward
+NUM_COLUMNS = 7
+TIME_STAMP = 0
+BIT_RATE = 1
+BUFFER_SIZE = 2
+REBUFFER_TIME = 3
+CHUNK_SIZE = 4
+DOWNLOAD_TIME = 5
+REWARD = 6
+DP_TIME = 3
+DP_BUFFER = 4
+DP_BANDWIDTH = 5
+DP_BIT_RATE = 6
+RESULTS_STORE_DATA = '.npy'
+RESULTS_STORE_INDEX = '.index.npz'
+BLANK_LINE = re.compile(r'\n\s*\n')
+IS_WHITESPACE = np.array([chr(c).isspace() for c in xrange(256)])  # by byte value
+NEWLINE = ord('\n')
+
+
+def get_results_store(results_folder):
+    return os.path.normpath(results_folder)
+
+
+def get_log_files(results_folder):
+    return [log_file for log_file in os.listdir(results_folder)
+            if os.path.isfile(os.path.join(results_folder, log_file))]
+
+
+def match_scheme(log_file, schemes):
+    """
+    Returns (scheme, trace) of a log named log_<scheme>_<trace>, the
+    longest scheme that matches, or (None, None).
+    """
+    for scheme in sorted(schemes, key=len, reverse=True):
+        prefix = 'log_' + scheme + '_'
+        if log_file.startswith(prefix):
+            return scheme, log_file[len(prefix):]
+    return None, None
+
+
+def count_columns(text):
+    # the number of whitespace separated fields of every line of the text
+    chars = np.frombuffer(text, dtype=np.uint8)
+    space = IS_WHITESPACE[chars]
+    field_starts = ~space
+    field_starts[1:] &= space[:-1]
+    fields_up_to = np.cumsum(field_starts, dtype=np.int32)
+    line_ends = fields_up_to[chars == NEWLINE]
+    return np.diff(np.concatenate([[0], line_ends, fields_up_to[-1:]]))
+
+
+def parse_rows(text):
+    # the rows of NUM_COLUMNS numbers, in one go when every line has
+    # them, else line by line: lines with fewer columns (the total reward
+    # of dp.cc, a line cut off while the log was written) are skipped and
+    # the columns after them (the session of the server logs) dropped
+    text = text.strip()
+    if not text:
+        return np.zeros((0, NUM_COLUMNS))
+    if np.all(count_columns(text) == NUM_COLUMNS):
+        values = np.fromstring(text, sep=' ')
+        if len(values) == (text.count('\n') + 1) * NUM_COLUMNS:
+            return values.reshape(-1, NUM_COLUMNS)
+    rows = []
+    for line in text.split('\n'):
+        parse = line.split()
+        if len(parse) >= NUM_COLUMNS:
+            try:
+                rows.append([float(value) for value in parse[:NUM_COLUMNS]])
+            except ValueError:
+                continue
+    return np.array(rows, dtype=np.float64).reshape(-1, NUM_COLUMNS)
+
+
+def parse_log(log_path):
+    # the videos of the log, each a [chunks, NUM_COLUMNS] array
+    with open(log_path, 'rb') as f:
+        text = f.read()
+    videos = [parse_rows(video_text) for video_text in BLANK_LINE.split(text)]
+    return [video for video in videos if len(video) > 0]
+
+
+def load_results_store(results_store):
+    """
+    Memory-maps a results store, returns ({log file: videos}, {log file:
+    (modification time, size) of the log when it was parsed}), each video
+    a read-only view into the mapped file.
+    """
+    for path in [results_store + RESULTS_STORE_DATA, results_store + RESULTS_STORE_INDEX]:
+        if not os.path.exists(path):
+            return {}, {}
+
+    rows = np.load(results_store + RESULTS_STORE_DATA, mmap_mode='r')
+    index = np.load(results_store + RESULTS_STORE_INDEX)
+    if 'log_mtimes' not in index.files:
+        return {}, {}  # written before the stats were kept, parsed again
+    log_offsets = index['log_offsets']
+    video_offsets = index['video_offsets']
+
+    all_videos = {}
+    log_stats = {}
+    for i, log_file in enumerate(index['file_names']):
+        starts = video_offsets[log_offsets[i]:log_offsets[i + 1] + 1]
+        all_videos[str(log_file)] = [rows[starts[j]:starts[j + 1]]
+                                     for j in xrange(len(starts) - 1)]
+        log_stats[str(log_file)] = (float(index['log_mtimes'][i]), int(index['log_sizes'][i]))
+    return all_videos, log_stats
+
+
+def save_results_store(results_store, all_videos, log_stats):
+    file_names = sorted(all_videos.keys())
+    log_mtimes = np.array([log_stats[log_file][0] for log_file in file_names], dtype=np.float64)
+    log_sizes = np.array([log_stats[log_file][1] for log_file in file_names], dtype=np.int64)
+    log_offsets = np.zeros(len(file_names) + 1, dtype=np.int64)
+    log_offsets[1:] = np.cumsum([len(all_videos[log_file]) for log_file in file_names])
+    videos = [video for log_file in file_names for video in all_videos[log_file]]
+    video_offsets = np.zeros(len(videos) + 1, dtype=np.int64)
+    video_offsets[1:] = np.cumsum([len(video) for video in videos])
+    rows = np.zeros((0, NUM_COLUMNS))
+    if len(videos) > 0:
+        rows = np.concatenate(videos)
+
+    # written under temporary names, so that a killed run leaves no partial store
+    with open(results_store + '.tmp' + RESULTS_STORE_DATA, 'wb') as f:
+        np.save(f, rows)
+    with open(results_store + '.tmp' + RESULTS_STORE_INDEX, 'wb') as f:
+        np.savez(f, file_names=np.array(file_names),
+                 log_offsets=log_offsets, video_offsets=video_offsets,
+                 log_mtimes=log_mtimes, log_sizes=log_sizes)
+    for suffix in [RESULTS_STORE_DATA, RESULTS_STORE_INDEX]:
+        os.rename(results_store + '.tmp' + suffix, results_store + suffix)
+
+
+def load_results(results_folder):
+    """
+    The videos of every log of the folder, {log file: [video, ...]}, each
+    video a [chunks, NUM_COLUMNS] float64 array. The logs whose
+    modification time or size changed since they were stored are parsed
+    and the store is written again.
+    """
+    results_store = get_results_store(results_folder)
+    stored_videos, stored_stats = load_results_store(results_store)
+
+    all_videos = {}
+    log_stats = {}
+    changed = False
+    for log_file in get_log_files(results_folder):
+        log_path = os.path.join(results_folder, log_file)
+        # taken before the log is read, so that a log written to while it
+        # is parsed differs from its stats and is parsed again next time
+        stat = os.stat(log_path)
+        log_stats[log_file] = (stat.st_mtime, stat.st_size)
+        if log_file in stored_videos and stored_stats[log_file] == log_stats[log_file]:
+            all_videos[log_file] = stored_videos[log_file]
+        else:
+            all_videos[log_file] = parse_log(log_path)
+            changed = True
+
+    if changed or len(all_videos) != len(stored_videos):
+        try:
+            save_results_store(results_store, all_videos, log_stats)
+        except (IOError, OSError):
+            pass  # a folder that cannot be written only goes without the store
+    return all_videos
+
+
+def get_video(videos, video=0):
+    # a video of a log, no rows if the log has fewer videos
+    if video >= len(videos):
+        return np.zeros((0, NUM_COLUMNS))
+    return videos[video]
+
+
+def load_dp_log(log_path, videos):
+    """
+    Returns (total reward, rows) of a dp.cc log from its videos, the rows
+    from the first chunk to the last.
+    """
+    with open(log_path, 'rb') as f:
+        total_reward = float(f.readline())
+    return total_reward, get_video(videos)[::-1]
@@ -245,6 +245,74 @@ def compute_gradients(s_batch, a_batch, r_batch, terminal, actor, critic):
     return actor_gradients, critic_gradients, td_batch
 
 
+def compute_returns(r_batches, terminals, v_batches):
+    """
+    Same returns as compute_gradients, for several sequences at once.
+    r_batches and v_batches hold one [len, 1] array per sequence; the
+    sequences are right aligned so that one backward pass over the
+    columns covers all of them.
+    """
+    lens = [len(r_batch) for r_batch in r_batches]
+    max_len = max(lens)
+
+    r_pad = np.zeros((len(r_batches), max_len))
+    R_pad = np.zeros((len(r_batches), max_len))
+    for i in xrange(len(r_batches)):
+        r_pad[i, max_len - lens[i]:] = r_batches[i][:, 0]
+        if terminals[i]:
+            R_pad[i, -1] = 0  # terminal state
+        else:
+            R_pad[i, -1] = v_batches[i][-1, 0]  # boot strap from last state
+
+    for t in reversed(xrange(max_len - 1)):
+        R_pad[:, t] = r_pad[:, t] + GAMMA * R_pad[:, t + 1]
+
+    return [R_pad[i, max_len - lens[i]:, np.newaxis] for i in xrange(len(r_batches))]
+
+
+def train_batch(s_batches, a_batches, r_batches, terminals, actor, critic):
+    """
+    Fused alternative to compute_gradients plus apply_gradients per
+    sequence: one critic forward pass over the states of all sequences,
+    then one sess.run applying the actor and critic gradients of the
+    whole batch. Returns td_batch over all the states.
+    """
+    lens = [len(s_batch) for s_batch in s_batches]
+    s_batch = np.concatenate(s_batches, axis=0)
+    a_batch = np.concatenate(a_batches, axis=0)
+
+    v_batch = critic.predict(s_batch)
+    v_batches = np.split(v_batch, np.cumsum(lens)[:-1])
+
+    R_batch = np.concatenate(compute_returns(r_batches, terminals, v_batches), axis=0)
+    td_batch = R_batch - v_batch
+
+    actor.sess.run([actor.optimize, critic.optimize], feed_dict={
+        actor.inputs: s_batch,
+        actor.acts: a_batch,
+        actor.act_grad_weights: td_batch,
+        critic.inputs: s_batch,
+        critic.td_target: R_batch
+    })
+
+    return td_batch
+
+
+def get_network_shapes(state_dim, action_dim):
+    """
+    Shapes of the actor and the critic parameters, from a scratch graph,
+    so they are known before any session is created.
+    """
+    with tf.Graph().as_default():
+        actor = ActorNetwork(None, state_dim=state_dim, action_dim=action_dim,
+                             learning_rate=0.)
+        critic = CriticNetwork(None, state_dim=state_dim, learning_rate=0.)
+        actor_shapes = [param.get_shape().as_list() for param in actor.network_params]
+        critic_shapes = [param.get_shape().as_list() for param in critic.network_params]
+
+    return actor_shapes, critic_shapes
+
+
 def discount(x, gamma):
     """
     Given vector x, computes a vector y such that
@@ -279,8 +347,10 @@ def build_summaries():
     tf.summary.scalar("Eps_total_reward", eps_total_reward)
     avg_entropy = tf.Variable(0.)
     tf.summary.scalar("Avg_entropy", avg_entropy)
+    samples_per_sec = tf.Variable(0.)
+    tf.summary.scalar("Samples_per_sec", samples_per_sec)
 
-    summary_vars = [td_loss, eps_total_reward, avg_entropy]
+    summary_vars = [td_loss, eps_total_reward, avg_entropy, samples_per_sec]
     summary_ops = tf.summary.merge_all()
 
     return summary_ops, summary_vars
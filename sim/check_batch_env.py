@@ -0,0 +1,87 @@
+import sys
+import numpy as np
+import load_trace
+import env
+
+
+# steps env.BatchEnvironment and one env.Environment per lane with the same
+# seeds, traces and qualities, and compares every returned value lane by
+# lane; the qualities are drawn up front so that both see the same ones
+# usage: python check_batch_env.py [trace_folder] [num_lanes]
+TRACE_FOLDER = './cooked_traces/'
+NUM_LANES = 8
+NUM_CHUNKS = 3 * env.TOTAL_VIDEO_CHUNCK + 5  # crosses a few ends of video
+RANDOM_SEED = 42
+RTOL = 1e-9
+ATOL = 1e-9
+FIELDS = ['delay', 'sleep_time', 'buffer_size', 'rebuf', 'video_chunk_size',
+          'next_video_chunk_sizes', 'end_of_video', 'video_chunk_remain']
+
+
+def run_scalar(all_cooked_time, all_cooked_bw, random_seed, qualities):
+    # the returned values of every chunk as [NUM_CHUNKS] arrays by field,
+    # next_video_chunk_sizes is [NUM_CHUNKS, BITRATE_LEVELS]
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw,
+                              random_seed=random_seed)
+    results = [[] for _ in FIELDS]
+    for quality in qualities:
+        values = net_env.get_video_chunk(quality)
+        for i in xrange(len(FIELDS)):
+            results[i].append(values[i])
+    return [np.array(result) for result in results]
+
+
+def run_batch(all_cooked_time, all_cooked_bw, random_seeds, qualities):
+    # the same, with a leading lane axis
+    batch_env = env.BatchEnvironment(all_cooked_time, all_cooked_bw, random_seeds)
+    results = [[] for _ in FIELDS]
+    for quality in qualities.T:
+        values = batch_env.get_video_chunk(quality)
+        for i in xrange(len(FIELDS)):
+            results[i].append(np.array(values[i], copy=True))
+    return [np.swapaxes(np.array(result), 0, 1) for result in results]
+
+
+def main():
+    trace_folder = TRACE_FOLDER
+    num_lanes = NUM_LANES
+    if len(sys.argv) > 1:
+        trace_folder = sys.argv[1]
+    if len(sys.argv) > 2:
+        num_lanes = int(sys.argv[2])
+
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace(trace_folder)
+
+    # the environments seed the global random state, draw from our own
+    rng = np.random.RandomState(RANDOM_SEED)
+    random_seeds = [RANDOM_SEED + lane for lane in xrange(num_lanes)]
+    qualities = rng.randint(env.BITRATE_LEVELS, size=(num_lanes, NUM_CHUNKS))
+
+    batch_results = run_batch(all_cooked_time, all_cooked_bw, random_seeds, qualities)
+
+    mismatches = 0
+    for lane in xrange(num_lanes):
+        scalar_results = run_scalar(all_cooked_time, all_cooked_bw,
+                                    random_seeds[lane], qualities[lane])
+        for i in xrange(len(FIELDS)):
+            expected = scalar_results[i]
+            actual = batch_results[i][lane]
+            if expected.shape != actual.shape or \
+                    not np.allclose(expected, actual, rtol=RTOL, atol=ATOL):
+                mismatches += 1
+                chunk = 0
+                if expected.shape == actual.shape:
+                    chunk = np.argwhere(~np.isclose(expected, actual, rtol=RTOL, atol=ATOL))[0][0]
+                print('mismatch in lane ' + str(lane) + ' ' + FIELDS[i] +
+                      ' from chunk ' + str(chunk) + ': ' +
+                      str(expected[chunk]) + ' vs ' + str(actual[chunk]))
+
+    print(str(num_lanes) + ' lanes, ' + str(NUM_CHUNKS) + ' chunks, ' +
+          str(num_lanes * len(FIELDS)) + ' checks, ' + str(mismatches) + ' mismatches')
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import sys
+import numpy as np
+import load_trace
+import env
+
+
+# compares the binary search on the cumulative bytes in env.py with the
+# slot by slot trace walk it replaced, over every trace in the folder
+# usage: python check_trace_index.py [trace_folder]
+TRACE_FOLDER = './cooked_traces/'
+RANDOM_SEED = 42
+STARTS_PER_TRACE = 200
+MIN_CHUNK_SIZE = 1000.0  # bytes
+MAX_CHUNK_SIZE = 1e8  # bytes, large enough to loop over short traces
+SLEEP_TIMES = [500.0, 1000.0, 1500.0, 2000.0, 2500.0, 3000.0, 3500.0, 4000.0]  # millisec
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+def walk_download(cooked_time, cooked_bw, mahimahi_ptr, last_mahimahi_time, video_chunk_size):
+    delay = 0.0
+    video_chunk_counter_sent = 0
+
+    while True:
+        throughput = cooked_bw[mahimahi_ptr] * env.B_IN_MB / env.BITS_IN_BYTE
+        duration = cooked_time[mahimahi_ptr] - last_mahimahi_time
+
+        packet_payload = throughput * duration * env.PACKET_PAYLOAD_PORTION
+
+        if video_chunk_counter_sent + packet_payload > video_chunk_size:
+            fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
+                              throughput / env.PACKET_PAYLOAD_PORTION
+            delay += fractional_time
+            last_mahimahi_time += fractional_time
+            break
+
+        video_chunk_counter_sent += packet_payload
+        delay += duration
+        last_mahimahi_time = cooked_time[mahimahi_ptr]
+        mahimahi_ptr += 1
+
+        if mahimahi_ptr >= len(cooked_bw):
+            mahimahi_ptr = 1
+            last_mahimahi_time = 0
+
+    return delay, mahimahi_ptr, last_mahimahi_time
+
+
+def walk_sleep(cooked_time, cooked_bw, mahimahi_ptr, last_mahimahi_time, sleep_time):
+    while True:
+        duration = cooked_time[mahimahi_ptr] - last_mahimahi_time
+        if duration > sleep_time / env.MILLISECONDS_IN_SECOND:
+            last_mahimahi_time += sleep_time / env.MILLISECONDS_IN_SECOND
+            break
+        sleep_time -= duration * env.MILLISECONDS_IN_SECOND
+        last_mahimahi_time = cooked_time[mahimahi_ptr]
+        mahimahi_ptr += 1
+
+        if mahimahi_ptr >= len(cooked_bw):
+            mahimahi_ptr = 1
+            last_mahimahi_time = 0
+
+    return sleep_time, mahimahi_ptr, last_mahimahi_time
+
+
+def same(expected, actual):
+    return expected[1] == actual[1] and \
+        np.allclose(expected[0], actual[0], rtol=RTOL, atol=ATOL) and \
+        np.allclose(expected[2], actual[2], rtol=RTOL, atol=ATOL)
+
+
+def main():
+    trace_folder = TRACE_FOLDER
+    if len(sys.argv) > 1:
+        trace_folder = sys.argv[1]
+
+    np.random.seed(RANDOM_SEED)
+
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(trace_folder)
+
+    num_checks = 0
+    mismatches = 0
+    for cooked_time, cooked_bw, file_name in zip(all_cooked_time, all_cooked_bw, all_file_names):
+        trace_index = env.make_trace_index(cooked_time, cooked_bw)
+
+        for _ in xrange(STARTS_PER_TRACE):
+            # start at a slot boundary or somewhere inside the slot
+            mahimahi_ptr = np.random.randint(1, len(cooked_bw))
+            last_mahimahi_time = np.random.uniform(cooked_time[mahimahi_ptr - 1],
+                                                   cooked_time[mahimahi_ptr])
+            if np.random.randint(2) == 0:
+                last_mahimahi_time = cooked_time[mahimahi_ptr - 1]
+
+            video_chunk_size = int(np.exp(np.random.uniform(np.log(MIN_CHUNK_SIZE),
+                                                            np.log(MAX_CHUNK_SIZE))))
+            expected = walk_download(cooked_time, cooked_bw,
+                                     mahimahi_ptr, last_mahimahi_time, video_chunk_size)
+            actual = env.download_chunk(trace_index,
+                                        mahimahi_ptr, last_mahimahi_time, video_chunk_size)
+            num_checks += 1
+            if not same(expected, actual):
+                mismatches += 1
+                print('download mismatch on ' + file_name + ': ' +
+                      str(expected) + ' vs ' + str(actual))
+
+            sleep_time = SLEEP_TIMES[np.random.randint(len(SLEEP_TIMES))]
+            expected = walk_sleep(cooked_time, cooked_bw,
+                                  mahimahi_ptr, last_mahimahi_time, sleep_time)
+            actual = env.skip_trace(trace_index,
+                                    mahimahi_ptr, last_mahimahi_time, sleep_time)
+            num_checks += 1
+            if not same(expected, actual):
+                mismatches += 1
+                print('sleep mismatch on ' + file_name + ': ' +
+                      str(expected) + ' vs ' + str(actual))
+
+    print(str(len(all_file_names)) + ' traces, ' + str(num_checks) +
+          ' checks, ' + str(mismatches) + ' mismatches')
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
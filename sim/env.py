@@ -1,4 +1,5 @@
 import numpy as np
+import multiprocessing as mp
 
 MILLISECONDS_IN_SECOND = 1000.0
 B_IN_MB = 1000000.0
@@ -17,8 +18,167 @@ NOISE_HIGH = 1.1
 VIDEO_SIZE_FILE = './video_size_'
 
 
+def make_trace_index(cooked_time, cooked_bw):
+    """
+    Returns (slot_time, slot_bw, cum_bytes) as numpy arrays, where
+    cum_bytes[i] is the number of bytes deliverable in mahimahi slots
+    1..i. Slot i ends at cooked_time[i] and starts at cooked_time[i - 1],
+    except slot 1 which starts at time 0 (it is only downloaded in full
+    after looping back to the beginning of the trace).
+    """
+    slot_time = np.asarray(cooked_time, dtype=np.float64)
+    slot_bw = np.asarray(cooked_bw, dtype=np.float64)
+    assert len(slot_time) == len(slot_bw)
+
+    duration = np.zeros(len(slot_time))
+    duration[1] = slot_time[1]
+    duration[2:] = slot_time[2:] - slot_time[1:-1]
+
+    throughput = slot_bw * B_IN_MB / BITS_IN_BYTE
+    packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+    packet_payload[0] = 0
+
+    return slot_time, slot_bw, np.cumsum(packet_payload)
+
+
+def download_chunk(trace_index, mahimahi_ptr, last_mahimahi_time, video_chunk_size):
+    """
+    Delivers video_chunk_size bytes starting from last_mahimahi_time
+    within slot mahimahi_ptr. The slot where the download completes is
+    found by a binary search on the cumulative bytes.
+    Returns (delay in sec, mahimahi_ptr, last_mahimahi_time).
+    """
+    slot_time, slot_bw, cum_bytes = trace_index
+
+    # the current slot is partly used already
+    throughput = slot_bw[mahimahi_ptr] * B_IN_MB / BITS_IN_BYTE
+    duration = slot_time[mahimahi_ptr] - last_mahimahi_time
+
+    packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+
+    if packet_payload > video_chunk_size:
+        fractional_time = video_chunk_size / throughput / PACKET_PAYLOAD_PORTION
+        return fractional_time, mahimahi_ptr, last_mahimahi_time + fractional_time
+
+    video_chunk_counter_sent = packet_payload  # in bytes
+    delay = duration  # in sec
+    last_mahimahi_time = slot_time[mahimahi_ptr]
+    mahimahi_ptr += 1
+
+    if mahimahi_ptr >= len(slot_bw):
+        # loop back in the beginning
+        # note: trace file starts with time 0
+        mahimahi_ptr = 1
+        last_mahimahi_time = 0
+
+    while True:
+        target = video_chunk_size - video_chunk_counter_sent + cum_bytes[mahimahi_ptr - 1]
+        if cum_bytes[-1] > target:
+            break
+
+        # the rest of the trace is not enough, loop back in the beginning
+        video_chunk_counter_sent += cum_bytes[-1] - cum_bytes[mahimahi_ptr - 1]
+        delay += slot_time[-1] - last_mahimahi_time
+        mahimahi_ptr = 1
+        last_mahimahi_time = 0
+
+    # first slot in which the sent bytes exceed the chunk size
+    end_ptr = max(int(np.searchsorted(cum_bytes, target, side='right')), mahimahi_ptr)
+    if end_ptr > mahimahi_ptr:
+        video_chunk_counter_sent += cum_bytes[end_ptr - 1] - cum_bytes[mahimahi_ptr - 1]
+        delay += slot_time[end_ptr - 1] - last_mahimahi_time
+        last_mahimahi_time = slot_time[end_ptr - 1]
+        mahimahi_ptr = end_ptr
+
+    throughput = slot_bw[mahimahi_ptr] * B_IN_MB / BITS_IN_BYTE
+    fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
+                      throughput / PACKET_PAYLOAD_PORTION
+    delay += fractional_time
+    last_mahimahi_time += fractional_time
+
+    return delay, mahimahi_ptr, last_mahimahi_time
+
+
+def skip_trace(trace_index, mahimahi_ptr, last_mahimahi_time, sleep_time):
+    """
+    Skips sleep_time (in ms) of the trace without downloading. The slot
+    where the sleep ends is found by a binary search on the slot times.
+    Returns (sleep time left in the final slot in ms, mahimahi_ptr,
+    last_mahimahi_time).
+    """
+    slot_time = trace_index[0]
+
+    while True:
+        target = last_mahimahi_time + sleep_time / MILLISECONDS_IN_SECOND
+        if slot_time[-1] > target:
+            break
+
+        # sleep beyond the end of the trace
+        sleep_time -= (slot_time[-1] - last_mahimahi_time) * MILLISECONDS_IN_SECOND
+
+        # loop back in the beginning
+        # note: trace file starts with time 0
+        mahimahi_ptr = 1
+        last_mahimahi_time = 0
+
+    # first slot that ends after the sleep
+    end_ptr = max(int(np.searchsorted(slot_time, target, side='right')), mahimahi_ptr)
+    if end_ptr > mahimahi_ptr:
+        sleep_time -= (slot_time[end_ptr - 1] - last_mahimahi_time) * MILLISECONDS_IN_SECOND
+        last_mahimahi_time = slot_time[end_ptr - 1]
+        mahimahi_ptr = end_ptr
+
+    last_mahimahi_time += sleep_time / MILLISECONDS_IN_SECOND
+
+    return sleep_time, mahimahi_ptr, last_mahimahi_time
+
+
+def share_traces(all_cooked_time, all_cooked_bw):
+    """
+    Places all traces, with their trace index, in one shared memory block
+    of [3, total_len] float64 rows (slot_time, slot_bw, cum_bytes). Returns
+    (shared_data, offsets), to be handed to worker processes and opened
+    there with attach_traces, so that the traces are held once no matter
+    how many processes use them.
+    """
+    assert len(all_cooked_time) == len(all_cooked_bw)
+
+    offsets = np.zeros(len(all_cooked_bw) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(cooked_bw) for cooked_bw in all_cooked_bw])
+
+    shared_data = mp.RawArray('d', 3 * int(offsets[-1]))
+    data = np.frombuffer(shared_data, dtype=np.float64).reshape((3, offsets[-1]))
+    for i in xrange(len(all_cooked_bw)):
+        data[:, offsets[i]:offsets[i + 1]] = \
+            make_trace_index(all_cooked_time[i], all_cooked_bw[i])
+
+    return shared_data, offsets
+
+
+def attach_traces(shared_data, offsets):
+    """
+    Returns (all_cooked_time, all_cooked_bw, all_trace_index) as views
+    into a block made by share_traces, nothing is copied.
+    """
+    data = np.frombuffer(shared_data, dtype=np.float64).reshape((3, offsets[-1]))
+
+    all_cooked_time = []
+    all_cooked_bw = []
+    all_trace_index = []
+    for i in xrange(len(offsets) - 1):
+        trace_index = (data[0, offsets[i]:offsets[i + 1]],
+                       data[1, offsets[i]:offsets[i + 1]],
+                       data[2, offsets[i]:offsets[i + 1]])
+        all_cooked_time.append(trace_index[0])
+        all_cooked_bw.append(trace_index[1])
+        all_trace_index.append(trace_index)
+
+    return all_cooked_time, all_cooked_bw, all_trace_index
+
+
 class Environment:
-    def __init__(self, all_cooked_time, all_cooked_bw, random_seed=RANDOM_SEED):
+    def __init__(self, all_cooked_time, all_cooked_bw, random_seed=RANDOM_SEED,
+                 all_trace_index=None):
         assert len(all_cooked_time) == len(all_cooked_bw)
 
         np.random.seed(random_seed)
@@ -26,6 +186,13 @@ class Environment:
         self.all_cooked_time = all_cooked_time
         self.all_cooked_bw = all_cooked_bw
 
+        # the trace index can be computed once and shared (see share_traces)
+        if all_trace_index is None:
+            all_trace_index = [make_trace_index(cooked_time, cooked_bw) for
+                               cooked_time, cooked_bw in zip(all_cooked_time, all_cooked_bw)]
+        assert len(all_trace_index) == len(all_cooked_time)
+        self.all_trace_index = all_trace_index
+
         self.video_chunk_counter = 0
         self.buffer_size = 0
 
@@ -33,6 +200,7 @@ class Environment:
         self.trace_idx = np.random.randint(len(self.all_cooked_time))
         self.cooked_time = self.all_cooked_time[self.trace_idx]
         self.cooked_bw = self.all_cooked_bw[self.trace_idx]
+        self.trace_index = self.all_trace_index[self.trace_idx]
 
         # randomize the start point of the trace
         # note: trace file starts with time 0
@@ -54,36 +222,10 @@ class Environment:
         video_chunk_size = self.video_size[quality][self.video_chunk_counter]
         
         # use the delivery opportunity in mahimahi
-        delay = 0.0  # in ms
-        video_chunk_counter_sent = 0  # in bytes
-        
-        while True:  # download video chunk over mahimahi
-            throughput = self.cooked_bw[self.mahimahi_ptr] \
-                         * B_IN_MB / BITS_IN_BYTE
-            duration = self.cooked_time[self.mahimahi_ptr] \
-                       - self.last_mahimahi_time
-	    
-            packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
-
-            if video_chunk_counter_sent + packet_payload > video_chunk_size:
-
-                fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
-                                  throughput / PACKET_PAYLOAD_PORTION
-                delay += fractional_time
-                self.last_mahimahi_time += fractional_time
-                assert(self.last_mahimahi_time <= self.cooked_time[self.mahimahi_ptr])
-                break
-
-            video_chunk_counter_sent += packet_payload
-            delay += duration
-            self.last_mahimahi_time = self.cooked_time[self.mahimahi_ptr]
-            self.mahimahi_ptr += 1
-
-            if self.mahimahi_ptr >= len(self.cooked_bw):
-                # loop back in the beginning
-                # note: trace file starts with time 0
-                self.mahimahi_ptr = 1
-                self.last_mahimahi_time = 0
+        delay, self.mahimahi_ptr, self.last_mahimahi_time = \
+            download_chunk(self.trace_index, self.mahimahi_ptr,
+                           self.last_mahimahi_time, video_chunk_size)  # in sec
+        assert(self.last_mahimahi_time <= self.cooked_time[self.mahimahi_ptr])
 
         delay *= MILLISECONDS_IN_SECOND
         delay += LINK_RTT
@@ -111,21 +253,9 @@ class Environment:
                          DRAIN_BUFFER_SLEEP_TIME
             self.buffer_size -= sleep_time
 
-            while True:
-                duration = self.cooked_time[self.mahimahi_ptr] \
-                           - self.last_mahimahi_time
-                if duration > sleep_time / MILLISECONDS_IN_SECOND:
-                    self.last_mahimahi_time += sleep_time / MILLISECONDS_IN_SECOND
-                    break
-                sleep_time -= duration * MILLISECONDS_IN_SECOND
-                self.last_mahimahi_time = self.cooked_time[self.mahimahi_ptr]
-                self.mahimahi_ptr += 1
-
-                if self.mahimahi_ptr >= len(self.cooked_bw):
-                    # loop back in the beginning
-                    # note: trace file starts with time 0
-                    self.mahimahi_ptr = 1
-                    self.last_mahimahi_time = 0
+            sleep_time, self.mahimahi_ptr, self.last_mahimahi_time = \
+                skip_trace(self.trace_index, self.mahimahi_ptr,
+                           self.last_mahimahi_time, sleep_time)
 
         # the "last buffer size" return to the controller
         # Note: in old version of dash the lowest buffer is 0.
@@ -146,6 +276,7 @@ class Environment:
             self.trace_idx = np.random.randint(len(self.all_cooked_time))
             self.cooked_time = self.all_cooked_time[self.trace_idx]
             self.cooked_bw = self.all_cooked_bw[self.trace_idx]
+            self.trace_index = self.all_trace_index[self.trace_idx]
 
             # randomize the start point of the video
             # note: trace file starts with time 0
@@ -164,3 +295,273 @@ class Environment:
             next_video_chunk_sizes, \
             end_of_video, \
             video_chunk_remain
+
+
+class BatchEnvironment:
+    """
+    Steps a batch of independent sessions at once, one lane per session.
+    Lane i reproduces Environment(random_seed=random_seeds[i]) given the
+    same sequence of qualities, but the trace walk runs over numpy arrays
+    for all lanes together.
+    """
+    def __init__(self, all_cooked_time, all_cooked_bw, random_seeds):
+        assert len(all_cooked_time) == len(all_cooked_bw)
+
+        self.num_lanes = len(random_seeds)
+
+        # each lane owns its random stream, so that the draws of one lane
+        # do not depend on how many other lanes are stepped
+        self.rngs = [np.random.RandomState(seed) for seed in random_seeds]
+
+        # concatenate all traces, trace i lives in
+        # [trace_offsets[i], trace_offsets[i] + trace_lens[i])
+        all_trace_index = [make_trace_index(cooked_time, cooked_bw) for
+                           cooked_time, cooked_bw in zip(all_cooked_time, all_cooked_bw)]
+        self.trace_lens = np.array([len(cooked_bw) for cooked_bw in all_cooked_bw])
+        self.trace_offsets = np.zeros(len(all_cooked_bw), dtype=np.int64)
+        self.trace_offsets[1:] = np.cumsum(self.trace_lens)[:-1]
+        self.all_time = np.concatenate([trace_index[0] for trace_index in all_trace_index])
+        self.all_bw = np.concatenate([trace_index[1] for trace_index in all_trace_index])
+        self.all_cum_bytes = np.concatenate([trace_index[2] for trace_index in all_trace_index])
+
+        # sorted search keys over all traces for the binary searches
+        self.time_key, self.time_base = self.make_search_key(self.all_time)
+        self.cum_bytes_key, self.cum_bytes_base = self.make_search_key(self.all_cum_bytes)
+
+        self.video_chunk_counter = np.zeros(self.num_lanes, dtype=np.int64)
+        self.buffer_size = np.zeros(self.num_lanes)
+
+        self.trace_idx = np.zeros(self.num_lanes, dtype=np.int64)
+        self.mahimahi_ptr = np.zeros(self.num_lanes, dtype=np.int64)
+        self.last_mahimahi_time = np.zeros(self.num_lanes)
+        for lane in xrange(self.num_lanes):
+            self.reset_lane(lane)
+
+        video_size = []  # in bytes
+        for bitrate in xrange(BITRATE_LEVELS):
+            video_size.append([])
+            with open(VIDEO_SIZE_FILE + str(bitrate)) as f:
+                for line in f:
+                    video_size[bitrate].append(int(line.split()[0]))
+        self.video_size = np.array(video_size, dtype=np.int64)
+
+    def make_search_key(self, values):
+        """
+        Shifts the (per trace nondecreasing) values of each trace above
+        those of the previous trace, so that one sorted array covers all
+        traces. Returns the key and the shift of each trace.
+        """
+        low = np.minimum.reduceat(values, self.trace_offsets)
+        high = np.maximum.reduceat(values, self.trace_offsets)
+        base = np.zeros(len(self.trace_offsets))
+        base[1:] = np.cumsum(high - low + 1.0)[:-1]
+        base -= low
+        return values + np.repeat(base, self.trace_lens), base
+
+    def search(self, values, key, base, lanes, target):
+        """
+        For each lane, the first ptr >= mahimahi_ptr on its trace with
+        values[ptr] > target; the caller guarantees the last value of the
+        trace exceeds target.
+        """
+        offset = self.trace_offsets[self.trace_idx[lanes]]
+        last = offset + self.trace_lens[self.trace_idx[lanes]] - 1
+
+        pos = np.searchsorted(key, target + base[self.trace_idx[lanes]], side='right')
+        pos = np.minimum(np.maximum(pos, offset), last)
+
+        # shifting by the base rounds, settle on the unshifted values
+        while True:
+            back = (pos > offset) & (values[pos - 1] > target)
+            if not np.any(back):
+                break
+            pos[back] -= 1
+        while True:
+            ahead = values[pos] <= target
+            if not np.any(ahead):
+                break
+            pos[ahead] += 1
+
+        return np.maximum(pos - offset, self.mahimahi_ptr[lanes])
+
+    def reset_lane(self, lane):
+        rng = self.rngs[lane]
+
+        # pick a random trace file
+        self.trace_idx[lane] = rng.randint(len(self.trace_lens))
+
+        # randomize the start point of the trace
+        # note: trace file starts with time 0
+        self.mahimahi_ptr[lane] = rng.randint(1, self.trace_lens[self.trace_idx[lane]])
+        self.last_mahimahi_time[lane] = \
+            self.all_time[self.trace_offsets[self.trace_idx[lane]] + self.mahimahi_ptr[lane] - 1]
+
+    def loop_back(self, lanes):
+        # loop back in the beginning
+        # note: trace file starts with time 0
+        self.mahimahi_ptr[lanes] = 1
+        self.last_mahimahi_time[lanes] = 0
+
+    def download_chunk(self, video_chunk_size):
+        """
+        Vectorized download_chunk over all lanes, returns the delay in sec.
+        """
+        offset = self.trace_offsets[self.trace_idx]
+        last = offset + self.trace_lens[self.trace_idx] - 1
+
+        # the current slot is partly used already
+        pos = offset + self.mahimahi_ptr
+        throughput = self.all_bw[pos] * B_IN_MB / BITS_IN_BYTE
+        duration = self.all_time[pos] - self.last_mahimahi_time
+
+        packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+
+        done = packet_payload > video_chunk_size
+
+        delay = np.zeros(self.num_lanes)  # in sec
+        fractional_time = video_chunk_size[done] / throughput[done] / PACKET_PAYLOAD_PORTION
+        delay[done] = fractional_time
+        self.last_mahimahi_time[done] += fractional_time
+
+        lanes = np.where(~done)[0]
+        video_chunk_counter_sent = np.zeros(self.num_lanes)  # in bytes
+        video_chunk_counter_sent[lanes] = packet_payload[lanes]
+        delay[lanes] = duration[lanes]
+        self.last_mahimahi_time[lanes] = self.all_time[pos[lanes]]
+        self.mahimahi_ptr[lanes] += 1
+        self.loop_back(lanes[self.mahimahi_ptr[lanes] > last[lanes] - offset[lanes]])
+
+        while True:
+            target = video_chunk_size[lanes] - video_chunk_counter_sent[lanes] + \
+                     self.all_cum_bytes[offset[lanes] + self.mahimahi_ptr[lanes] - 1]
+            wrap = self.all_cum_bytes[last[lanes]] <= target
+            if not np.any(wrap):
+                break
+
+            # the rest of the trace is not enough, loop back in the beginning
+            wrapped = lanes[wrap]
+            video_chunk_counter_sent[wrapped] += \
+                self.all_cum_bytes[last[wrapped]] - \
+                self.all_cum_bytes[offset[wrapped] + self.mahimahi_ptr[wrapped] - 1]
+            delay[wrapped] += self.all_time[last[wrapped]] - self.last_mahimahi_time[wrapped]
+            self.loop_back(wrapped)
+
+        # first slot in which the sent bytes exceed the chunk size
+        end_ptr = self.search(self.all_cum_bytes, self.cum_bytes_key, self.cum_bytes_base,
+                              lanes, target)
+        moved = lanes[end_ptr > self.mahimahi_ptr[lanes]]
+        end_ptr = end_ptr[end_ptr > self.mahimahi_ptr[lanes]]
+        video_chunk_counter_sent[moved] += \
+            self.all_cum_bytes[offset[moved] + end_ptr - 1] - \
+            self.all_cum_bytes[offset[moved] + self.mahimahi_ptr[moved] - 1]
+        delay[moved] += self.all_time[offset[moved] + end_ptr - 1] - self.last_mahimahi_time[moved]
+        self.last_mahimahi_time[moved] = self.all_time[offset[moved] + end_ptr - 1]
+        self.mahimahi_ptr[moved] = end_ptr
+
+        throughput = self.all_bw[offset[lanes] + self.mahimahi_ptr[lanes]] * B_IN_MB / BITS_IN_BYTE
+        fractional_time = (video_chunk_size[lanes] - video_chunk_counter_sent[lanes]) / \
+                          throughput / PACKET_PAYLOAD_PORTION
+        delay[lanes] += fractional_time
+        self.last_mahimahi_time[lanes] += fractional_time
+
+        return delay
+
+    def skip_trace(self, lanes, sleep_time):
+        """
+        Vectorized skip_trace over the given lanes, returns the sleep time
+        left in the final slot in ms.
+        """
+        offset = self.trace_offsets[self.trace_idx[lanes]]
+        last = offset + self.trace_lens[self.trace_idx[lanes]] - 1
+        sleep_time = np.array(sleep_time, dtype=np.float64)
+
+        while True:
+            target = self.last_mahimahi_time[lanes] + sleep_time / MILLISECONDS_IN_SECOND
+            wrap = self.all_time[last] <= target
+            if not np.any(wrap):
+                break
+
+            # sleep beyond the end of the trace
+            sleep_time[wrap] -= (self.all_time[last[wrap]] -
+                                 self.last_mahimahi_time[lanes[wrap]]) * MILLISECONDS_IN_SECOND
+            self.loop_back(lanes[wrap])
+
+        # first slot that ends after the sleep
+        end_ptr = self.search(self.all_time, self.time_key, self.time_base, lanes, target)
+        moved = end_ptr > self.mahimahi_ptr[lanes]
+        sleep_time[moved] -= (self.all_time[offset[moved] + end_ptr[moved] - 1] -
+                              self.last_mahimahi_time[lanes[moved]]) * MILLISECONDS_IN_SECOND
+        self.last_mahimahi_time[lanes[moved]] = self.all_time[offset[moved] + end_ptr[moved] - 1]
+        self.mahimahi_ptr[lanes[moved]] = end_ptr[moved]
+
+        self.last_mahimahi_time[lanes] += sleep_time / MILLISECONDS_IN_SECOND
+
+        return sleep_time
+
+    def get_video_chunk(self, quality):
+        """
+        quality holds one bitrate level per lane; every returned value is
+        an array over lanes, next_video_chunk_sizes is [num_lanes, BITRATE_LEVELS]
+        """
+        quality = np.asarray(quality, dtype=np.int64)
+        assert quality.shape == (self.num_lanes,)
+        assert np.all(quality >= 0)
+        assert np.all(quality < BITRATE_LEVELS)
+
+        video_chunk_size = self.video_size[quality, self.video_chunk_counter]
+
+        # use the delivery opportunity in mahimahi
+        delay = self.download_chunk(video_chunk_size)  # in sec
+
+        delay *= MILLISECONDS_IN_SECOND
+        delay += LINK_RTT
+
+        # add a multiplicative noise to the delay
+        for lane in xrange(self.num_lanes):
+            delay[lane] *= self.rngs[lane].uniform(NOISE_LOW, NOISE_HIGH)
+
+        # rebuffer time
+        rebuf = np.maximum(delay - self.buffer_size, 0.0)
+
+        # update the buffer
+        self.buffer_size = np.maximum(self.buffer_size - delay, 0.0)
+
+        # add in the new chunk
+        self.buffer_size += VIDEO_CHUNCK_LEN
+
+        # sleep if buffer gets too large
+        sleep_time = np.zeros(self.num_lanes)
+        lanes = np.where(self.buffer_size > BUFFER_THRESH)[0]
+        if len(lanes) > 0:
+            # exceed the buffer limit
+            # we need to skip some network bandwidth here
+            # but do not add up the delay
+            drain_buffer_time = self.buffer_size[lanes] - BUFFER_THRESH
+            sleep_time[lanes] = np.ceil(drain_buffer_time / DRAIN_BUFFER_SLEEP_TIME) * \
+                                DRAIN_BUFFER_SLEEP_TIME
+            self.buffer_size[lanes] -= sleep_time[lanes]
+
+            sleep_time[lanes] = self.skip_trace(lanes, sleep_time[lanes])
+
+        # the "last buffer size" return to the controller
+        return_buffer_size = np.array(self.buffer_size, copy=True)
+
+        self.video_chunk_counter += 1
+        video_chunk_remain = TOTAL_VIDEO_CHUNCK - self.video_chunk_counter
+
+        end_of_video = self.video_chunk_counter >= TOTAL_VIDEO_CHUNCK
+        for lane in np.where(end_of_video)[0]:
+            self.buffer_size[lane] = 0
+            self.video_chunk_counter[lane] = 0
+            self.reset_lane(lane)
+
+        next_video_chunk_sizes = self.video_size[:, self.video_chunk_counter].T
+
+        return delay, \
+            sleep_time, \
+            return_buffer_size / MILLISECONDS_IN_SECOND, \
+            rebuf / MILLISECONDS_IN_SECOND, \
+            video_chunk_size, \
+            next_video_chunk_sizes, \
+            end_of_video, \
+            video_chunk_remain
@@ -0,0 +1,155 @@
+import sys
+import time
+import numpy as np
+import multiprocessing as mp
+import tensorflow as tf
+import env
+import a3c
+import load_trace
+import shared_params
+import multi_agent
+from trace_memory_benchmark import get_memory
+
+
+# measures bitrate decisions per second of agents that each run the actor
+# in their own tensorflow session (multi_agent.py default) against agents
+# that only step the environment and ask multi_agent.inference_server
+# usage: python inference_benchmark.py [num_agents] [trace_folder]
+NUM_AGENTS = 16
+TRAIN_TRACES = './cooked_traces/'
+NUM_CHUNKS = 1000  # decisions each agent makes
+S_INFO = multi_agent.S_INFO
+S_LEN = multi_agent.S_LEN
+A_DIM = multi_agent.A_DIM
+VIDEO_BIT_RATE = multi_agent.VIDEO_BIT_RATE
+BUFFER_NORM_FACTOR = multi_agent.BUFFER_NORM_FACTOR
+CHUNK_TIL_VIDEO_END_CAP = multi_agent.CHUNK_TIL_VIDEO_END_CAP
+M_IN_K = multi_agent.M_IN_K
+DEFAULT_QUALITY = multi_agent.DEFAULT_QUALITY
+RAND_RANGE = multi_agent.RAND_RANGE
+
+
+def run_chunks(agent_id, net_env, actor, inference_queue, inference_reply_queue):
+    bit_rate = DEFAULT_QUALITY
+    state = np.zeros((S_INFO, S_LEN))
+
+    for _ in xrange(NUM_CHUNKS):
+        delay, sleep_time, buffer_size, rebuf, \
+            video_chunk_size, next_video_chunk_sizes, \
+            end_of_video, video_chunk_remain = \
+            net_env.get_video_chunk(bit_rate)
+
+        # same state as multi_agent.agent
+        state = np.roll(state, -1, axis=1)
+        state[0, -1] = VIDEO_BIT_RATE[bit_rate] / float(np.max(VIDEO_BIT_RATE))
+        state[1, -1] = buffer_size / BUFFER_NORM_FACTOR
+        state[2, -1] = float(video_chunk_size) / float(delay) / M_IN_K
+        state[3, -1] = float(delay) / M_IN_K / BUFFER_NORM_FACTOR
+        state[4, :A_DIM] = np.array(next_video_chunk_sizes) / M_IN_K / M_IN_K
+        state[5, -1] = np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)
+
+        if actor is None:
+            inference_queue.put([agent_id, 0, state])
+            action_prob = inference_reply_queue.get()
+        else:
+            action_prob = actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
+        action_cumsum = np.cumsum(action_prob)
+        bit_rate = (action_cumsum > np.random.randint(1, RAND_RANGE) / float(RAND_RANGE)).argmax()
+
+        if end_of_video:
+            bit_rate = DEFAULT_QUALITY
+            state = np.zeros((S_INFO, S_LEN))
+
+
+def agent(agent_id, shared_traces, use_server, inference_queue, inference_reply_queue,
+          ready_queue, start_event, done_queue):
+    all_cooked_time, all_cooked_bw, all_trace_index = env.attach_traces(*shared_traces)
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw,
+                              random_seed=agent_id,
+                              all_trace_index=all_trace_index)
+
+    if use_server:
+        ready_queue.put(get_memory())
+        start_event.wait()
+        run_chunks(agent_id, net_env, None, inference_queue, inference_reply_queue)
+    else:
+        with tf.Session() as sess:
+            actor = a3c.ActorNetwork(sess,
+                                     state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
+                                     learning_rate=multi_agent.ACTOR_LR_RATE)
+            sess.run(tf.global_variables_initializer())
+            ready_queue.put(get_memory())
+            start_event.wait()
+            run_chunks(agent_id, net_env, actor, None, None)
+
+    done_queue.put(agent_id)
+
+
+def run(num_agents, shared_traces, use_server):
+    ready_queue = mp.Queue()
+    done_queue = mp.Queue()
+    start_event = mp.Event()
+
+    inference_queue = None
+    inference_reply_queues = [None] * num_agents
+    if use_server:
+        inference_queue = mp.Queue(num_agents)
+        inference_reply_queues = []
+        for i in xrange(num_agents):
+            inference_reply_queues.append(mp.Queue(1))
+        # version 0 is never published, the server keeps its initial weights
+        shared_net_params = shared_params.share_params(
+            a3c.get_network_shapes(state_dim=[S_INFO, S_LEN], action_dim=A_DIM))
+        inference = mp.Process(target=multi_agent.inference_server,
+                               args=(inference_queue, inference_reply_queues,
+                                     shared_net_params))
+        inference.start()
+
+    agents = []
+    for i in xrange(num_agents):
+        agents.append(mp.Process(target=agent,
+                                 args=(i, shared_traces, use_server,
+                                       inference_queue, inference_reply_queues[i],
+                                       ready_queue, start_event, done_queue)))
+    for i in xrange(num_agents):
+        agents[i].start()
+
+    memory = []
+    for i in xrange(num_agents):
+        memory.append(ready_queue.get())
+    start = time.time()
+    start_event.set()
+    for i in xrange(num_agents):
+        done_queue.get()
+    total_time = time.time() - start
+
+    for i in xrange(num_agents):
+        agents[i].join()
+    if use_server:
+        inference.terminate()
+
+    memory = np.array(memory)
+    return num_agents * NUM_CHUNKS / total_time, np.mean(memory[:, 1])
+
+
+def main():
+    num_agents = NUM_AGENTS
+    trace_folder = TRAIN_TRACES
+    if len(sys.argv) > 1:
+        num_agents = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        trace_folder = sys.argv[2]
+
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace(trace_folder)
+    shared_traces = env.share_traces(all_cooked_time, all_cooked_bw)
+
+    for name, use_server in [('per-agent session', False), ('inference server', True)]:
+        decisions_per_sec, private = run(num_agents, shared_traces, use_server)
+        print(str(num_agents) + ' agents\t' + name +
+              '\tdecisions/sec: ' + str(decisions_per_sec) +
+              '\tper-agent private: ' + str(private) + ' MB')
+
+
+if __name__ == '__main__':
+    main()
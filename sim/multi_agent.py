@@ -1,5 +1,8 @@
 import os
+import time
+import Queue
 import logging
+import contextlib
 import numpy as np
 import multiprocessing as mp
 os.environ['CUDA_VISIBLE_DEVICES']=''
@@ -7,6 +10,8 @@ import tensorflow as tf
 import env
 import a3c
 import load_trace
+import rl_test
+import shared_params
 
 
 S_INFO = 6  # bit_rate, buffer_size, next_chunk_size, bandwidth_measurement(throughput and time), chunk_til_video_end
@@ -29,34 +34,52 @@ RANDOM_SEED = 42
 RAND_RANGE = 1000
 SUMMARY_DIR = './results'
 LOG_FILE = './results/log'
-TEST_LOG_FOLDER = './test_results/'
+TEST_TRACES = './cooked_test_traces/'
 TRAIN_TRACES = './cooked_traces/'
 # NN_MODEL = './results/pretrain_linear_reward.ckpt'
 NN_MODEL = None
+# one fused update over the experience of all agents per epoch,
+# instead of computing and applying gradients agent by agent. this is not
+# the same training: it takes one RMSProp step on the gradient of the whole
+# batch (summed for the actor, averaged for the critic) where the default
+# takes NUM_AGENTS sequential steps. RMSProp scales a step to about the
+# learning rate whatever the gradient magnitude, so the parameters move up
+# to NUM_AGENTS times less per epoch, raise ACTOR_LR_RATE and CRITIC_LR_RATE
+# or train for more epochs to make up for it
+FUSED_GRADIENTS = False
+# asynchronous training: agents push experience to one shared queue, the
+# coordinator applies gradients as they arrive, and agents only wait for
+# new parameters when theirs are more than MAX_STALENESS updates behind
+ASYNC_TRAINING = False
+MAX_STALENESS = 16  # in parameter updates
+# one inference process runs the actor for all agents in batches, agents
+# then only step the environment and hold no tensorflow session
+INFERENCE_SERVER = False
+
+
+def test_agent(test_queue, test_result_queue):
+    """
+    Runs the test traces through the fixed environment with the actor
+    parameters of the checkpoints, in the background of the training.
+    """
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(TEST_TRACES)
+
+    with tf.Session() as sess:
+        actor = a3c.ActorNetwork(sess,
+                                 state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
+                                 learning_rate=ACTOR_LR_RATE)
+        sess.run(tf.global_variables_initializer())
 
+        while True:
+            epoch, actor_net_params = test_queue.get()
+            actor.set_network_params(actor_net_params)
+            rewards = rl_test.run_test(actor, all_cooked_time, all_cooked_bw, all_file_names,
+                                       log_file_prefix=None)
+            test_result_queue.put([epoch, rewards])
 
-def testing(epoch, nn_model, log_file):
-    # clean up the test results folder
-    os.system('rm -r ' + TEST_LOG_FOLDER)
-    os.system('mkdir ' + TEST_LOG_FOLDER)
-    
-    # run test script
-    os.system('python rl_test.py ' + nn_model)
-    
-    # append test performance to the log
-    rewards = []
-    test_log_files = os.listdir(TEST_LOG_FOLDER)
-    for test_log_file in test_log_files:
-        reward = []
-        with open(TEST_LOG_FOLDER + test_log_file, 'rb') as f:
-            for line in f:
-                parse = line.split()
-                try:
-                    reward.append(float(parse[-1]))
-                except IndexError:
-                    break
-        rewards.append(np.sum(reward[1:]))
 
+def testing(epoch, rewards, log_file):
+    # append test performance to the log
     rewards = np.array(rewards)
 
     rewards_min = np.min(rewards)
@@ -76,10 +99,12 @@ def testing(epoch, nn_model, log_file):
     log_file.flush()
 
 
-def central_agent(net_params_queues, exp_queues):
+def central_agent(net_params_queues, exp_queues, shared_net_params,
+                  test_queue, test_result_queue):
 
     assert len(net_params_queues) == NUM_AGENTS
     assert len(exp_queues) == NUM_AGENTS
+    assert not (ASYNC_TRAINING and FUSED_GRADIENTS)
 
     logging.basicConfig(filename=LOG_FILE + '_central',
                         filemode='w',
@@ -108,20 +133,33 @@ def central_agent(net_params_queues, exp_queues):
 
         epoch = 0
 
+        if ASYNC_TRAINING:
+            # initial synchronization of the network parameters of work agent
+            version = shared_params.publish_params(
+                shared_net_params,
+                [actor.get_network_params(), critic.get_network_params()])
+            for i in xrange(NUM_AGENTS):
+                net_params_queues[i].put(version)
+
         # assemble experiences from agents, compute the gradients
         while True:
-            # synchronize the network parameters of work agent
-            actor_net_params = actor.get_network_params()
-            critic_net_params = critic.get_network_params()
-            for i in xrange(NUM_AGENTS):
-                net_params_queues[i].put([actor_net_params, critic_net_params])
-                # Note: this is synchronous version of the parallel training,
-                # which is easier to understand and probe. The framework can be
-                # fairly easily modified to support asynchronous training.
-                # Some practices of asynchronous training (lock-free SGD at
-                # its core) are nicely explained in the following two papers:
-                # https://arxiv.org/abs/1602.01783
-                # https://arxiv.org/abs/1106.5730
+            epoch_start = time.time()
+
+            if not ASYNC_TRAINING:
+                # synchronize the network parameters of work agent: publish
+                # them once in shared memory, agents only get the version
+                version = shared_params.publish_params(
+                    shared_net_params,
+                    [actor.get_network_params(), critic.get_network_params()])
+                for i in xrange(NUM_AGENTS):
+                    net_params_queues[i].put(version)
+                    # Note: this is synchronous version of the parallel training,
+                    # which is easier to understand and probe. ASYNC_TRAINING
+                    # switches to the asynchronous version.
+                    # Some practices of asynchronous training (lock-free SGD at
+                    # its core) are nicely explained in the following two papers:
+                    # https://arxiv.org/abs/1602.01783
+                    # https://arxiv.org/abs/1106.5730
 
             # record average reward and td loss change
             # in the experiences from the agents
@@ -130,60 +168,117 @@ def central_agent(net_params_queues, exp_queues):
             total_td_loss = 0.0
             total_entropy = 0.0
             total_agents = 0.0 
+            total_stale = 0
+            total_stale_len = 0
 
             # assemble experiences from the agents
             actor_gradient_batch = []
             critic_gradient_batch = []
+            s_batches = []
+            a_batches = []
+            r_batches = []
+            terminals = []
 
             for i in xrange(NUM_AGENTS):
-                s_batch, a_batch, r_batch, terminal, info = exp_queues[i].get()
-
-                actor_gradient, critic_gradient, td_batch = \
-                    a3c.compute_gradients(
-                        s_batch=np.stack(s_batch, axis=0),
-                        a_batch=np.vstack(a_batch),
-                        r_batch=np.vstack(r_batch),
-                        terminal=terminal, actor=actor, critic=critic)
-
-                actor_gradient_batch.append(actor_gradient)
-                critic_gradient_batch.append(critic_gradient)
+                if ASYNC_TRAINING:
+                    # take whichever experience arrives first
+                    s_batch, a_batch, r_batch, terminal, info = exp_queues[0].get()
+                else:
+                    s_batch, a_batch, r_batch, terminal, info = exp_queues[i].get()
+
+                if ASYNC_TRAINING:
+                    if version - info['version'] <= MAX_STALENESS:
+                        actor_gradient, critic_gradient, td_batch = \
+                            a3c.compute_gradients(
+                                s_batch=np.stack(s_batch, axis=0),
+                                a_batch=np.vstack(a_batch),
+                                r_batch=np.vstack(r_batch),
+                                terminal=terminal, actor=actor, critic=critic)
+                        actor.apply_gradients(actor_gradient)
+                        critic.apply_gradients(critic_gradient)
+                        total_td_loss += np.sum(td_batch)
+                        version = shared_params.publish_params(
+                            shared_net_params,
+                            [actor.get_network_params(), critic.get_network_params()])
+                    else:
+                        # the experience came from a too old policy, drop it,
+                        # it does not count in the rewards and losses of the epoch
+                        total_stale += 1
+                        total_stale_len += len(r_batch)
+                        net_params_queues[info['agent_id']].put(version)
+                        continue
+
+                    # answer the agent with the latest parameters
+                    net_params_queues[info['agent_id']].put(version)
+
+                elif FUSED_GRADIENTS:
+                    s_batches.append(np.stack(s_batch, axis=0))
+                    a_batches.append(np.vstack(a_batch))
+                    r_batches.append(np.vstack(r_batch))
+                    terminals.append(terminal)
+                else:
+                    actor_gradient, critic_gradient, td_batch = \
+                        a3c.compute_gradients(
+                            s_batch=np.stack(s_batch, axis=0),
+                            a_batch=np.vstack(a_batch),
+                            r_batch=np.vstack(r_batch),
+                            terminal=terminal, actor=actor, critic=critic)
+
+                    actor_gradient_batch.append(actor_gradient)
+                    critic_gradient_batch.append(critic_gradient)
+                    total_td_loss += np.sum(td_batch)
 
                 total_reward += np.sum(r_batch)
-                total_td_loss += np.sum(td_batch)
                 total_batch_len += len(r_batch)
                 total_agents += 1.0
                 total_entropy += np.sum(info['entropy'])
 
-            # compute aggregated gradient
-            assert NUM_AGENTS == len(actor_gradient_batch)
-            assert len(actor_gradient_batch) == len(critic_gradient_batch)
-            # assembled_actor_gradient = actor_gradient_batch[0]
-            # assembled_critic_gradient = critic_gradient_batch[0]
-            # for i in xrange(len(actor_gradient_batch) - 1):
-            #     for j in xrange(len(assembled_actor_gradient)):
-            #             assembled_actor_gradient[j] += actor_gradient_batch[i][j]
-            #             assembled_critic_gradient[j] += critic_gradient_batch[i][j]
-            # actor.apply_gradients(assembled_actor_gradient)
-            # critic.apply_gradients(assembled_critic_gradient)
-            for i in xrange(len(actor_gradient_batch)):
-                actor.apply_gradients(actor_gradient_batch[i])
-                critic.apply_gradients(critic_gradient_batch[i])
+            if FUSED_GRADIENTS:
+                # single update over the concatenated experiences
+                assert NUM_AGENTS == len(s_batches)
+                td_batch = a3c.train_batch(s_batches, a_batches, r_batches, terminals,
+                                           actor=actor, critic=critic)
+                total_td_loss += np.sum(td_batch)
+
+            elif not ASYNC_TRAINING:
+                # compute aggregated gradient
+                assert NUM_AGENTS == len(actor_gradient_batch)
+                assert len(actor_gradient_batch) == len(critic_gradient_batch)
+                # assembled_actor_gradient = actor_gradient_batch[0]
+                # assembled_critic_gradient = critic_gradient_batch[0]
+                # for i in xrange(len(actor_gradient_batch) - 1):
+                #     for j in xrange(len(assembled_actor_gradient)):
+                #             assembled_actor_gradient[j] += actor_gradient_batch[i][j]
+                #             assembled_critic_gradient[j] += critic_gradient_batch[i][j]
+                # actor.apply_gradients(assembled_actor_gradient)
+                # critic.apply_gradients(assembled_critic_gradient)
+                for i in xrange(len(actor_gradient_batch)):
+                    actor.apply_gradients(actor_gradient_batch[i])
+                    critic.apply_gradients(critic_gradient_batch[i])
 
             # log training information
             epoch += 1
-            avg_reward = total_reward  / total_agents
-            avg_td_loss = total_td_loss / total_batch_len
-            avg_entropy = total_entropy / total_batch_len
+            # every experience of the epoch may have been dropped as stale
+            avg_reward = total_reward  / max(total_agents, 1.0)
+            avg_td_loss = total_td_loss / max(total_batch_len, 1.0)
+            avg_entropy = total_entropy / max(total_batch_len, 1.0)
+            epoch_time = time.time() - epoch_start
+            samples_per_sec = total_batch_len / epoch_time
 
             logging.info('Epoch: ' + str(epoch) +
                          ' TD_loss: ' + str(avg_td_loss) +
                          ' Avg_reward: ' + str(avg_reward) +
-                         ' Avg_entropy: ' + str(avg_entropy))
+                         ' Avg_entropy: ' + str(avg_entropy) +
+                         ' Epoch_time: ' + str(epoch_time) +
+                         ' Samples_per_sec: ' + str(samples_per_sec) +
+                         ' Stale_dropped: ' + str(total_stale) +
+                         ' Stale_samples: ' + str(total_stale_len))
 
             summary_str = sess.run(summary_ops, feed_dict={
                 summary_vars[0]: avg_td_loss,
                 summary_vars[1]: avg_reward,
-                summary_vars[2]: avg_entropy
+                summary_vars[2]: avg_entropy,
+                summary_vars[3]: samples_per_sec
             })
 
             writer.add_summary(summary_str, epoch)
@@ -194,29 +289,95 @@ def central_agent(net_params_queues, exp_queues):
                 save_path = saver.save(sess, SUMMARY_DIR + "/nn_model_ep_" +
                                        str(epoch) + ".ckpt")
                 logging.info("Model saved in file: " + save_path)
-                testing(epoch, 
-                    SUMMARY_DIR + "/nn_model_ep_" + str(epoch) + ".ckpt", 
-                    test_log_file)
-
+                # evaluated by test_agent while the training goes on
+                test_queue.put([epoch, actor.get_network_params()])
 
-def agent(agent_id, all_cooked_time, all_cooked_bw, net_params_queue, exp_queue):
+            # log the evaluations that finished
+            while True:
+                try:
+                    test_epoch, rewards = test_result_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                testing(test_epoch, rewards, test_log_file)
 
-    net_env = env.Environment(all_cooked_time=all_cooked_time,
-                              all_cooked_bw=all_cooked_bw,
-                              random_seed=agent_id)
 
-    with tf.Session() as sess, open(LOG_FILE + '_agent_' + str(agent_id), 'wb') as log_file:
+def inference_server(inference_queue, inference_reply_queues, shared_net_params):
+    """
+    Collects the pending states of the agents, runs them through the
+    actor in one batch and sends each agent its action probabilities.
+    """
+    with tf.Session() as sess:
         actor = a3c.ActorNetwork(sess,
                                  state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
                                  learning_rate=ACTOR_LR_RATE)
-        critic = a3c.CriticNetwork(sess,
-                                   state_dim=[S_INFO, S_LEN],
-                                   learning_rate=CRITIC_LR_RATE)
+        sess.run(tf.global_variables_initializer())
+
+        params_buffer = shared_params.make_params_buffer(shared_net_params)
+        local_version = 0
+
+        while True:
+            # wait for one state, then take whatever else is pending,
+            # each agent has at most one state in flight
+            requests = [inference_queue.get()]
+            while len(requests) < len(inference_reply_queues):
+                try:
+                    requests.append(inference_queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            # use parameters at least as new as the agents have seen
+            min_version = max([version for _, version, _ in requests])
+            if max(min_version, shared_params.get_params_version(shared_net_params)) > local_version:
+                local_version, [actor_net_params, _] = \
+                    shared_params.read_params(shared_net_params, min_version, params_buffer)
+                actor.set_network_params(actor_net_params)
+
+            action_prob = actor.predict(np.stack([state for _, _, state in requests], axis=0))
+            for i in xrange(len(requests)):
+                agent_id = requests[i][0]
+                inference_reply_queues[agent_id].put(action_prob[i:i + 1])
+
+
+@contextlib.contextmanager
+def agent_session():
+    # with the inference server the agents build no network, so they
+    # do not create a session (and its thread pools) at all
+    if INFERENCE_SERVER:
+        yield None
+    else:
+        with tf.Session() as sess:
+            yield sess
+
+
+def agent(agent_id, shared_traces, net_params_queue, exp_queue, shared_net_params,
+          inference_queue=None, inference_reply_queue=None):
+
+    all_cooked_time, all_cooked_bw, all_trace_index = env.attach_traces(*shared_traces)
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw,
+                              random_seed=agent_id,
+                              all_trace_index=all_trace_index)
+
+    with agent_session() as sess, open(LOG_FILE + '_agent_' + str(agent_id), 'wb') as log_file:
+        if not INFERENCE_SERVER:
+            actor = a3c.ActorNetwork(sess,
+                                     state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
+                                     learning_rate=ACTOR_LR_RATE)
+            critic = a3c.CriticNetwork(sess,
+                                       state_dim=[S_INFO, S_LEN],
+                                       learning_rate=CRITIC_LR_RATE)
+            params_buffer = shared_params.make_params_buffer(shared_net_params)
 
         # initial synchronization of the network parameters from the coordinator
-        actor_net_params, critic_net_params = net_params_queue.get()
-        actor.set_network_params(actor_net_params)
-        critic.set_network_params(critic_net_params)
+        local_version = net_params_queue.get()
+        if not INFERENCE_SERVER:
+            local_version, [actor_net_params, critic_net_params] = \
+                shared_params.read_params(shared_net_params, local_version, params_buffer)
+            actor.set_network_params(actor_net_params)
+            critic.set_network_params(critic_net_params)
+
+        # experiences sent to the coordinator that were not answered yet
+        pending_replies = 0
 
         last_bit_rate = DEFAULT_QUALITY
         bit_rate = DEFAULT_QUALITY
@@ -284,7 +445,11 @@ def agent(agent_id, all_cooked_time, all_cooked_bw, net_params_queue, exp_queue)
             state[5, -1] = np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)
 
             # compute action probability vector
-            action_prob = actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
+            if INFERENCE_SERVER:
+                inference_queue.put([agent_id, local_version, state])
+                action_prob = inference_reply_queue.get()
+            else:
+                action_prob = actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
             action_cumsum = np.cumsum(action_prob)
             bit_rate = (action_cumsum > np.random.randint(1, RAND_RANGE) / float(RAND_RANGE)).argmax()
             # Note: we need to discretize the probability into 1/RAND_RANGE steps,
@@ -304,16 +469,43 @@ def agent(agent_id, all_cooked_time, all_cooked_bw, net_params_queue, exp_queue)
 
             # report experience to the coordinator
             if len(r_batch) >= TRAIN_SEQ_LEN or end_of_video:
+                info = {'entropy': entropy_record}
+                if ASYNC_TRAINING:
+                    info['agent_id'] = agent_id
+                    info['version'] = local_version
                 exp_queue.put([s_batch[1:],  # ignore the first chuck
                                a_batch[1:],  # since we don't have the
                                r_batch[1:],  # control over it
                                end_of_video,
-                               {'entropy': entropy_record}])
-
-                # synchronize the network parameters from the coordinator
-                actor_net_params, critic_net_params = net_params_queue.get()
-                actor.set_network_params(actor_net_params)
-                critic.set_network_params(critic_net_params)
+                               info])
+
+                if ASYNC_TRAINING:
+                    pending_replies += 1
+                    # take the newest parameters the coordinator answered with,
+                    # only wait for them if the local ones are too stale
+                    newest_version = local_version
+                    while pending_replies > 0:
+                        too_stale = shared_params.get_params_version(shared_net_params) \
+                                    - newest_version > MAX_STALENESS
+                        try:
+                            version = net_params_queue.get(block=too_stale)
+                        except Queue.Empty:
+                            break
+                        pending_replies -= 1
+                        newest_version = max(newest_version, version)
+                else:
+                    # synchronize the network parameters from the coordinator
+                    newest_version = net_params_queue.get()
+
+                if INFERENCE_SERVER:
+                    # the inference server picks up the parameters
+                    local_version = newest_version
+                elif newest_version > local_version:
+                    local_version, [actor_net_params, critic_net_params] = \
+                        shared_params.read_params(shared_net_params,
+                                                  newest_version, params_buffer)
+                    actor.set_network_params(actor_net_params)
+                    critic.set_network_params(critic_net_params)
 
                 del s_batch[:]
                 del a_batch[:]
@@ -353,23 +545,62 @@ def main():
     # inter-process communication queues
     net_params_queues = []
     exp_queues = []
-    for i in xrange(NUM_AGENTS):
-        net_params_queues.append(mp.Queue(1))
-        exp_queues.append(mp.Queue(1))
+    if ASYNC_TRAINING:
+        # one experience queue shared by all agents, and the parameter
+        # versions are not bounded since agents only read the newest one
+        exp_queue = mp.Queue(NUM_AGENTS)
+        for i in xrange(NUM_AGENTS):
+            net_params_queues.append(mp.Queue())
+            exp_queues.append(exp_queue)
+    else:
+        for i in xrange(NUM_AGENTS):
+            net_params_queues.append(mp.Queue(1))
+            exp_queues.append(mp.Queue(1))
+    test_queue = mp.Queue()
+    test_result_queue = mp.Queue()
+    # the queues only carry parameter versions, the parameters themselves
+    # are published in one shared memory block
+    shared_net_params = shared_params.share_params(
+        a3c.get_network_shapes(state_dim=[S_INFO, S_LEN], action_dim=A_DIM))
 
     # create a coordinator and multiple agent processes
     # (note: threading is not desirable due to python GIL)
     coordinator = mp.Process(target=central_agent,
-                             args=(net_params_queues, exp_queues))
+                             args=(net_params_queues, exp_queues, shared_net_params,
+                                   test_queue, test_result_queue))
     coordinator.start()
 
+    # evaluation of the checkpoints on the test traces
+    tester = mp.Process(target=test_agent,
+                        args=(test_queue, test_result_queue))
+    tester.start()
+
+    inference_queue = None
+    inference_reply_queues = [None] * NUM_AGENTS
+    if INFERENCE_SERVER:
+        inference_queue = mp.Queue(NUM_AGENTS)
+        inference_reply_queues = []
+        for i in xrange(NUM_AGENTS):
+            inference_reply_queues.append(mp.Queue(1))
+        inference = mp.Process(target=inference_server,
+                               args=(inference_queue, inference_reply_queues,
+                                     shared_net_params))
+        inference.start()
+
+    # all agents read the traces from one shared memory block
     all_cooked_time, all_cooked_bw, _ = load_trace.load_trace(TRAIN_TRACES)
+    shared_traces = env.share_traces(all_cooked_time, all_cooked_bw)
+    del all_cooked_time, all_cooked_bw
+
     agents = []
     for i in xrange(NUM_AGENTS):
         agents.append(mp.Process(target=agent,
-                                 args=(i, all_cooked_time, all_cooked_bw,
+                                 args=(i, shared_traces,
                                        net_params_queues[i],
-                                       exp_queues[i])))
+                                       exp_queues[i],
+                                       shared_net_params,
+                                       inference_queue,
+                                       inference_reply_queues[i])))
     for i in xrange(NUM_AGENTS):
         agents[i].start()
 
@@ -0,0 +1,105 @@
+import sys
+import time
+import numpy as np
+import multiprocessing as mp
+import shared_params
+
+
+# measures how fast the coordinator gets a new set of network parameters
+# to every agent, pickled into one queue per agent (as multi_agent.py used
+# to) and published once in the shared block of shared_params.py
+# usage: python param_broadcast_benchmark.py [num_agents ...]
+NUM_AGENTS = [16, 64, 128]
+NUM_ROUNDS = 50
+# a3c.get_network_shapes(state_dim=[6, 8], action_dim=6), without building
+# the graph so that tensorflow is not needed here
+ACTOR_SHAPES = [[1, 128], [128], [1, 128], [128], [4, 8, 128], [128],
+                [4, 8, 128], [128], [4, 6, 128], [128], [1, 128], [128],
+                [768, 128], [128], [128, 6], [6]]
+CRITIC_SHAPES = ACTOR_SHAPES[:-2] + [[128, 1], [1]]
+RANDOM_SEED = 42
+
+
+def queue_agent(net_params_queue, done_queue):
+    for _ in xrange(NUM_ROUNDS):
+        actor_net_params, critic_net_params = net_params_queue.get()
+        done_queue.put(len(actor_net_params) + len(critic_net_params))
+
+
+def shared_agent(net_params_queue, done_queue, shared_net_params):
+    params_buffer = shared_params.make_params_buffer(shared_net_params)
+    for _ in xrange(NUM_ROUNDS):
+        version, [actor_net_params, critic_net_params] = shared_params.read_params(
+            shared_net_params, net_params_queue.get(), params_buffer)
+        done_queue.put(len(actor_net_params) + len(critic_net_params))
+
+
+def run(num_agents, actor_net_params, critic_net_params, use_shared):
+    net_params_queues = []
+    for i in xrange(num_agents):
+        net_params_queues.append(mp.Queue(1))
+    done_queue = mp.Queue()
+
+    shared_net_params = shared_params.share_params([ACTOR_SHAPES, CRITIC_SHAPES])
+
+    agents = []
+    for i in xrange(num_agents):
+        if use_shared:
+            agents.append(mp.Process(target=shared_agent,
+                                     args=(net_params_queues[i], done_queue,
+                                           shared_net_params)))
+        else:
+            agents.append(mp.Process(target=queue_agent,
+                                     args=(net_params_queues[i], done_queue)))
+    for i in xrange(num_agents):
+        agents[i].start()
+
+    broadcast_time = 0.0
+    start = time.time()
+    for _ in xrange(NUM_ROUNDS):
+        broadcast_start = time.time()
+        if use_shared:
+            version = shared_params.publish_params(
+                shared_net_params, [actor_net_params, critic_net_params])
+            for i in xrange(num_agents):
+                net_params_queues[i].put(version)
+        else:
+            for i in xrange(num_agents):
+                net_params_queues[i].put([actor_net_params, critic_net_params])
+        broadcast_time += time.time() - broadcast_start
+
+        # like the coordinator, wait for every agent before the next round
+        for i in xrange(num_agents):
+            done_queue.get()
+    total_time = time.time() - start
+
+    for i in xrange(num_agents):
+        agents[i].join()
+
+    return broadcast_time / NUM_ROUNDS, num_agents * NUM_ROUNDS / total_time
+
+
+def main():
+    all_num_agents = NUM_AGENTS
+    if len(sys.argv) > 1:
+        all_num_agents = [int(num_agents) for num_agents in sys.argv[1:]]
+
+    np.random.seed(RANDOM_SEED)
+    actor_net_params = [np.random.randn(*shape).astype(np.float32) for shape in ACTOR_SHAPES]
+    critic_net_params = [np.random.randn(*shape).astype(np.float32) for shape in CRITIC_SHAPES]
+    num_params = sum([param.size for param in actor_net_params + critic_net_params])
+    print(str(num_params) + ' parameters, ' +
+          str(num_params * 4 / 1024.0 / 1024.0) + ' MB as float32')
+
+    for num_agents in all_num_agents:
+        for name, use_shared in [('queue', False), ('shared', True)]:
+            broadcast_time, params_per_sec = run(num_agents,
+                                                 actor_net_params, critic_net_params,
+                                                 use_shared)
+            print(str(num_agents) + ' agents\t' + name +
+                  '\tbroadcast: ' + str(broadcast_time * 1000.0) + ' ms' +
+                  '\tparams/sec: ' + str(params_per_sec))
+
+
+if __name__ == '__main__':
+    main()
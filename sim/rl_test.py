@@ -1,7 +1,9 @@
 import os
 import sys
+import Queue
 os.environ['CUDA_VISIBLE_DEVICES']=''
 import numpy as np
+import multiprocessing as mp
 import tensorflow as tf
 import load_trace
 import a3c
@@ -22,142 +24,260 @@ SMOOTH_PENALTY = 1
 DEFAULT_QUALITY = 1  # default video quality without agent
 RANDOM_SEED = 42
 RAND_RANGE = 1000
+RESULT_POLL_TIME = 10  # sec, how often to check that the test workers are still alive
 LOG_FILE = './test_results/log_sim_rl'
 TEST_TRACES = './cooked_test_traces/'
 # log in format of time_stamp bit_rate buffer_size rebuffer_time chunk_size download_time reward
-NN_MODEL = sys.argv[1]
 
 
-def main():
+def run_traces(actor, all_cooked_time, all_cooked_bw, first_trace=0):
+    """
+    Streams each trace once with the actor picking the bitrates and
+    returns the chunks of every trace as [delay, sleep_time, bit_rate,
+    buffer_size, rebuf, video_chunk_size, reward]. The traces are taken
+    as trace first_trace onward of a whole test run, whose random draws
+    for the traces before are skipped, so the bitrates come out the same.
+    """
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw)
 
-    np.random.seed(RANDOM_SEED)
+    # every chunk draws one random number for its bitrate
+    for _ in xrange(first_trace * env.TOTAL_VIDEO_CHUNCK):
+        np.random.randint(1, RAND_RANGE)
 
-    assert len(VIDEO_BIT_RATE) == A_DIM
+    all_records = []
+    records = []
 
-    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(TEST_TRACES)
+    last_bit_rate = DEFAULT_QUALITY
+    bit_rate = DEFAULT_QUALITY
 
-    net_env = env.Environment(all_cooked_time=all_cooked_time,
-                              all_cooked_bw=all_cooked_bw)
-
-    log_path = LOG_FILE + '_' + all_file_names[net_env.trace_idx]
-    log_file = open(log_path, 'wb')
+    action_vec = np.zeros(A_DIM)
+    action_vec[bit_rate] = 1
 
-    with tf.Session() as sess:
+    s_batch = [np.zeros((S_INFO, S_LEN))]
+    a_batch = [action_vec]
+    r_batch = []
+    entropy_record = []
 
-        actor = a3c.ActorNetwork(sess,
-                                 state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
-                                 learning_rate=ACTOR_LR_RATE)
+    video_count = 0
 
-        critic = a3c.CriticNetwork(sess,
-                                   state_dim=[S_INFO, S_LEN],
-                                   learning_rate=CRITIC_LR_RATE)
+    while True:  # serve video forever
+        # the action is from the last decision
+        # this is to make the framework similar to the real
+        delay, sleep_time, buffer_size, rebuf, \
+        video_chunk_size, next_video_chunk_sizes, \
+        end_of_video, video_chunk_remain = \
+            net_env.get_video_chunk(bit_rate)
 
-        sess.run(tf.global_variables_initializer())
-        saver = tf.train.Saver()  # save neural net parameters
+        # reward is video quality - rebuffer penalty - smoothness
+        reward = VIDEO_BIT_RATE[bit_rate] / M_IN_K \
+                 - REBUF_PENALTY * rebuf \
+                 - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[bit_rate] -
+                                           VIDEO_BIT_RATE[last_bit_rate]) / M_IN_K
+
+        r_batch.append(reward)
 
-        # restore neural net parameters
-        if NN_MODEL is not None:  # NN_MODEL is the path to file
-            saver.restore(sess, NN_MODEL)
-            print("Testing model restored.")
+        last_bit_rate = bit_rate
 
-        time_stamp = 0
+        records.append([delay, sleep_time, bit_rate, buffer_size,
+                        rebuf, video_chunk_size, reward])
 
-        last_bit_rate = DEFAULT_QUALITY
-        bit_rate = DEFAULT_QUALITY
+        # retrieve previous state
+        if len(s_batch) == 0:
+            state = [np.zeros((S_INFO, S_LEN))]
+        else:
+            state = np.array(s_batch[-1], copy=True)
+
+        # dequeue history record
+        state = np.roll(state, -1, axis=1)
 
-        action_vec = np.zeros(A_DIM)
-        action_vec[bit_rate] = 1
+        # this should be S_INFO number of terms
+        state[0, -1] = VIDEO_BIT_RATE[bit_rate] / float(np.max(VIDEO_BIT_RATE))  # last quality
+        state[1, -1] = buffer_size / BUFFER_NORM_FACTOR  # 10 sec
+        state[2, -1] = float(video_chunk_size) / float(delay) / M_IN_K  # kilo byte / ms
+        state[3, -1] = float(delay) / M_IN_K / BUFFER_NORM_FACTOR  # 10 sec
+        state[4, :A_DIM] = np.array(next_video_chunk_sizes) / M_IN_K / M_IN_K  # mega byte
+        state[5, -1] = np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)
 
-        s_batch = [np.zeros((S_INFO, S_LEN))]
-        a_batch = [action_vec]
-        r_batch = []
-        entropy_record = []
+        action_prob = actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
+        action_cumsum = np.cumsum(action_prob)
+        bit_rate = (action_cumsum > np.random.randint(1, RAND_RANGE) / float(RAND_RANGE)).argmax()
+        # Note: we need to discretize the probability into 1/RAND_RANGE steps,
+        # because there is an intrinsic discrepancy in passing single state and batch states
+
+        s_batch.append(state)
+
+        entropy_record.append(a3c.compute_entropy(action_prob[0]))
+
+        if end_of_video:
+            all_records.append(records)
+            records = []
 
-        video_count = 0
+            last_bit_rate = DEFAULT_QUALITY
+            bit_rate = DEFAULT_QUALITY  # use the default action here
 
-        while True:  # serve video forever
-            # the action is from the last decision
-            # this is to make the framework similar to the real
-            delay, sleep_time, buffer_size, rebuf, \
-            video_chunk_size, next_video_chunk_sizes, \
-            end_of_video, video_chunk_remain = \
-                net_env.get_video_chunk(bit_rate)
+            del s_batch[:]
+            del a_batch[:]
+            del r_batch[:]
 
-            time_stamp += delay  # in ms
-            time_stamp += sleep_time  # in ms
+            action_vec = np.zeros(A_DIM)
+            action_vec[bit_rate] = 1
 
-            # reward is video quality - rebuffer penalty - smoothness
-            reward = VIDEO_BIT_RATE[bit_rate] / M_IN_K \
-                     - REBUF_PENALTY * rebuf \
-                     - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[bit_rate] -
-                                               VIDEO_BIT_RATE[last_bit_rate]) / M_IN_K
+            s_batch.append(np.zeros((S_INFO, S_LEN)))
+            a_batch.append(action_vec)
+            entropy_record = []
 
-            r_batch.append(reward)
+            video_count += 1
 
-            last_bit_rate = bit_rate
+            if video_count >= len(all_cooked_time):
+                break
 
-            # log time_stamp, bit_rate, buffer_size, reward
-            log_file.write(str(time_stamp / M_IN_K) + '\t' +
-                           str(VIDEO_BIT_RATE[bit_rate]) + '\t' +
-                           str(buffer_size) + '\t' +
-                           str(rebuf) + '\t' +
-                           str(video_chunk_size) + '\t' +
-                           str(delay) + '\t' +
-                           str(reward) + '\n')
-            log_file.flush()
+    return all_records
 
-            # retrieve previous state
-            if len(s_batch) == 0:
-                state = [np.zeros((S_INFO, S_LEN))]
-            else:
-                state = np.array(s_batch[-1], copy=True)
 
-            # dequeue history record
-            state = np.roll(state, -1, axis=1)
+def write_logs(all_records, all_file_names, log_file_prefix=LOG_FILE):
+    # the time stamp runs on across the traces, as in one test run
+    time_stamp = 0
+    for records, file_name in zip(all_records, all_file_names):
+        with open(log_file_prefix + '_' + file_name, 'wb') as log_file:
+            for delay, sleep_time, bit_rate, buffer_size, \
+                    rebuf, video_chunk_size, reward in records:
+                time_stamp += delay  # in ms
+                time_stamp += sleep_time  # in ms
 
-            # this should be S_INFO number of terms
-            state[0, -1] = VIDEO_BIT_RATE[bit_rate] / float(np.max(VIDEO_BIT_RATE))  # last quality
-            state[1, -1] = buffer_size / BUFFER_NORM_FACTOR  # 10 sec
-            state[2, -1] = float(video_chunk_size) / float(delay) / M_IN_K  # kilo byte / ms
-            state[3, -1] = float(delay) / M_IN_K / BUFFER_NORM_FACTOR  # 10 sec
-            state[4, :A_DIM] = np.array(next_video_chunk_sizes) / M_IN_K / M_IN_K  # mega byte
-            state[5, -1] = np.minimum(video_chunk_remain, CHUNK_TIL_VIDEO_END_CAP) / float(CHUNK_TIL_VIDEO_END_CAP)
+                # log time_stamp, bit_rate, buffer_size, reward
+                log_file.write(str(time_stamp / M_IN_K) + '\t' +
+                               str(VIDEO_BIT_RATE[bit_rate]) + '\t' +
+                               str(buffer_size) + '\t' +
+                               str(rebuf) + '\t' +
+                               str(video_chunk_size) + '\t' +
+                               str(delay) + '\t' +
+                               str(reward) + '\n')
+            log_file.write('\n')
+
+
+def get_rewards(all_records):
+    # total reward of each trace, without the first chunk
+    # that the actor has no control over
+    rewards = []
+    for records in all_records:
+        rewards.append(np.sum([record[-1] for record in records[1:]]))
+    return np.array(rewards)
+
+
+def run_test(actor, all_cooked_time, all_cooked_bw, all_file_names, log_file_prefix=LOG_FILE):
+    """
+    Streams every test trace once, logs each trace to log_file_prefix +
+    '_' + file name (no logs if the prefix is None) and returns the
+    total reward of each trace.
+    """
+    all_records = run_traces(actor, all_cooked_time, all_cooked_bw)
+    if log_file_prefix is not None:
+        write_logs(all_records, all_file_names, log_file_prefix)
+    return get_rewards(all_records)
 
-            action_prob = actor.predict(np.reshape(state, (1, S_INFO, S_LEN)))
-            action_cumsum = np.cumsum(action_prob)
-            bit_rate = (action_cumsum > np.random.randint(1, RAND_RANGE) / float(RAND_RANGE)).argmax()
-            # Note: we need to discretize the probability into 1/RAND_RANGE steps,
-            # because there is an intrinsic discrepancy in passing single state and batch states
 
-            s_batch.append(state)
+def restore_actor(sess, nn_model):
+    actor = a3c.ActorNetwork(sess,
+                             state_dim=[S_INFO, S_LEN], action_dim=A_DIM,
+                             learning_rate=ACTOR_LR_RATE)
+
+    critic = a3c.CriticNetwork(sess,
+                               state_dim=[S_INFO, S_LEN],
+                               learning_rate=CRITIC_LR_RATE)
+
+    sess.run(tf.global_variables_initializer())
+    saver = tf.train.Saver()  # save neural net parameters
+
+    # restore neural net parameters
+    if nn_model is not None:  # nn_model is the path to file
+        saver.restore(sess, nn_model)
+        print("Testing model restored.")
+
+    return actor
 
-            entropy_record.append(a3c.compute_entropy(action_prob[0]))
 
-            if end_of_video:
-                log_file.write('\n')
-                log_file.close()
+def test_worker(nn_model, all_cooked_time, all_cooked_bw, first_trace, result_queue):
+    # each worker has its own environment and copy of the model, a failure
+    # (e.g. the model does not restore) is sent back instead of the records
+    try:
+        with tf.Session() as sess:
+            actor = restore_actor(sess, nn_model)
+            all_records = run_traces(actor, all_cooked_time, all_cooked_bw, first_trace)
+    except Exception as e:
+        result_queue.put([first_trace, None, type(e).__name__ + ': ' + str(e)])
+        return
+    result_queue.put([first_trace, all_records, None])
 
-                last_bit_rate = DEFAULT_QUALITY
-                bit_rate = DEFAULT_QUALITY  # use the default action here
 
-                del s_batch[:]
-                del a_batch[:]
-                del r_batch[:]
+def main():
+    # usage: python rl_test.py nn_model [--workers N]
 
-                action_vec = np.zeros(A_DIM)
-                action_vec[bit_rate] = 1
+    np.random.seed(RANDOM_SEED)
 
-                s_batch.append(np.zeros((S_INFO, S_LEN)))
-                a_batch.append(action_vec)
-                entropy_record = []
+    assert len(VIDEO_BIT_RATE) == A_DIM
 
-                video_count += 1
+    nn_model = sys.argv[1]
+    num_workers = 1
+    if '--workers' in sys.argv:
+        num_workers = int(sys.argv[sys.argv.index('--workers') + 1])
 
-                if video_count >= len(all_file_names):
-                    break
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(TEST_TRACES)
 
-                log_path = LOG_FILE + '_' + all_file_names[net_env.trace_idx]
-                log_file = open(log_path, 'wb')
+    if num_workers <= 1:
+        with tf.Session() as sess:
+            actor = restore_actor(sess, nn_model)
+            run_test(actor, all_cooked_time, all_cooked_bw, all_file_names)
+        return
+
+    # each worker takes a consecutive range of the traces
+    result_queue = mp.Queue()
+    workers = []
+    for trace_ids in np.array_split(np.arange(len(all_file_names)), num_workers):
+        if len(trace_ids) == 0:
+            continue
+        first_trace, end_trace = trace_ids[0], trace_ids[-1] + 1
+        workers.append(mp.Process(target=test_worker,
+                                  args=(nn_model,
+                                        all_cooked_time[first_trace:end_trace],
+                                        all_cooked_bw[first_trace:end_trace],
+                                        first_trace, result_queue)))
+    for i in xrange(len(workers)):
+        workers[i].start()
+
+    results = []
+    failed = False
+    all_exited = False
+    num_received = 0
+    while num_received < len(workers):
+        try:
+            first_trace, records, error = result_queue.get(timeout=RESULT_POLL_TIME)
+        except Queue.Empty:
+            # a worker killed from outside (e.g. out of memory) sends nothing,
+            # give up after one more poll once all of them have exited
+            if all_exited:
+                break
+            all_exited = all(not worker.is_alive() for worker in workers)
+            continue
+        num_received += 1
+        if records is None:
+            print('test worker from trace ' + str(first_trace) + ' failed: ' + error)
+            failed = True
+            continue
+        results.append([first_trace, records])
+    for i in xrange(len(workers)):
+        workers[i].join()
+        if workers[i].exitcode != 0:
+            print('test worker ' + str(i) + ' exited with ' + str(workers[i].exitcode))
+            failed = True
+    if failed or len(results) < len(workers):
+        sys.exit(1)
+
+    # merge the traces back in order
+    all_records = []
+    for first_trace, records in sorted(results):
+        all_records += records
+    write_logs(all_records, all_file_names)
 
 
 if __name__ == '__main__':
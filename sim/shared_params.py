@@ -0,0 +1,93 @@
+import time
+import numpy as np
+import multiprocessing as mp
+
+
+# network parameters published by the coordinator into one shared float32
+# block, so a broadcast is a single memcpy no matter how many agents read it.
+# the sequence counter next to the block is odd while the coordinator is
+# writing, readers retry until they copied the block under one even count
+# (a sequence lock), parameter version = sequence // 2
+PARAMS_DTYPE = np.float32
+POLL_INTERVAL = 0.0005  # sec, while waiting for a version to be published
+
+
+def share_params(all_shapes):
+    """
+    Allocates the shared block for groups of parameters, e.g.
+    [actor_shapes, critic_shapes], before the agents are forked.
+    Returns shared_params to hand to the coordinator and the agents.
+    """
+    sizes = []
+    for shapes in all_shapes:
+        for shape in shapes:
+            sizes.append(int(np.prod(shape)))
+
+    shared_data = mp.RawArray('f', int(np.sum(sizes)))
+    sequence = mp.RawArray('l', 1)
+    return shared_data, sequence, all_shapes
+
+
+def get_params_version(shared_params):
+    _, sequence, _ = shared_params
+    return sequence[0] // 2
+
+
+def publish_params(shared_params, all_params):
+    """
+    Writes groups of parameters in the order of the shapes they were
+    shared with, and returns the new version. Only one process (the
+    coordinator) may publish.
+    """
+    shared_data, sequence, _ = shared_params
+    flat_params = np.frombuffer(shared_data, dtype=PARAMS_DTYPE)
+
+    sequence[0] += 1  # odd, readers back off
+    start = 0
+    for params in all_params:
+        for param in params:
+            param = np.ravel(param)
+            flat_params[start:start + len(param)] = param
+            start += len(param)
+    sequence[0] += 1
+
+    return sequence[0] // 2
+
+
+def make_params_buffer(shared_params):
+    shared_data, _, _ = shared_params
+    return np.empty(len(shared_data), dtype=PARAMS_DTYPE)
+
+
+def read_params(shared_params, min_version=0, out=None):
+    """
+    Copies the published parameters once a version of at least
+    min_version is there. out is an optional float32 buffer of the
+    block size that is reused across reads. Returns the version read
+    and the groups of parameters, as views into the copy.
+    """
+    shared_data, sequence, all_shapes = shared_params
+    flat_params = np.frombuffer(shared_data, dtype=PARAMS_DTYPE)
+    if out is None:
+        out = np.empty_like(flat_params)
+
+    while True:
+        start_sequence = sequence[0]
+        if start_sequence % 2 == 1 or start_sequence // 2 < min_version:
+            time.sleep(POLL_INTERVAL)
+            continue
+        out[:] = flat_params
+        if sequence[0] == start_sequence:
+            break
+
+    all_params = []
+    start = 0
+    for shapes in all_shapes:
+        params = []
+        for shape in shapes:
+            size = int(np.prod(shape))
+            params.append(out[start:start + size].reshape(shape))
+            start += size
+        all_params.append(params)
+
+    return start_sequence // 2, all_params
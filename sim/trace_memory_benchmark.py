@@ -0,0 +1,110 @@
+import os
+import sys
+import numpy as np
+import multiprocessing as mp
+import load_trace
+import env
+
+
+# measures the memory of agent processes that each step an env.Environment,
+# with the traces passed as python lists (as multi_agent.py used to) and
+# with the shared memory block of env.share_traces
+# usage: python trace_memory_benchmark.py [num_agents] [trace_folder]
+NUM_AGENTS = 64
+TRAIN_TRACES = './cooked_traces/'
+NUM_CHUNKS = 480  # chunks each agent downloads before reporting
+A_DIM = 6
+KB_IN_MB = 1024.0
+
+
+def get_memory():
+    """
+    Returns (rss, private) of this process in MB, private being the
+    pages not shared with any other process.
+    """
+    rss = 0.0
+    private = 0.0
+    smaps = '/proc/self/smaps_rollup'
+    if not os.path.exists(smaps):
+        smaps = '/proc/self/smaps'
+    with open(smaps, 'rb') as f:
+        for line in f:
+            parse = line.split()
+            if parse[0] == 'Rss:':
+                rss += float(parse[1])
+            elif parse[0] in ['Private_Clean:', 'Private_Dirty:']:
+                private += float(parse[1])
+    return rss / KB_IN_MB, private / KB_IN_MB
+
+
+def agent(agent_id, traces, use_shared, memory_queue, done_event):
+    if use_shared:
+        all_cooked_time, all_cooked_bw, all_trace_index = env.attach_traces(*traces)
+    else:
+        all_cooked_time, all_cooked_bw = traces
+        all_trace_index = None
+
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw,
+                              random_seed=agent_id,
+                              all_trace_index=all_trace_index)
+
+    for _ in xrange(NUM_CHUNKS):
+        net_env.get_video_chunk(np.random.randint(A_DIM))
+
+    memory_queue.put(get_memory())
+
+    # stay alive until every agent has reported
+    done_event.wait()
+
+
+def run(num_agents, traces, use_shared):
+    memory_queue = mp.Queue()
+    done_event = mp.Event()
+
+    agents = []
+    for i in xrange(num_agents):
+        agents.append(mp.Process(target=agent,
+                                 args=(i, traces, use_shared, memory_queue, done_event)))
+    for i in xrange(num_agents):
+        agents[i].start()
+
+    memory = []
+    for i in xrange(num_agents):
+        memory.append(memory_queue.get())
+    done_event.set()
+    for i in xrange(num_agents):
+        agents[i].join()
+
+    memory = np.array(memory)
+    return np.mean(memory[:, 0]), np.mean(memory[:, 1]), np.sum(memory[:, 1])
+
+
+def main():
+    num_agents = NUM_AGENTS
+    trace_folder = TRAIN_TRACES
+    if len(sys.argv) > 1:
+        num_agents = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        trace_folder = sys.argv[2]
+
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace(trace_folder)
+    # python lists, whatever load_trace returned
+    list_traces = ([list(cooked_time) for cooked_time in all_cooked_time],
+                   [list(cooked_bw) for cooked_bw in all_cooked_bw])
+    shared_traces = env.share_traces(all_cooked_time, all_cooked_bw)
+
+    trace_size = 2 * 8 * sum([len(cooked_bw) for cooked_bw in all_cooked_bw]) / KB_IN_MB / KB_IN_MB
+    print(str(len(all_cooked_bw)) + ' traces, ' + str(trace_size) + ' MB as float64, ' +
+          str(num_agents) + ' agents')
+
+    for name, traces, use_shared in [('list', list_traces, False),
+                                     ('shared', shared_traces, True)]:
+        rss, private, total_private = run(num_agents, traces, use_shared)
+        print(name + '\tper-agent RSS: ' + str(rss) + ' MB' +
+              '\tper-agent private: ' + str(private) + ' MB' +
+              '\ttotal private: ' + str(total_private) + ' MB')
+
+
+if __name__ == '__main__':
+    main()
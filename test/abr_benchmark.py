@@ -0,0 +1,290 @@
+import os
+import sys
+import glob
+import time
+import sqlite3
+import hashlib
+import numpy as np
+import multiprocessing as mp
+import load_trace
+import video_sizes
+import dp_solver
+import bb
+import mpc
+
+
+# runs every ABR scheme on every trace and keeps the chunks of each
+# (scheme, trace) cell in a sqlite database. a cell is only run again when
+# its trace, the chunk sizes, the source of the scheme or the model
+# checkpoint changed, so after adding a trace or a checkpoint only the new
+# cells run. the cells left are split across processes and every finished
+# cell is committed at once, so a killed run goes on where it stopped.
+# every cell plays its trace alone from a fresh player, with the time
+# stamps starting at 0. prints the mean total reward of every scheme
+# usage: python abr_benchmark.py [num_workers] [cooked_trace_folder] [scheme ...]
+# where a scheme is bb, mpc, dp, rl (every model of NN_MODELS) or rl:<checkpoint>
+SCHEMES = ['bb', 'mpc', 'rl', 'dp']
+NN_MODELS = ['./models/pretrain_linear_reward.ckpt']
+# the files a scheme runs, next to this script
+SCHEME_SOURCES = {'bb': ['bb.py', 'fixed_env.py'],
+                  'mpc': ['mpc.py', 'mpc_planner.py', 'video_sizes.py', 'fixed_env.py'],
+                  'rl': ['rl_no_training.py', 'a3c.py', 'fixed_env.py'],
+                  'dp': ['dp_solver.py', 'video_sizes.py']}
+RL_PREFIX = 'rl:'
+RESULTS_DB = './results/benchmark.db'
+NUM_WORKERS = 4
+VIDEO_SIZE_FILE = './video_size_'
+BITRATE_LEVELS = 6
+VIDEO_BIT_RATE = [300, 750, 1200, 1850, 2850, 4300]  # Kbps
+VIDEO_CHUNCK_LEN = 4.0  # sec
+REBUF_PENALTY = 4.3
+SMOOTH_PENALTY = 1
+DEFAULT_QUALITY = 1
+TOTAL_VIDEO_CHUNKS = 48  # the total reward is over chunks 2 to 48, as in plot_results.py
+M_IN_K = 1000.0
+
+CREATE_TABLES = [
+    # scheme is rl:<checkpoint> for the rl scheme
+    'CREATE TABLE IF NOT EXISTS runs ('
+    'id INTEGER PRIMARY KEY, scheme TEXT NOT NULL, trace TEXT NOT NULL, '
+    'input_hash TEXT NOT NULL, total_reward REAL, run_time REAL, '
+    'UNIQUE (scheme, trace))',
+    # the columns of the text logs, download_time is NULL for dp
+    'CREATE TABLE IF NOT EXISTS chunks ('
+    'run_id INTEGER NOT NULL, chunk INTEGER NOT NULL, time_stamp REAL, '
+    'bit_rate INTEGER, buffer_size REAL, rebuffer_time REAL, chunk_size INTEGER, '
+    'download_time REAL, reward REAL, PRIMARY KEY (run_id, chunk))']
+
+
+def hash_files(key, file_paths):
+    for file_path in file_paths:
+        key.update(file_path)
+        with open(file_path, 'rb') as f:
+            key.update(f.read())
+
+
+def get_trace_hash(cooked_time, cooked_bw):
+    key = hashlib.sha1()
+    key.update(np.ascontiguousarray(cooked_time, dtype=np.float64).tostring())
+    key.update(np.ascontiguousarray(cooked_bw, dtype=np.float64).tostring())
+    return key.hexdigest()
+
+
+def get_scheme_hash(scheme):
+    # the chunk sizes, the source of the scheme and for rl the checkpoint
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    scheme_name = scheme.split(':')[0]
+    key = hashlib.sha1()
+    key.update(scheme)
+    hash_files(key, [VIDEO_SIZE_FILE + str(bitrate) for bitrate in xrange(BITRATE_LEVELS)])
+    hash_files(key, [os.path.join(source_dir, source) for source in SCHEME_SOURCES[scheme_name]])
+    if scheme.startswith(RL_PREFIX):
+        hash_files(key, sorted(glob.glob(scheme[len(RL_PREFIX):] + '.*')))
+    return key.hexdigest()
+
+
+def get_chunks(records):
+    # the records of run_traces as rows of the chunks table
+    chunks = []
+    time_stamp = 0
+    for delay, sleep_time, bit_rate, buffer_size, \
+            rebuf, video_chunk_size, reward in records:
+        time_stamp += delay + sleep_time  # in ms
+        chunks.append((time_stamp / M_IN_K, VIDEO_BIT_RATE[bit_rate], float(buffer_size),
+                       float(rebuf), int(video_chunk_size), float(delay), float(reward)))
+    return chunks
+
+
+def get_dp_chunks(path, video_size):
+    # the rewards of the optimal path, as plot_results.py gets them from the dp log
+    chunks = []
+    last_time = 0
+    last_buffer = 0
+    last_bit_rate = DEFAULT_QUALITY
+    for n, _, _, chunk_time, buffer_size, _, bit_rate in path:
+        bit_rate = int(bit_rate)
+        rebuf = 0.0
+        if np.isclose(buffer_size, VIDEO_CHUNCK_LEN):
+            rebuf = max((chunk_time - last_time) - last_buffer, 0.0)
+        reward = VIDEO_BIT_RATE[bit_rate] / M_IN_K \
+            - REBUF_PENALTY * rebuf \
+            - SMOOTH_PENALTY * np.abs(VIDEO_BIT_RATE[bit_rate] -
+                                      VIDEO_BIT_RATE[last_bit_rate]) / M_IN_K
+        chunks.append((float(chunk_time), VIDEO_BIT_RATE[bit_rate], float(buffer_size), rebuf,
+                       int(video_size[bit_rate, int(n)]), None, reward))
+        last_time = chunk_time
+        last_buffer = buffer_size
+        last_bit_rate = bit_rate
+    return chunks
+
+
+def get_actor(nn_model, actors):
+    # tensorflow is only imported by the processes that run rl cells, each
+    # checkpoint is restored once per process into its own graph
+    import tensorflow as tf
+    import rl_no_training
+    if nn_model not in actors:
+        graph = tf.Graph()
+        with graph.as_default():
+            sess = tf.Session(graph=graph)
+            actors[nn_model] = rl_no_training.restore_actor(sess, nn_model)
+    return actors[nn_model]
+
+
+def run_cell(scheme, cooked_time, cooked_bw, video_size, actors):
+    if scheme == 'bb':
+        return get_chunks(bb.run_traces([cooked_time], [cooked_bw])[0])
+    if scheme == 'mpc':
+        return get_chunks(mpc.run_traces([cooked_time], [cooked_bw])[0])
+    if scheme == 'dp':
+        _, path, _ = dp_solver.solve(cooked_time, cooked_bw, video_size)
+        return get_dp_chunks(path, video_size)
+    if scheme.startswith(RL_PREFIX):
+        import rl_no_training
+        actor = get_actor(scheme[len(RL_PREFIX):], actors)
+        return get_chunks(rl_no_training.run_traces(actor, [cooked_time], [cooked_bw])[0])
+    raise ValueError('unknown scheme ' + scheme)
+
+
+def worker(worker_id, num_workers, jobs, result_queue):
+    # the jobs worker_id, worker_id + num_workers, ..., a failed cell is
+    # reported instead of stopping the worker
+    video_size = video_sizes.load_video_size()
+    actors = {}
+    for i in xrange(worker_id, len(jobs), num_workers):
+        scheme, trace, cooked_time, cooked_bw = jobs[i]
+        start = time.time()
+        try:
+            chunks = run_cell(scheme, cooked_time, cooked_bw, video_size, actors)
+        except Exception as e:
+            result_queue.put((i, None, repr(e)))
+            continue
+        result_queue.put((i, chunks, time.time() - start))
+
+
+def save_run(db, scheme, trace, input_hash, chunks, run_time):
+    total_reward = np.sum([chunk[-1] for chunk in chunks[1:TOTAL_VIDEO_CHUNKS]])
+    with db:
+        for run_id, in db.execute('SELECT id FROM runs WHERE scheme = ? AND trace = ?',
+                                  (scheme, trace)).fetchall():
+            db.execute('DELETE FROM chunks WHERE run_id = ?', (run_id,))
+            db.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+        run_id = db.execute('INSERT INTO runs (scheme, trace, input_hash, total_reward, run_time) '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            (scheme, trace, input_hash, float(total_reward), run_time)).lastrowid
+        db.executemany('INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       [(run_id, n) + chunk for n, chunk in enumerate(chunks)])
+
+
+def get_input_hashes(schemes, all_cooked_time, all_cooked_bw, all_file_names):
+    # (scheme, trace) -> hash of everything the cell depends on
+    trace_hashes = [get_trace_hash(all_cooked_time[i], all_cooked_bw[i])
+                    for i in xrange(len(all_file_names))]
+    input_hashes = {}
+    for scheme in schemes:
+        scheme_hash = get_scheme_hash(scheme)
+        for i in xrange(len(all_file_names)):
+            input_hashes[(scheme, all_file_names[i])] = \
+                hashlib.sha1(scheme_hash + trace_hashes[i]).hexdigest()
+    return input_hashes
+
+
+def get_saved_runs(db, input_hashes):
+    # (scheme, trace) -> total reward of the cells saved with their current inputs
+    saved_runs = {}
+    for scheme, trace, input_hash, total_reward in \
+            db.execute('SELECT scheme, trace, input_hash, total_reward FROM runs'):
+        if input_hashes.get((scheme, trace)) == input_hash:
+            saved_runs[(scheme, trace)] = total_reward
+    return saved_runs
+
+
+def run_benchmark(db, schemes, all_cooked_time, all_cooked_bw, all_file_names,
+                  num_workers=NUM_WORKERS):
+    """
+    Runs the (scheme, trace) cells whose inputs are not in the database
+    yet in num_workers processes and saves them. Returns the number of
+    cells run and of cells that failed.
+    """
+    input_hashes = get_input_hashes(schemes, all_cooked_time, all_cooked_bw, all_file_names)
+    saved_runs = get_saved_runs(db, input_hashes)
+
+    jobs = []
+    for scheme in schemes:
+        for i in xrange(len(all_file_names)):
+            if (scheme, all_file_names[i]) not in saved_runs:
+                jobs.append((scheme, all_file_names[i], all_cooked_time[i], all_cooked_bw[i]))
+
+    num_workers = max(1, min(num_workers, len(jobs)))
+    result_queue = mp.Queue()
+    workers = []
+    for i in xrange(num_workers):
+        workers.append(mp.Process(target=worker,
+                                  args=(i, num_workers, jobs, result_queue)))
+    for i in xrange(num_workers):
+        workers[i].start()
+
+    num_failed = 0
+    for _ in xrange(len(jobs)):
+        job_idx, chunks, run_time = result_queue.get()
+        scheme, trace = jobs[job_idx][:2]
+        if chunks is None:
+            print(scheme + '\t' + trace + '\tfailed: ' + run_time)
+            num_failed += 1
+            continue
+        save_run(db, scheme, trace, input_hashes[(scheme, trace)], chunks, run_time)
+
+    for i in xrange(num_workers):
+        workers[i].join()
+    return len(jobs), num_failed
+
+
+def main():
+    num_workers = NUM_WORKERS
+    cooked_trace_folder = load_trace.COOKED_TRACE_FOLDER
+    schemes = SCHEMES
+    if len(sys.argv) > 1:
+        num_workers = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        cooked_trace_folder = sys.argv[2]
+    if len(sys.argv) > 3:
+        schemes = sys.argv[3:]
+
+    # rl runs every model of NN_MODELS
+    cell_schemes = []
+    for scheme in schemes:
+        if scheme == 'rl':
+            cell_schemes += [RL_PREFIX + nn_model for nn_model in NN_MODELS]
+        else:
+            cell_schemes.append(scheme)
+
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(cooked_trace_folder)
+
+    if not os.path.exists(os.path.dirname(RESULTS_DB)):
+        os.makedirs(os.path.dirname(RESULTS_DB))
+    db = sqlite3.connect(RESULTS_DB)
+    for create_table in CREATE_TABLES:
+        db.execute(create_table)
+
+    start = time.time()
+    num_run, num_failed = run_benchmark(db, cell_schemes, all_cooked_time,
+                                        all_cooked_bw, all_file_names, num_workers)
+    num_cells = len(cell_schemes) * len(all_file_names)
+    print(str(num_cells) + ' cells, ' + str(num_run - num_failed) + ' run, ' +
+          str(num_failed) + ' failed and ' + str(num_cells - num_run) + ' from ' +
+          RESULTS_DB + ' in ' + str(time.time() - start) + ' sec')
+
+    # the mean total reward of every scheme over the traces given
+    saved_runs = get_saved_runs(db, get_input_hashes(cell_schemes, all_cooked_time,
+                                                     all_cooked_bw, all_file_names))
+    for scheme in cell_schemes:
+        rewards = [saved_runs[(scheme, trace)] for trace in all_file_names
+                   if (scheme, trace) in saved_runs]
+        if len(rewards) > 0:
+            print(scheme + '\ttraces: ' + str(len(rewards)) +
+                  '\tmean total reward: ' + str(np.mean(rewards)))
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
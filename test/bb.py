@@ -20,22 +20,21 @@ LOG_FILE = './results/log_sim_bb'
 # log in format of time_stamp bit_rate buffer_size rebuffer_time chunk_size download_time reward
 
 
-def main():
-
-    np.random.seed(RANDOM_SEED)
-
-    assert len(VIDEO_BIT_RATE) == A_DIM
-
-    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace()
+def run_traces(all_cooked_time, all_cooked_bw, num_videos=None):
+    """
+    Streams num_videos videos (by default each trace once) with the
+    buffer-based bitrates and returns the chunks of every video as
+    [delay, sleep_time, bit_rate, buffer_size, rebuf, video_chunk_size,
+    reward]. The traces are played in order and start over after the last.
+    """
+    if num_videos is None:
+        num_videos = len(all_cooked_time)
 
     net_env = env.Environment(all_cooked_time=all_cooked_time,
                               all_cooked_bw=all_cooked_bw)
 
-    log_path = LOG_FILE + '_' + all_file_names[net_env.trace_idx]
-    log_file = open(log_path, 'wb')
-
-    epoch = 0
-    time_stamp = 0
+    all_records = []
+    records = []
 
     last_bit_rate = DEFAULT_QUALITY
     bit_rate = DEFAULT_QUALITY
@@ -52,9 +51,6 @@ def main():
         end_of_video, video_chunk_remain = \
             net_env.get_video_chunk(bit_rate)
 
-        time_stamp += delay  # in ms
-        time_stamp += sleep_time  # in ms
-
         # reward is video quality - rebuffer penalty
         reward = VIDEO_BIT_RATE[bit_rate] / M_IN_K \
                  - REBUF_PENALTY * rebuf \
@@ -64,15 +60,8 @@ def main():
 
         last_bit_rate = bit_rate
 
-        # log time_stamp, bit_rate, buffer_size, reward
-        log_file.write(str(time_stamp / M_IN_K) + '\t' +
-                       str(VIDEO_BIT_RATE[bit_rate]) + '\t' +
-                       str(buffer_size) + '\t' +
-                       str(rebuf) + '\t' +
-                       str(video_chunk_size) + '\t' +
-                       str(delay) + '\t' +
-                       str(reward) + '\n')
-        log_file.flush()
+        records.append([delay, sleep_time, bit_rate, buffer_size,
+                        rebuf, video_chunk_size, reward])
 
         if buffer_size < RESEVOIR:
             bit_rate = 0
@@ -84,21 +73,58 @@ def main():
         bit_rate = int(bit_rate)
 
         if end_of_video:
-            log_file.write('\n')
-            log_file.close()
+            all_records.append(records)
+            records = []
 
             last_bit_rate = DEFAULT_QUALITY
             bit_rate = DEFAULT_QUALITY  # use the default action here
             r_batch = []
 
-            print "video count", video_count
             video_count += 1
 
-            if video_count > len(all_file_names):
+            if video_count >= num_videos:
                 break
 
-            log_path = LOG_FILE + '_' + all_file_names[net_env.trace_idx]
-            log_file = open(log_path, 'wb')
+    return all_records
+
+
+def write_logs(all_records, all_file_names, log_file_prefix=LOG_FILE):
+    # the time stamp runs on across the videos, as in one test run
+    time_stamp = 0
+    video_count = 0
+    for records, file_name in zip(all_records, all_file_names):
+        with open(log_file_prefix + '_' + file_name, 'wb') as log_file:
+            for delay, sleep_time, bit_rate, buffer_size, \
+                    rebuf, video_chunk_size, reward in records:
+                time_stamp += delay  # in ms
+                time_stamp += sleep_time  # in ms
+
+                # log time_stamp, bit_rate, buffer_size, reward
+                log_file.write(str(time_stamp / M_IN_K) + '\t' +
+                               str(VIDEO_BIT_RATE[bit_rate]) + '\t' +
+                               str(buffer_size) + '\t' +
+                               str(rebuf) + '\t' +
+                               str(video_chunk_size) + '\t' +
+                               str(delay) + '\t' +
+                               str(reward) + '\n')
+            log_file.write('\n')
+
+        print "video count", video_count
+        video_count += 1
+
+
+def main():
+
+    np.random.seed(RANDOM_SEED)
+
+    assert len(VIDEO_BIT_RATE) == A_DIM
+
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace()
+
+    # one video more than there are traces, the first trace is played again
+    # and its log written over
+    all_records = run_traces(all_cooked_time, all_cooked_bw, len(all_file_names) + 1)
+    write_logs(all_records, all_file_names + all_file_names[:1])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,78 @@
+import sys
+import time
+import numpy as np
+import dp
+import video_sizes
+
+
+# compares the download time table of dp.get_download_time, built from a
+# cumulative sum of the bandwidth, with the slot by slot accumulation of
+# dp.get_download_time_scalar on random quantized traces, and reports the
+# time of both
+# usage: python check_dp_download_time.py [num_traces]
+NUM_TRACES = 5
+NUM_TIME_PT = 300  # slots per trace
+TIME_STEPS = [1, 0.05]  # sec, dp.py and dp.cc
+TOTAL_VIDEO_CHUNKS = 48
+BITRATE_LEVELS = 6
+MAX_BANDWIDTH = 8.0  # Mbit/sec
+M_IN_K = 1000.0
+RANDOM_SEED = 42
+
+
+def random_trace(num_time_pt):
+    # bandwidth in Mbit/sec, with runs of constant and of zero bandwidth
+    quan_bw = np.random.uniform(0, MAX_BANDWIDTH, num_time_pt)
+    for i in xrange(num_time_pt // 20):
+        start = np.random.randint(num_time_pt)
+        quan_bw[start:start + np.random.randint(1, 20)] = np.random.choice([0.0, 1.0, 2.5])
+    return quan_bw
+
+
+def main():
+    num_traces = NUM_TRACES
+    if len(sys.argv) > 1:
+        num_traces = int(sys.argv[1])
+
+    np.random.seed(RANDOM_SEED)
+    video_size = video_sizes.load_video_size()
+
+    mismatches = 0
+    for dt in TIME_STEPS:
+        vectorized_time = 0.0
+        scalar_time = 0.0
+        num_mismatches = 0
+        for i in xrange(num_traces):
+            quan_bw = random_trace(NUM_TIME_PT)
+            quan_time = np.arange(NUM_TIME_PT) * dt
+
+            start = time.time()
+            download_time = dp.get_download_time(TOTAL_VIDEO_CHUNKS, quan_time, quan_bw, dt,
+                                                 video_size, BITRATE_LEVELS)
+            vectorized_time += time.time() - start
+
+            start = time.time()
+            expected_download_time = dp.get_download_time_scalar(
+                TOTAL_VIDEO_CHUNKS, quan_time, quan_bw, dt, video_size, BITRATE_LEVELS)
+            scalar_time += time.time() - start
+
+            # the scalar version adds up dt slot by slot
+            mismatch = ~np.isclose(download_time, expected_download_time, rtol=0, atol=dt / 2)
+            if mismatch.any():
+                num_mismatches += np.sum(mismatch)
+                n, t, b = np.argwhere(mismatch)[0]
+                print('mismatch: chunk ' + str(n) + ' slot ' + str(t) + ' bitrate ' + str(b) + ': ' +
+                      str(download_time[n, t, b]) + ' vs ' + str(expected_download_time[n, t, b]))
+
+        print('dt ' + str(dt) + '\tvectorized: ' + str(vectorized_time / num_traces * M_IN_K) + ' ms' +
+              '\tscalar: ' + str(scalar_time / num_traces * M_IN_K) + ' ms' +
+              '\tmismatches: ' + str(num_mismatches) + '/' +
+              str(num_traces * TOTAL_VIDEO_CHUNKS * NUM_TIME_PT * BITRATE_LEVELS))
+        mismatches += num_mismatches
+
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import numpy as np
+import dp_solver
+import load_trace
+import video_sizes
+
+
+# compares the optimal total reward of dp_solver.solve with the logs of
+# dp.cc, on the exact grid and with DOMINANCE_PRUNING, and reports whether
+# the path of dp.cc reaches the buffer cap, where dominance pruning is not
+# exact: a trace with long outages between short bursts of bandwidth, e.g.
+# 15 Mbps for 20 sec out of every 80 and 0.1 Mbps else, fills the buffer
+# run dp.cc on the same traces first, it writes ./results/log_sim_dp_<trace>
+# usage: python check_dp_solver.py [dp.cc results folder] [cooked_trace_folder]
+DP_RESULTS_FOLDER = './results/'
+DP_LOG_PREFIX = 'log_sim_dp_'
+REWARD_TOLERANCE = 0.01  # dp.cc adds up the rewards in float32
+CAP_MARGIN = dp_solver.VIDEO_CHUNCK_LEN / dp_solver.M_IN_K  # sec, a chunk more clips the buffer
+
+
+def load_dp_log(log_path):
+    # (total reward, buffer of every chunk in sec) of a dp.cc log
+    with open(log_path, 'rb') as f:
+        total_reward = float(f.readline())
+        rows = [line.split() for line in f]
+    buffers = [float(row[4]) for row in rows if len(row) == 7]
+    return total_reward, np.array(buffers)
+
+
+def main():
+    dp_results_folder = DP_RESULTS_FOLDER
+    cooked_trace_folder = load_trace.COOKED_TRACE_FOLDER
+    if len(sys.argv) > 1:
+        dp_results_folder = sys.argv[1]
+    if len(sys.argv) > 2:
+        cooked_trace_folder = sys.argv[2]
+
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(cooked_trace_folder)
+    video_size = video_sizes.load_video_size()
+
+    mismatches = 0
+    num_checked = 0
+    num_at_cap = 0
+    for i in xrange(len(all_file_names)):
+        log_path = os.path.join(dp_results_folder, DP_LOG_PREFIX + all_file_names[i])
+        if not os.path.exists(log_path):
+            print(all_file_names[i] + '\tno dp.cc log, skipped')
+            continue
+        expected_reward, dp_buffers = load_dp_log(log_path)
+        at_cap = np.max(dp_buffers) >= dp_solver.BUFFER_THRESH - CAP_MARGIN
+
+        start = time.time()
+        exact_reward = dp_solver.solve(all_cooked_time[i], all_cooked_bw[i], video_size,
+                                       dominance_pruning=False)[0]
+        exact_time = time.time() - start
+
+        start = time.time()
+        dominance_reward = dp_solver.solve(all_cooked_time[i], all_cooked_bw[i], video_size,
+                                           dominance_pruning=True)[0]
+        dominance_time = time.time() - start
+
+        print(all_file_names[i] + '\tdp.cc: ' + str(expected_reward) +
+              '\tmax buffer: ' + str(np.max(dp_buffers)) + ' sec' +
+              '\texact: ' + str(exact_reward) + ' (' + str(exact_time) + ' sec)' +
+              '\tdominance: ' + str(dominance_reward) + ' (' + str(dominance_time) + ' sec)' +
+              '\tdominance loss: ' + str(exact_reward - dominance_reward))
+
+        num_checked += 1
+        if at_cap:
+            num_at_cap += 1
+        # only the exact grid has to match dp.cc
+        if abs(exact_reward - expected_reward) > REWARD_TOLERANCE:
+            mismatches += 1
+            print('mismatch: ' + all_file_names[i] + ': ' +
+                  str(exact_reward) + ' vs ' + str(expected_reward))
+
+    print(str(num_checked) + ' traces, ' + str(num_at_cap) + ' reaching the buffer cap, ' +
+          str(mismatches) + ' mismatches')
+    if num_at_cap == 0:
+        print('no trace reaches the buffer cap of ' + str(dp_solver.BUFFER_THRESH) + ' sec')
+
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
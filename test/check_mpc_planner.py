@@ -0,0 +1,93 @@
+import sys
+import time
+import numpy as np
+import mpc_planner
+import video_sizes
+
+
+# compares the bitrate mpc_planner.plan picks with the enumeration of all
+# combinations, for the linear reward of mpc.py and the hd reward of the
+# mpc servers, and reports the time per decision
+# usage: python check_mpc_planner.py [num_decisions]
+NUM_DECISIONS = 2000
+HORIZONS = [1, 2, 3, 4, 5]
+LONG_HORIZONS = [6, 7, 8]  # only timed, the enumeration takes too long
+BITRATE_LEVELS = 6
+TOTAL_VIDEO_CHUNKS = 48
+VIDEO_BIT_RATE = [300, 750, 1200, 1850, 2850, 4300]  # Kbps
+BITRATE_REWARD = [1, 2, 3, 12, 15, 20]
+M_IN_K = 1000.0
+REWARDS = [('linear', VIDEO_BIT_RATE, 4.3, M_IN_K, True),  # test/mpc.py
+           ('hd', BITRATE_REWARD, 8, 1., False)]  # rl_server/*mpc_server.py
+MIN_BANDWIDTH = 0.05  # MB/sec
+MAX_BANDWIDTH = 5.0  # MB/sec
+MAX_BUFFER = 60.0  # sec
+RANDOM_SEED = 42
+
+
+def random_decision(video_size, horizon):
+    last_index = np.random.randint(TOTAL_VIDEO_CHUNKS)
+    last_quality = np.random.randint(BITRATE_LEVELS)
+    start_buffer = np.random.uniform(0, MAX_BUFFER)
+    if np.random.randint(4) == 0:
+        start_buffer = 0.0
+    future_bandwidth = np.exp(np.random.uniform(np.log(MIN_BANDWIDTH), np.log(MAX_BANDWIDTH)))
+    download_times = mpc_planner.get_download_times(
+        video_sizes.get_future_chunk_sizes(video_size, last_index, horizon), future_bandwidth)
+    return download_times, last_quality, start_buffer
+
+
+def main():
+    num_decisions = NUM_DECISIONS
+    if len(sys.argv) > 1:
+        num_decisions = int(sys.argv[1])
+
+    np.random.seed(RANDOM_SEED)
+    video_size = video_sizes.load_video_size()
+
+    mismatches = 0
+    for name, bitrate_utility, rebuf_penalty, utility_scale, later_wins in REWARDS:
+        for horizon in HORIZONS + LONG_HORIZONS:
+            plan_time = 0.0
+            brute_force_time = 0.0
+            num_mismatches = 0
+            num_checked = num_decisions
+            if horizon in LONG_HORIZONS:
+                num_checked = 0
+
+            for i in xrange(num_decisions):
+                download_times, last_quality, start_buffer = random_decision(video_size, horizon)
+
+                start = time.time()
+                quality, reward = mpc_planner.plan(
+                    download_times, last_quality, start_buffer,
+                    bitrate_utility, rebuf_penalty, utility_scale, later_wins)
+                plan_time += time.time() - start
+
+                if i >= num_checked:
+                    continue
+                start = time.time()
+                expected_quality, expected_reward = mpc_planner.plan_brute_force(
+                    download_times, last_quality, start_buffer,
+                    bitrate_utility, rebuf_penalty, utility_scale, later_wins)
+                brute_force_time += time.time() - start
+
+                if quality != expected_quality or reward != expected_reward:
+                    num_mismatches += 1
+                    print('mismatch: ' + str((quality, reward)) + ' vs ' +
+                          str((expected_quality, expected_reward)))
+
+            result = name + '\thorizon ' + str(horizon) + \
+                '\tplan: ' + str(plan_time / num_decisions * M_IN_K) + ' ms'
+            if num_checked > 0:
+                result += '\tenumeration: ' + str(brute_force_time / num_checked * M_IN_K) + ' ms' + \
+                          '\tmismatches: ' + str(num_mismatches) + '/' + str(num_checked)
+            print(result)
+            mismatches += num_mismatches
+
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
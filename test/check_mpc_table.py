@@ -0,0 +1,93 @@
+import sys
+import time
+import fixed_env as env
+import load_trace
+import video_sizes
+import mpc_planner
+import mpc_table
+
+
+# replays the MPC of rl_server/mpc_server.py over the test traces and
+# reports how often the table built by mpc_table.py picks another bitrate
+# than the online search, and the time per decision of both
+# usage: python check_mpc_table.py [table] [trace_folder]
+BITRATE_REWARD = mpc_table.BITRATE_REWARD
+REBUF_PENALTY = mpc_table.REBUF_PENALTY
+CHUNK_TIL_VIDEO_END_CAP = 48.0
+PAST_BANDWIDTHS = 5  # harmonic mean of the last 5 throughputs
+M_IN_K = 1000.0
+DEFAULT_QUALITY = 0
+VIDEO_SIZE_FILE = './video_size_'
+
+
+def main():
+    table_path = mpc_table.MPC_TABLE
+    trace_folder = load_trace.COOKED_TRACE_FOLDER
+    if len(sys.argv) > 1:
+        table_path = sys.argv[1]
+    if len(sys.argv) > 2:
+        trace_folder = sys.argv[2]
+
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace(trace_folder)
+    video_size = video_sizes.load_video(path=VIDEO_SIZE_FILE)
+    table = mpc_table.load_table(table_path)
+
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw)
+
+    past_bandwidths = []
+    bit_rate = DEFAULT_QUALITY
+    video_count = 0
+    decisions = 0
+    disagreements = 0
+    online_time = 0.0
+    lookup_time = 0.0
+
+    while True:
+        delay, sleep_time, buffer_size, rebuf, \
+            video_chunk_size, next_video_chunk_sizes, \
+            end_of_video, video_chunk_remain = \
+            net_env.get_video_chunk(bit_rate)
+
+        # same bandwidth prediction as the server
+        bandwidth = float(video_chunk_size) / float(delay) / M_IN_K  # MB/sec
+        past_bandwidths = (past_bandwidths + [bandwidth])[-PAST_BANDWIDTHS:]
+        bandwidth_sum = 0
+        for past_val in past_bandwidths:
+            bandwidth_sum += (1 / float(past_val))
+        future_bandwidth = 1.0 / (bandwidth_sum / len(past_bandwidths))
+        last_index = int(CHUNK_TIL_VIDEO_END_CAP - video_chunk_remain)
+
+        start = time.time()
+        chunk_sizes = video_sizes.get_future_chunk_sizes(
+            video_size, last_index, mpc_table.get_future_chunk_length(last_index))
+        download_times = mpc_planner.get_download_times(chunk_sizes, future_bandwidth)
+        quality, _ = mpc_planner.plan(download_times, bit_rate, buffer_size,
+                                      BITRATE_REWARD, REBUF_PENALTY, utility_scale=1.)
+        online_time += time.time() - start
+
+        start = time.time()
+        table_quality = mpc_table.lookup(table, last_index, bit_rate, future_bandwidth, buffer_size)
+        lookup_time += time.time() - start
+
+        decisions += 1
+        if table_quality != quality:
+            disagreements += 1
+        bit_rate = quality  # follow the online decisions
+
+        if end_of_video:
+            bit_rate = DEFAULT_QUALITY
+            past_bandwidths = []
+
+            video_count += 1
+            if video_count >= len(all_cooked_time):
+                break
+
+    print('decisions: ' + str(decisions) +
+          '\tdisagreement: ' + str(disagreements / float(decisions)) +
+          '\tonline: ' + str(online_time / decisions * M_IN_K) + ' ms' +
+          '\ttable: ' + str(lookup_time / decisions * M_IN_K) + ' ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-# Too slow! Use dp.cc instead.
+# Too slow! Use dp_solver.py or dp.cc instead.
 
 import numpy as np
 import load_trace
@@ -26,9 +26,30 @@ VIDEO_SIZE_FILE = './video_size_'
 
 # pre-compute all possible download time
 def get_download_time(total_video_chunks, quan_time, quan_bw, dt, video_size, bitrate_levels):
+    """
+    download_time[n, t, b] of get_download_time_scalar, for all chunks,
+    start times and bitrates at once: with the bytes delivered by slots
+    0..i - 1 in cum_bytes[i], the download of chunk n at bitrate b from
+    slot t ends in the first slot i with cum_bytes[i + 1] - cum_bytes[t]
+    >= chunk size, or in the last slot, and takes i - t whole slots.
+    """
+    num_time_pt = len(quan_time)
+    cum_bytes = np.zeros(num_time_pt + 1)
+    cum_bytes[1:] = np.cumsum(np.asarray(quan_bw[:num_time_pt], dtype=np.float64) *
+                              dt / BITS_IN_BYTE * B_IN_MB * PACKET_PAYLOAD_PORTION)
+
+    chunk_size = np.array([video_size[b][:total_video_chunks] for b in xrange(bitrate_levels)],
+                          dtype=np.float64).T  # in bytes, [chunks, bitrates]
+    target = cum_bytes[None, :num_time_pt, None] + chunk_size[:, None, :]
+    end_idx = np.searchsorted(cum_bytes, target.ravel(), side='left').reshape(target.shape)
+    end_idx = np.minimum(end_idx, num_time_pt)
+
+    return (end_idx - np.arange(num_time_pt)[None, :, None] - 1) * float(dt)
+
+
+def get_download_time_scalar(total_video_chunks, quan_time, quan_bw, dt, video_size, bitrate_levels):
     download_time = np.zeros([total_video_chunks, len(quan_time), bitrate_levels])
     for t in xrange(len(quan_time)):
-        print t, len(quan_time)
         for n in xrange(total_video_chunks):
             for b in xrange(bitrate_levels):
                 chunk_size = video_size[b][n]  # in bytes
@@ -47,28 +68,8 @@ def get_download_time(total_video_chunks, quan_time, quan_bw, dt, video_size, bi
     return download_time
 
 
-def restore_or_compute_download_time(download_time, video_chunk, quan_t_idx, bit_rate,
-                                     quan_time, quan_bw, dt, video_size):
-    if (video_chunk, quan_t_idx, bit_rate) in download_time:
-        return download_time[video_chunk, quan_t_idx, bit_rate]
-    else:
-        chunk_size = video_size[bit_rate][video_chunk]  # in bytes
-        downloaded = 0.0
-        time_spent = 0.0
-        quan_idx = quan_t_idx
-        while True:
-            curr_bw = quan_bw[quan_idx]  # in Mbit/sec
-            downloaded += curr_bw * dt / BITS_IN_BYTE * B_IN_MB * PACKET_PAYLOAD_PORTION
-            quan_idx += 1
-            if downloaded >= chunk_size or quan_idx >= len(quan_time):
-                break
-            time_spent += dt  # lower bound the time spent
-        download_time[video_chunk, quan_t_idx, bit_rate] = time_spent
-        return time_spent
-
-
 def main():
-    all_cooked_time, all_cooked_bw = load_trace.load_trace()
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace()
 
     video_size = {}  # in bytes
     for bitrate in xrange(BITRATE_LEVELS):
@@ -126,19 +127,16 @@ def main():
 
     assert quan_time[-1] >= t_max
 
-    # -----------------------------------------------------------
-    # (optional) step 3: pre=compute the download time of chunks
+    # ---------------------------------------------------
+    # step 3: pre-compute the download time of chunks
     # download_time(chunk_idx, quan_time, bit_rate)
-    # -----------------------------------------------------------
-    all_download_time = {}
-
-    # print "Pre-compute the download time table"
-    # all_download_time = get_download_time(total_video_chunks=TOTAL_VIDEO_CHUNCK,
-    #                                   quan_time=quan_time,
-    #                                   quan_bw=quan_bw,
-    #                                   dt=DT,
-    #                                   video_size=video_size,
-    #                                   bitrate_levels=BITRATE_LEVELS)
+    # ---------------------------------------------------
+    all_download_time = get_download_time(total_video_chunks=TOTAL_VIDEO_CHUNCK,
+                                           quan_time=quan_time,
+                                           quan_bw=quan_bw,
+                                           dt=DT,
+                                           video_size=video_size,
+                                           bitrate_levels=BITRATE_LEVELS)
 
     # -----------------------------
     # step 4: dynamic programming
@@ -147,10 +145,7 @@ def main():
     last_dp_pt = {}
 
     # initialization, take default quality at start off
-    download_time = \
-        restore_or_compute_download_time(
-            all_download_time, 0, 0, DEFAULT_QUALITY,
-            quan_time, quan_bw, DT, video_size)
+    download_time = all_download_time[0, 0, DEFAULT_QUALITY]
     first_chunk_finish_time = download_time + LINK_RTT / M_IN_K
     first_chunk_finish_idx = int(np.floor(first_chunk_finish_time / DT))
     buffer_size = int(VIDEO_CHUNCK_LEN / M_IN_K / DT)
@@ -167,10 +162,7 @@ def main():
                 for m in xrange(BITRATE_LEVELS):
                     if (n - 1, t, b, m) in total_reward:
                         for new_bit_rate in xrange(BITRATE_LEVELS):
-                            download_time = \
-                                restore_or_compute_download_time(
-                                    all_download_time, n, t, new_bit_rate,
-                                    quan_time, quan_bw, DT, video_size)
+                            download_time = all_download_time[n, t, new_bit_rate]
 
                             buffer_size = quan_time[b]
                             rebuf = np.maximum(download_time - buffer_size, 0.0)
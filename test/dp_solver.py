@@ -0,0 +1,424 @@
+import os
+import sys
+import time
+import Queue
+import hashlib
+import numpy as np
+import multiprocessing as mp
+import load_trace
+import video_sizes
+
+
+# offline optimal bitrates of dp.cc as a python module: the dynamic
+# programming over (chunk, time, buffer, bitrate) of dp.cc, where a stage
+# is a set of compact numpy arrays, all transitions of a stage are evaluated
+# at once and the best ones are picked on a dense grid, the download times
+# come from a cumulative sum of the bandwidth instead of a table, the traces
+# are solved in parallel processes and every result is cached on disk under
+# a hash of the trace, the video and the reward parameters
+# usage: python dp_solver.py [num_workers] [cooked_trace_folder] [--dominance]
+MILLISECONDS_IN_SECOND = 1000.0
+B_IN_MB = 1000000.0
+M_IN_K = 1000.0
+BITS_IN_BYTE = 8.0
+VIDEO_CHUNCK_LEN = 4000.0  # (ms), every time add this amount to buffer
+BITRATE_LEVELS = 6
+TOTAL_VIDEO_CHUNCK = 49
+PACKET_PAYLOAD_PORTION = 0.95
+LINK_RTT = 80  # millisec
+DT = 0.05  # time granularity
+BUFFER_THRESH = 60.0  # sec, max buffer limit
+VIDEO_BIT_RATE = [300, 750, 1200, 1850, 2850, 4300]  # Kbps
+DEFAULT_QUALITY = 1
+REBUF_PENALTY = 4.3  # 1 sec rebuffering -> 4.3 Mbps
+SMOOTH_PENALTY = 1
+PRUNE_MARGIN = 0.01  # as dp.cc, drop states that cannot catch up with the best
+TIME_WINDOW = 128  # time slots of the dense [time, buffer, bitrate] grid of a stage
+# also drop a state when one with the same time and bitrate has more buffer
+# and at least its reward: about twice as fast, but not exact, since near
+# BUFFER_THRESH more buffer is clipped and forces a wait
+DOMINANCE_PRUNING = False
+NUM_WORKERS = 4
+DP_CACHE_DIR = './dp_cache/'
+DP_CACHE_VERSION = 2  # bump when the results of the same inputs change
+OUTPUT_FILE_PATH = './results/log_sim_dp'
+RESULT_POLL_TIME = 10  # sec, how often to check that the workers are still alive
+
+
+def quantize_trace(cooked_time, cooked_bw, dt=DT):
+    """
+    Returns (quan_time, quan_bw) of dp.cc: the bandwidth of the trace
+    sampled every dt sec, where quan_bw[i] is the bandwidth of the first
+    trace point at or after quan_time[i].
+    """
+    cooked_time = np.asarray(cooked_time, dtype=np.float64)
+    cooked_bw = np.asarray(cooked_bw, dtype=np.float64)
+    total_time_pt = int(np.ceil(cooked_time[-1] / dt))
+
+    quan_time = np.floor(cooked_time[0]) + np.arange(total_time_pt + 1) * dt
+    curr_time_idx = np.minimum(np.searchsorted(cooked_time, quan_time, side='left'),
+                               len(cooked_time) - 1)
+    return quan_time, cooked_bw[curr_time_idx]
+
+
+def extend_trace(quan_time, quan_bw, total_time_pt, num_pt, dt=DT):
+    # loops slots 1..total_time_pt of the trace until it has num_pt slots
+    loops = int(np.ceil(float(num_pt - len(quan_bw)) / total_time_pt))
+    if loops <= 0:
+        return quan_time, quan_bw
+    quan_bw = np.concatenate([quan_bw] + [quan_bw[1:total_time_pt + 1]] * loops)
+    quan_time = quan_time[0] + np.arange(len(quan_bw)) * dt
+    return quan_time, quan_bw
+
+
+def get_download_time(cum_bytes, time_idx, chunk_size, dt=DT):
+    """
+    Download time of dp.cc of chunk_size bytes started in slot time_idx:
+    the whole slots before the one that completes the chunk, that is
+    (k - 1) * dt where slots time_idx .. time_idx + k - 1 deliver at least
+    chunk_size bytes. Also returns whether the trace was long enough.
+    """
+    end_idx = np.searchsorted(cum_bytes, cum_bytes[time_idx] + chunk_size, side='left')
+    return (end_idx - time_idx - 1) * dt, end_idx < len(cum_bytes)
+
+
+def solve(cooked_time, cooked_bw, video_size, video_bit_rate=VIDEO_BIT_RATE,
+          rebuf_penalty=REBUF_PENALTY, smooth_penalty=SMOOTH_PENALTY, dt=DT,
+          dominance_pruning=DOMINANCE_PRUNING):
+    """
+    The optimal total reward of the video on the trace and its path, a
+    (TOTAL_VIDEO_CHUNCK, 7) array of the rows of the dp.cc log: chunk,
+    time index, buffer index, time (sec), buffer (sec), bandwidth (Mbps),
+    bitrate, from the first chunk to the last. Also returns the number of
+    states kept and the peak memory of the dp arrays in bytes.
+    """
+    video_size = np.asarray(video_size, dtype=np.float64)
+    bit_rate_mbps = np.asarray(video_bit_rate, dtype=np.float64) / M_IN_K
+    bitrate_levels = len(video_bit_rate)
+    total_video_chunck = video_size.shape[1]
+    buffer_span = int(np.ceil(BUFFER_THRESH / dt)) + 2  # buffer indices, with room for rounding
+    assert buffer_span <= np.iinfo(np.int16).max
+
+    # -----------------------------------------
+    # step 1: quantize the time and bandwidth
+    # -----------------------------------------
+    quan_time, quan_bw = quantize_trace(cooked_time, cooked_bw, dt)
+    total_time_pt = len(quan_bw) - 1
+
+    # ---------------------------------------------------------------
+    # step 2: loop the trace, for as long as downloading the video at
+    # the highest bitrate plus playing it could take, and longer if a
+    # download runs over
+    # ---------------------------------------------------------------
+    t_portion = np.sum(video_size[-1]) / \
+        (np.sum(quan_bw) * dt * B_IN_MB * PACKET_PAYLOAD_PORTION / BITS_IN_BYTE)
+    t_max = quan_time[-1] * t_portion + \
+        total_video_chunck * (VIDEO_CHUNCK_LEN + LINK_RTT) / MILLISECONDS_IN_SECOND
+    quan_time, quan_bw = extend_trace(quan_time, quan_bw, total_time_pt,
+                                      int(np.ceil(t_max / dt)) + 1, dt)
+
+    def get_cum_bytes(quan_bw):
+        cum_bytes = np.zeros(len(quan_bw) + 1)
+        cum_bytes[1:] = np.cumsum(quan_bw * dt / BITS_IN_BYTE * B_IN_MB * PACKET_PAYLOAD_PORTION)
+        return cum_bytes
+    cum_bytes = get_cum_bytes(quan_bw)
+
+    # -------------------------------------------------------------
+    # step 3: dynamic programming, a stage holds the time index,
+    # buffer index, bitrate and the index of the previous state of
+    # every state kept, and the total rewards of the current stage
+    # -------------------------------------------------------------
+    grid = np.empty((TIME_WINDOW, buffer_span, bitrate_levels))
+    owner = np.empty(grid.shape, dtype=np.int64)
+    download_time, _ = get_download_time(cum_bytes, np.array([0]),
+                                         video_size[DEFAULT_QUALITY, 0], dt)
+    chunk_finish_time = download_time[0] + LINK_RTT / M_IN_K
+    stages = [{'time_idx': np.array([int(np.floor(chunk_finish_time / dt))], dtype=np.int32),
+               'buffer_idx': np.array([int(VIDEO_CHUNCK_LEN / M_IN_K / dt)], dtype=np.int16),
+               'bit_rate': np.array([DEFAULT_QUALITY], dtype=np.int8),
+               'last': np.array([-1], dtype=np.int32)}]
+    stage_reward = np.array([bit_rate_mbps[DEFAULT_QUALITY] - rebuf_penalty * chunk_finish_time])
+    num_states = 1
+    peak_memory = 0
+
+    for n in xrange(1, total_video_chunck):
+        stage = stages[-1]
+        t = stage['time_idx'][:, None]
+        m = stage['bit_rate'][:, None]
+        nm = np.arange(bitrate_levels)[None, :]
+
+        while True:
+            if t.max() < len(quan_bw):
+                download_time, in_trace = get_download_time(cum_bytes, t, video_size[nm, n], dt)
+                if in_trace.all():
+                    break
+            # a download runs over the end of the trace, loop it once more
+            quan_time, quan_bw = extend_trace(quan_time, quan_bw, total_time_pt,
+                                              len(quan_bw) + total_time_pt, dt)
+            cum_bytes = get_cum_bytes(quan_bw)
+
+        buffer_size = quan_time[stage['buffer_idx']][:, None]
+        rebuf = np.maximum(download_time - buffer_size, 0.0)
+
+        reward = bit_rate_mbps[nm] \
+            - rebuf_penalty * rebuf \
+            - smooth_penalty * np.abs(bit_rate_mbps[nm] - bit_rate_mbps[m]) \
+            + stage_reward[:, None]
+
+        buffer_size = np.maximum(buffer_size - download_time - LINK_RTT / M_IN_K, 0.0)
+        buffer_size += VIDEO_CHUNCK_LEN / M_IN_K
+        # exceed the buffer limit, wait until it drains
+        drain_buffer_time = np.maximum(buffer_size - BUFFER_THRESH, 0.0)
+        buffer_size = np.minimum(buffer_size, BUFFER_THRESH)
+
+        buffer_idx = np.ceil(buffer_size / dt).astype(np.int64)
+        chunk_finish_time = quan_time[t] + download_time + drain_buffer_time + LINK_RTT / M_IN_K
+        time_idx = np.floor(chunk_finish_time / dt).astype(np.int64)
+
+        # the arrays of the transitions, the stages kept for the path and
+        # the grid are the most memory the dp holds at once
+        peak_memory = max(peak_memory, grid.nbytes + owner.nbytes + stage_reward.nbytes +
+                          sum(a.nbytes for a in [download_time, in_trace, buffer_size, rebuf, reward,
+                                                 drain_buffer_time, buffer_idx, chunk_finish_time,
+                                                 time_idx]) +
+                          sum(a.nbytes for past_stage in stages for a in past_stage.values()))
+
+        # drop the states that cannot reach the best state of the stage
+        # even at the highest bitrate from here on
+        max_reward_remaining_after_n = (total_video_chunck - n - 1) * bit_rate_mbps[-1]
+        keep = reward + max_reward_remaining_after_n >= reward.max() - PRUNE_MARGIN
+        last = np.broadcast_to(np.arange(len(stage_reward))[:, None], reward.shape)[keep]
+        time_idx = time_idx[keep]
+        buffer_idx = buffer_idx[keep]
+        new_bit_rate = np.broadcast_to(nm, reward.shape)[keep]
+        reward = reward[keep]
+
+        best = get_best_states(time_idx, buffer_idx, new_bit_rate, reward, grid, owner,
+                               dominance_pruning)
+        stages.append({'time_idx': time_idx[best].astype(np.int32),
+                       'buffer_idx': buffer_idx[best].astype(np.int16),
+                       'bit_rate': new_bit_rate[best].astype(np.int8),
+                       'last': last[best].astype(np.int32)})
+        stage_reward = reward[best]
+        num_states += len(best)
+
+    # ---------------------------------
+    # step 4: get the max total reward
+    # ---------------------------------
+    state = int(np.argmax(stage_reward))
+    optimal_total_reward = stage_reward[state]
+
+    path = np.zeros((total_video_chunck, 7))
+    for n in reversed(xrange(total_video_chunck)):
+        t = stages[n]['time_idx'][state]
+        b = stages[n]['buffer_idx'][state]
+        path[n] = [n, t, b, quan_time[t], quan_time[b], quan_bw[t], stages[n]['bit_rate'][state]]
+        state = stages[n]['last'][state]
+
+    return optimal_total_reward, path, {'states': num_states, 'peak_memory': peak_memory}
+
+
+def get_best_states(time_idx, buffer_idx, bit_rate, reward, grid, owner, dominance_pruning=False):
+    """
+    Indices of the states of a stage to keep: the best state of every
+    (time, buffer, bitrate), and with dominance_pruning only if no state
+    with the same time and bitrate, more buffer and at least the reward
+    dominates it. The states are put into grid and owner, dense
+    [TIME_WINDOW, buffer, bitrate] arrays reused for every window of
+    TIME_WINDOW time slots.
+    """
+    time_span, buffer_span, bitrate_levels = grid.shape
+    flat_grid = grid.reshape(-1)
+    flat_owner = owner.reshape(-1)
+    best = []
+    for time_start in xrange(time_idx.min(), time_idx.max() + 1, time_span):
+        in_window = np.flatnonzero((time_idx >= time_start) & (time_idx < time_start + time_span))
+        if len(in_window) == 0:
+            continue
+        cell = ((time_idx[in_window] - time_start) * buffer_span + buffer_idx[in_window]) * \
+            bitrate_levels + bit_rate[in_window]
+        window_reward = reward[in_window]
+
+        # the best reward of every cell: write all rewards, then again the
+        # ones higher than what their cell got, until none is left
+        grid.fill(-np.inf)
+        pending = np.arange(len(cell))
+        while len(pending) > 0:
+            flat_grid[cell[pending]] = window_reward[pending]
+            pending = pending[window_reward[pending] > flat_grid[cell[pending]]]
+        winners = np.flatnonzero(window_reward == flat_grid[cell])
+        flat_owner[cell[winners]] = winners
+        winners = winners[flat_owner[cell[winners]] == winners]
+
+        if dominance_pruning:
+            # the best reward with more buffer at the same time and bitrate
+            more_buffer = np.full(grid.shape, -np.inf)
+            more_buffer[:, :-1, :] = np.maximum.accumulate(grid[:, :0:-1, :], axis=1)[:, ::-1, :]
+            winners = winners[window_reward[winners] > more_buffer.reshape(-1)[cell[winners]]]
+
+        best.append(in_window[winners])
+
+    return np.concatenate(best)
+
+
+def get_cache_key(cooked_time, cooked_bw, video_size, video_bit_rate=VIDEO_BIT_RATE,
+                  rebuf_penalty=REBUF_PENALTY, smooth_penalty=SMOOTH_PENALTY, dt=DT,
+                  dominance_pruning=DOMINANCE_PRUNING):
+    # content hash of everything the result depends on
+    key = hashlib.sha1()
+    key.update(np.ascontiguousarray(cooked_time, dtype=np.float64).tostring())
+    key.update(np.ascontiguousarray(cooked_bw, dtype=np.float64).tostring())
+    key.update(np.ascontiguousarray(video_size, dtype=np.float64).tostring())
+    key.update(repr((DP_CACHE_VERSION, list(video_bit_rate), float(rebuf_penalty),
+                     float(smooth_penalty), float(dt), DEFAULT_QUALITY, VIDEO_CHUNCK_LEN,
+                     LINK_RTT, BUFFER_THRESH, PACKET_PAYLOAD_PORTION, PRUNE_MARGIN,
+                     bool(dominance_pruning))))
+    return key.hexdigest()
+
+
+def load_cached(cache_dir, cache_key):
+    cache_path = os.path.join(cache_dir, cache_key + '.npz')
+    if not os.path.exists(cache_path):
+        return None
+    cached = np.load(cache_path)
+    return float(cached['reward']), cached['path'], \
+        {'states': int(cached['states']), 'peak_memory': int(cached['peak_memory'])}
+
+
+def save_cached(cache_dir, cache_key, optimal_total_reward, path, stats):
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    # written under a temporary name, so that a killed run leaves no partial file
+    tmp_path = os.path.join(cache_dir, cache_key + '.tmp.npz')
+    np.savez(tmp_path, reward=optimal_total_reward, path=path,
+             states=stats['states'], peak_memory=stats['peak_memory'])
+    os.rename(tmp_path, os.path.join(cache_dir, cache_key + '.npz'))
+
+
+def worker(worker_id, num_workers, jobs, video_size, reward_params, result_queue):
+    # the jobs worker_id, worker_id + num_workers, ..., a failed trace
+    # (e.g. a MemoryError on a long one) is reported instead of stopping the worker
+    for i in xrange(worker_id, len(jobs), num_workers):
+        trace_idx, cooked_time, cooked_bw = jobs[i]
+        try:
+            result = solve(cooked_time, cooked_bw, video_size, **reward_params)
+        except Exception as e:
+            result_queue.put((trace_idx, None, repr(e), None))
+            continue
+        result_queue.put((trace_idx,) + result)
+
+
+def solve_all(all_cooked_time, all_cooked_bw, video_size, num_workers=NUM_WORKERS,
+              cache_dir=DP_CACHE_DIR, **reward_params):
+    """
+    (optimal total reward, path, stats) of every trace, the traces not in the
+    cache are solved by num_workers processes and added to it. A trace that
+    failed, or whose worker died, is None and not counted as solved.
+    """
+    results = [None] * len(all_cooked_time)
+    cache_keys = []
+    jobs = []
+    for i in xrange(len(all_cooked_time)):
+        cache_keys.append(get_cache_key(all_cooked_time[i], all_cooked_bw[i], video_size,
+                                        **reward_params))
+        results[i] = load_cached(cache_dir, cache_keys[i])
+        if results[i] is None:
+            jobs.append((i, all_cooked_time[i], all_cooked_bw[i]))
+
+    num_workers = max(1, min(num_workers, len(jobs)))
+    result_queue = mp.Queue()
+    workers = []
+    for i in xrange(num_workers):
+        workers.append(mp.Process(target=worker,
+                                  args=(i, num_workers, jobs, video_size, reward_params, result_queue)))
+    for i in xrange(num_workers):
+        workers[i].start()
+
+    num_failed = 0
+    num_received = 0
+    all_exited = False
+    while num_received < len(jobs):
+        try:
+            trace_idx, optimal_total_reward, path, stats = \
+                result_queue.get(timeout=RESULT_POLL_TIME)
+        except Queue.Empty:
+            # a worker killed from outside (e.g. by the OOM killer) sends nothing,
+            # give up after one more poll once all of them have exited
+            if all_exited:
+                break
+            all_exited = all(not worker.is_alive() for worker in workers)
+            continue
+        num_received += 1
+        if optimal_total_reward is None:
+            print('trace ' + str(trace_idx) + '\tfailed: ' + path)
+            num_failed += 1
+            continue
+        save_cached(cache_dir, cache_keys[trace_idx], optimal_total_reward, path, stats)
+        results[trace_idx] = (optimal_total_reward, path, stats)
+
+    for i in xrange(num_workers):
+        workers[i].join()
+        if workers[i].exitcode != 0:
+            print('worker ' + str(i) + '\texited with ' + str(workers[i].exitcode))
+    num_failed += len(jobs) - num_received
+    return results, len(jobs) - num_failed
+
+
+def write_log(log_file_path, optimal_total_reward, path):
+    # the log of dp.cc: the total reward, then the states from the last chunk to the first
+    with open(log_file_path, 'wb') as log_file:
+        log_file.write(str(optimal_total_reward) + '\n')
+        for row in reversed(path):
+            log_file.write(str(int(row[0])) + '\t' +
+                           str(int(row[1])) + '\t' +
+                           str(int(row[2])) + '\t' +
+                           str(row[3]) + '\t' +
+                           str(row[4]) + '\t' +
+                           str(row[5]) + '\t' +
+                           str(int(row[6])) + '\n')
+        log_file.write('\n')
+
+
+def main():
+    num_workers = NUM_WORKERS
+    cooked_trace_folder = load_trace.COOKED_TRACE_FOLDER
+    # --dominance turns on the inexact DOMINANCE_PRUNING
+    dominance_pruning = '--dominance' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--dominance']
+    if len(args) > 0:
+        num_workers = int(args[0])
+    if len(args) > 1:
+        cooked_trace_folder = args[1]
+
+    all_cooked_time, all_cooked_bw, all_file_names = load_trace.load_trace(cooked_trace_folder)
+    video_size = video_sizes.load_video_size()
+    assert video_size.shape == (BITRATE_LEVELS, TOTAL_VIDEO_CHUNCK)
+
+    if not os.path.exists(os.path.dirname(OUTPUT_FILE_PATH)):
+        os.makedirs(os.path.dirname(OUTPUT_FILE_PATH))
+
+    start = time.time()
+    results, num_solved = solve_all(all_cooked_time, all_cooked_bw, video_size, num_workers,
+                                    dominance_pruning=dominance_pruning or DOMINANCE_PRUNING)
+    num_failed = 0
+    for i in xrange(len(results)):
+        if results[i] is None:
+            print(all_file_names[i] + '\tfailed, no log written')
+            num_failed += 1
+            continue
+        write_log(OUTPUT_FILE_PATH + '_' + all_file_names[i], results[i][0], results[i][1])
+        print(all_file_names[i] + '\toptimal reward: ' + str(results[i][0]) +
+              '\tstates: ' + str(results[i][2]['states']) +
+              '\tpeak dp memory: ' + str(results[i][2]['peak_memory'] / B_IN_MB) + ' MB')
+
+    print(str(len(results)) + ' traces, ' + str(num_solved) + ' solved, ' +
+          str(num_failed) + ' failed and ' +
+          str(len(results) - num_solved - num_failed) + ' from ' + DP_CACHE_DIR + ' in ' +
+          str(time.time() - start) + ' sec, mean optimal reward ' +
+          str(np.mean([result[0] for result in results if result is not None])))
+    if num_failed > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
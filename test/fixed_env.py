@@ -15,6 +15,121 @@ PACKET_SIZE = 1500  # bytes
 VIDEO_SIZE_FILE = './video_size_'
 
 
+def make_trace_index(cooked_time, cooked_bw):
+    """
+    Returns (slot_time, slot_bw, cum_bytes) as numpy arrays, where
+    cum_bytes[i] is the number of bytes deliverable in mahimahi slots
+    1..i. Slot i ends at cooked_time[i] and starts at cooked_time[i - 1],
+    except slot 1 which starts at time 0 (it is only downloaded in full
+    after looping back to the beginning of the trace).
+    """
+    slot_time = np.asarray(cooked_time, dtype=np.float64)
+    slot_bw = np.asarray(cooked_bw, dtype=np.float64)
+    assert len(slot_time) == len(slot_bw)
+
+    duration = np.zeros(len(slot_time))
+    duration[1] = slot_time[1]
+    duration[2:] = slot_time[2:] - slot_time[1:-1]
+
+    throughput = slot_bw * B_IN_MB / BITS_IN_BYTE
+    packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+    packet_payload[0] = 0
+
+    return slot_time, slot_bw, np.cumsum(packet_payload)
+
+
+def download_chunk(trace_index, mahimahi_ptr, last_mahimahi_time, video_chunk_size):
+    """
+    Delivers video_chunk_size bytes starting from last_mahimahi_time
+    within slot mahimahi_ptr. The slot where the download completes is
+    found by a binary search on the cumulative bytes.
+    Returns (delay in sec, mahimahi_ptr, last_mahimahi_time).
+    """
+    slot_time, slot_bw, cum_bytes = trace_index
+
+    # the current slot is partly used already
+    throughput = slot_bw[mahimahi_ptr] * B_IN_MB / BITS_IN_BYTE
+    duration = slot_time[mahimahi_ptr] - last_mahimahi_time
+
+    packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
+
+    if packet_payload > video_chunk_size:
+        fractional_time = video_chunk_size / throughput / PACKET_PAYLOAD_PORTION
+        return fractional_time, mahimahi_ptr, last_mahimahi_time + fractional_time
+
+    video_chunk_counter_sent = packet_payload  # in bytes
+    delay = duration  # in sec
+    last_mahimahi_time = slot_time[mahimahi_ptr]
+    mahimahi_ptr += 1
+
+    if mahimahi_ptr >= len(slot_bw):
+        # loop back in the beginning
+        # note: trace file starts with time 0
+        mahimahi_ptr = 1
+        last_mahimahi_time = 0
+
+    while True:
+        target = video_chunk_size - video_chunk_counter_sent + cum_bytes[mahimahi_ptr - 1]
+        if cum_bytes[-1] > target:
+            break
+
+        # the rest of the trace is not enough, loop back in the beginning
+        video_chunk_counter_sent += cum_bytes[-1] - cum_bytes[mahimahi_ptr - 1]
+        delay += slot_time[-1] - last_mahimahi_time
+        mahimahi_ptr = 1
+        last_mahimahi_time = 0
+
+    # first slot in which the sent bytes exceed the chunk size
+    end_ptr = max(int(np.searchsorted(cum_bytes, target, side='right')), mahimahi_ptr)
+    if end_ptr > mahimahi_ptr:
+        video_chunk_counter_sent += cum_bytes[end_ptr - 1] - cum_bytes[mahimahi_ptr - 1]
+        delay += slot_time[end_ptr - 1] - last_mahimahi_time
+        last_mahimahi_time = slot_time[end_ptr - 1]
+        mahimahi_ptr = end_ptr
+
+    throughput = slot_bw[mahimahi_ptr] * B_IN_MB / BITS_IN_BYTE
+    fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
+                      throughput / PACKET_PAYLOAD_PORTION
+    delay += fractional_time
+    last_mahimahi_time += fractional_time
+
+    return delay, mahimahi_ptr, last_mahimahi_time
+
+
+def skip_trace(trace_index, mahimahi_ptr, last_mahimahi_time, sleep_time):
+    """
+    Skips sleep_time (in ms) of the trace without downloading. The slot
+    where the sleep ends is found by a binary search on the slot times.
+    Returns (sleep time left in the final slot in ms, mahimahi_ptr,
+    last_mahimahi_time).
+    """
+    slot_time = trace_index[0]
+
+    while True:
+        target = last_mahimahi_time + sleep_time / MILLISECONDS_IN_SECOND
+        if slot_time[-1] > target:
+            break
+
+        # sleep beyond the end of the trace
+        sleep_time -= (slot_time[-1] - last_mahimahi_time) * MILLISECONDS_IN_SECOND
+
+        # loop back in the beginning
+        # note: trace file starts with time 0
+        mahimahi_ptr = 1
+        last_mahimahi_time = 0
+
+    # first slot that ends after the sleep
+    end_ptr = max(int(np.searchsorted(slot_time, target, side='right')), mahimahi_ptr)
+    if end_ptr > mahimahi_ptr:
+        sleep_time -= (slot_time[end_ptr - 1] - last_mahimahi_time) * MILLISECONDS_IN_SECOND
+        last_mahimahi_time = slot_time[end_ptr - 1]
+        mahimahi_ptr = end_ptr
+
+    last_mahimahi_time += sleep_time / MILLISECONDS_IN_SECOND
+
+    return sleep_time, mahimahi_ptr, last_mahimahi_time
+
+
 class Environment:
     def __init__(self, all_cooked_time, all_cooked_bw, random_seed=RANDOM_SEED):
         assert len(all_cooked_time) == len(all_cooked_bw)
@@ -23,6 +138,8 @@ class Environment:
 
         self.all_cooked_time = all_cooked_time
         self.all_cooked_bw = all_cooked_bw
+        self.all_trace_index = [make_trace_index(cooked_time, cooked_bw) for
+                                cooked_time, cooked_bw in zip(all_cooked_time, all_cooked_bw)]
 
         self.video_chunk_counter = 0
         self.buffer_size = 0
@@ -31,6 +148,7 @@ class Environment:
         self.trace_idx = 0
         self.cooked_time = self.all_cooked_time[self.trace_idx]
         self.cooked_bw = self.all_cooked_bw[self.trace_idx]
+        self.trace_index = self.all_trace_index[self.trace_idx]
 
         self.mahimahi_start_ptr = 1
         # randomize the start point of the trace
@@ -53,35 +171,9 @@ class Environment:
         video_chunk_size = self.video_size[quality][self.video_chunk_counter]
 
         # use the delivery opportunity in mahimahi
-        delay = 0.0  # in ms
-        video_chunk_counter_sent = 0  # in bytes
-
-        while True:  # download video chunk over mahimahi
-            throughput = self.cooked_bw[self.mahimahi_ptr] \
-                         * B_IN_MB / BITS_IN_BYTE
-            duration = self.cooked_time[self.mahimahi_ptr] \
-                       - self.last_mahimahi_time
-
-            packet_payload = throughput * duration * PACKET_PAYLOAD_PORTION
-
-            if video_chunk_counter_sent + packet_payload > video_chunk_size:
-
-                fractional_time = (video_chunk_size - video_chunk_counter_sent) / \
-                                  throughput / PACKET_PAYLOAD_PORTION
-                delay += fractional_time
-                self.last_mahimahi_time += fractional_time
-                break
-
-            video_chunk_counter_sent += packet_payload
-            delay += duration
-            self.last_mahimahi_time = self.cooked_time[self.mahimahi_ptr]
-            self.mahimahi_ptr += 1
-
-            if self.mahimahi_ptr >= len(self.cooked_bw):
-                # loop back in the beginning
-                # note: trace file starts with time 0
-                self.mahimahi_ptr = 1
-                self.last_mahimahi_time = 0
+        delay, self.mahimahi_ptr, self.last_mahimahi_time = \
+            download_chunk(self.trace_index, self.mahimahi_ptr,
+                           self.last_mahimahi_time, video_chunk_size)  # in sec
 
         delay *= MILLISECONDS_IN_SECOND
         delay += LINK_RTT
@@ -106,21 +198,9 @@ class Environment:
                          DRAIN_BUFFER_SLEEP_TIME
             self.buffer_size -= sleep_time
 
-            while True:
-                duration = self.cooked_time[self.mahimahi_ptr] \
-                           - self.last_mahimahi_time
-                if duration > sleep_time / MILLISECONDS_IN_SECOND:
-                    self.last_mahimahi_time += sleep_time / MILLISECONDS_IN_SECOND
-                    break
-                sleep_time -= duration * MILLISECONDS_IN_SECOND
-                self.last_mahimahi_time = self.cooked_time[self.mahimahi_ptr]
-                self.mahimahi_ptr += 1
-
-                if self.mahimahi_ptr >= len(self.cooked_bw):
-                    # loop back in the beginning
-                    # note: trace file starts with time 0
-                    self.mahimahi_ptr = 1
-                    self.last_mahimahi_time = 0
+            sleep_time, self.mahimahi_ptr, self.last_mahimahi_time = \
+                skip_trace(self.trace_index, self.mahimahi_ptr,
+                           self.last_mahimahi_time, sleep_time)
 
         # the "last buffer size" return to the controller
         # Note: in old version of dash the lowest buffer is 0.
@@ -143,6 +223,7 @@ class Environment:
 
             self.cooked_time = self.all_cooked_time[self.trace_idx]
             self.cooked_bw = self.all_cooked_bw[self.trace_idx]
+            self.trace_index = self.all_trace_index[self.trace_idx]
 
             # randomize the start point of the video
             # note: trace file starts with time 0
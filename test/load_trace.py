@@ -1,26 +1,139 @@
 import os
+import sys
+import numpy as np
 
 
 COOKED_TRACE_FOLDER = './cooked_traces/'
+# a compiled trace store next to the folder, e.g. ./cooked_traces.npy holds
+# [2, total_len] float64 (time, bandwidth) of all traces back to back and
+# ./cooked_traces.index.npz holds the offsets and file names of the traces
+TRACE_STORE_DATA = '.npy'
+TRACE_STORE_INDEX = '.index.npz'
 
 
-def load_trace(cooked_trace_folder=COOKED_TRACE_FOLDER):
+def get_trace_store(cooked_trace_folder):
+    return os.path.normpath(cooked_trace_folder)
+
+
+def parse_trace(file_path):
+    cooked_time = []
+    cooked_bw = []
+    # print file_path
+    with open(file_path, 'rb') as f:
+        for line in f:
+            parse = line.split()
+            cooked_time.append(float(parse[0]))
+            cooked_bw.append(float(parse[1]))
+    return cooked_time, cooked_bw
+
+
+def compile_trace_store(cooked_trace_folder=COOKED_TRACE_FOLDER, trace_store=None):
+    """
+    Parses every trace in the folder once and writes them as a trace
+    store, which load_trace memory-maps instead of parsing the text.
+    """
+    if trace_store is None:
+        trace_store = get_trace_store(cooked_trace_folder)
+
+    cooked_files = os.listdir(cooked_trace_folder)
+    all_cooked_time = []
+    all_cooked_bw = []
+    for cooked_file in cooked_files:
+        cooked_time, cooked_bw = parse_trace(os.path.join(cooked_trace_folder, cooked_file))
+        all_cooked_time.append(cooked_time)
+        all_cooked_bw.append(cooked_bw)
+
+    offsets = np.zeros(len(cooked_files) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(cooked_bw) for cooked_bw in all_cooked_bw])
+
+    data = np.zeros((2, offsets[-1]))
+    for i in xrange(len(cooked_files)):
+        data[0, offsets[i]:offsets[i + 1]] = all_cooked_time[i]
+        data[1, offsets[i]:offsets[i + 1]] = all_cooked_bw[i]
+
+    np.save(trace_store + TRACE_STORE_DATA, data)
+    np.savez(trace_store + TRACE_STORE_INDEX,
+             offsets=offsets, file_names=np.array(cooked_files))
+
+    return trace_store
+
+
+def is_trace_store_fresh(cooked_trace_folder, trace_store):
+    """
+    The store is only used while it is newer than the folder and all
+    the traces in it.
+    """
+    for path in [trace_store + TRACE_STORE_DATA, trace_store + TRACE_STORE_INDEX]:
+        if not os.path.exists(path):
+            return False
+    if not os.path.isdir(cooked_trace_folder):
+        # only the compiled store is around
+        return True
+    store_mtime = min(os.path.getmtime(trace_store + TRACE_STORE_DATA),
+                      os.path.getmtime(trace_store + TRACE_STORE_INDEX))
+
+    if os.path.getmtime(cooked_trace_folder) > store_mtime:
+        return False
+    for cooked_file in os.listdir(cooked_trace_folder):
+        if os.path.getmtime(os.path.join(cooked_trace_folder, cooked_file)) > store_mtime:
+            return False
+    return True
+
+
+def load_trace_store(trace_store):
+    """
+    Memory-maps a compiled trace store, each trace is a read-only view
+    into the mapped file, so processes forked after loading share the
+    pages instead of holding their own copy.
+    """
+    data = np.load(trace_store + TRACE_STORE_DATA, mmap_mode='r')
+    index = np.load(trace_store + TRACE_STORE_INDEX)
+    offsets = index['offsets']
+    all_file_names = [str(file_name) for file_name in index['file_names']]
+
+    all_cooked_time = []
+    all_cooked_bw = []
+    for i in xrange(len(all_file_names)):
+        all_cooked_time.append(data[0, offsets[i]:offsets[i + 1]])
+        all_cooked_bw.append(data[1, offsets[i]:offsets[i + 1]])
+
+    return all_cooked_time, all_cooked_bw, all_file_names
+
+
+def load_trace(cooked_trace_folder=COOKED_TRACE_FOLDER, trace_store=None):
+    # a store compiled elsewhere than next to the folder is passed as trace_store
+    if trace_store is None:
+        trace_store = get_trace_store(cooked_trace_folder)
+    if is_trace_store_fresh(cooked_trace_folder, trace_store):
+        return load_trace_store(trace_store)
+
     cooked_files = os.listdir(cooked_trace_folder)
     all_cooked_time = []
     all_cooked_bw = []
     all_file_names = []
     for cooked_file in cooked_files:
         file_path = cooked_trace_folder + cooked_file
-        cooked_time = []
-        cooked_bw = []
-        # print file_path
-        with open(file_path, 'rb') as f:
-            for line in f:
-                parse = line.split()
-                cooked_time.append(float(parse[0]))
-                cooked_bw.append(float(parse[1]))
+        cooked_time, cooked_bw = parse_trace(file_path)
         all_cooked_time.append(cooked_time)
         all_cooked_bw.append(cooked_bw)
         all_file_names.append(cooked_file)
 
     return all_cooked_time, all_cooked_bw, all_file_names
+
+
+def main():
+    # usage: python load_trace.py [cooked_trace_folder] [trace_store]
+    cooked_trace_folder = COOKED_TRACE_FOLDER
+    trace_store = None
+    if len(sys.argv) > 1:
+        cooked_trace_folder = sys.argv[1]
+    if len(sys.argv) > 2:
+        trace_store = sys.argv[2]
+
+    trace_store = compile_trace_store(cooked_trace_folder, trace_store)
+    print('Compiled ' + cooked_trace_folder + ' into ' +
+          trace_store + TRACE_STORE_DATA + ' and ' + trace_store + TRACE_STORE_INDEX)
+
+
+if __name__ == '__main__':
+    main()
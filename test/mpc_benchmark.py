@@ -0,0 +1,77 @@
+import sys
+import time
+import numpy as np
+import mpc_planner
+import video_sizes
+from check_mpc_planner import random_decision
+
+
+# times one MPC decision of the scalar enumeration (the loop mpc.py and
+# the mpc servers used to run), the numpy evaluation of all combinations
+# and the branch and bound, and checks that they pick the same bitrate
+# usage: python mpc_benchmark.py [num_decisions]
+NUM_DECISIONS = 50
+HORIZONS = [3, 4, 5, 6, 7, 8]
+# the scalar enumeration gets fewer decisions on long horizons, at
+# most this many combinations in total (6^8 take about 20 sec each)
+MAX_SCALAR_COMBOS = 2000000
+VIDEO_BIT_RATE = [300, 750, 1200, 1850, 2850, 4300]  # Kbps
+REBUF_PENALTY = 4.3
+M_IN_K = 1000.0
+RANDOM_SEED = 42
+
+
+def main():
+    num_decisions = NUM_DECISIONS
+    if len(sys.argv) > 1:
+        num_decisions = int(sys.argv[1])
+
+    np.random.seed(RANDOM_SEED)
+    video_size = video_sizes.load_video_size()
+
+    engines = [('scalar', mpc_planner.plan_brute_force),
+               ('vectorized', mpc_planner.plan_vectorized),
+               ('branch_and_bound', mpc_planner.plan)]
+
+    mismatches = 0
+    for horizon in HORIZONS:
+        num_combos = len(VIDEO_BIT_RATE) ** horizon
+        num_scalar = max(1, min(num_decisions, MAX_SCALAR_COMBOS // num_combos))
+
+        # build the combination array outside of the timing
+        mpc_planner.get_combo_options(len(VIDEO_BIT_RATE), horizon)
+
+        total_time = {}
+        num_timed = {}
+        for name, _ in engines:
+            total_time[name] = 0.0
+            num_timed[name] = 0
+
+        for i in xrange(num_decisions):
+            download_times, last_quality, start_buffer = random_decision(video_size, horizon)
+            qualities = []
+            for name, engine in engines:
+                if name == 'scalar' and i >= num_scalar:
+                    continue
+                start = time.time()
+                quality, _ = engine(download_times, last_quality, start_buffer,
+                                    VIDEO_BIT_RATE, REBUF_PENALTY, M_IN_K, True)
+                total_time[name] += time.time() - start
+                num_timed[name] += 1
+                qualities.append(quality)
+            if len(set(qualities)) > 1:
+                mismatches += 1
+                print('mismatch at horizon ' + str(horizon) + ': ' + str(qualities))
+
+        result = 'horizon ' + str(horizon) + '\t' + str(num_combos) + ' combos'
+        for name, _ in engines:
+            result += '\t' + name + ': ' + \
+                str(total_time[name] / num_timed[name] * M_IN_K) + ' ms'
+        print(result)
+
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
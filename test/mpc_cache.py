@@ -0,0 +1,72 @@
+import math
+import time
+import collections
+
+
+# LRU cache of MPC decisions in front of the search, keyed by the state
+# the search depends on (buffer, last quality, chunk index, predicted
+# bandwidth) with the buffer and the bandwidth quantized into buckets.
+# consecutive requests with nearly the same state reuse the decision
+CACHE_SIZE = 10000  # decisions kept
+BUFFER_BUCKET = 0.5  # sec, 0 to not quantize
+BANDWIDTH_BUCKET = 0.05  # relative width of the bandwidth buckets, 0 to not quantize
+M_IN_K = 1000.0
+
+
+def quantize(value, bucket):
+    if bucket <= 0:
+        return value
+    return int(math.floor(value / bucket))
+
+
+class DecisionCache(object):
+    def __init__(self, size=CACHE_SIZE, buffer_bucket=BUFFER_BUCKET,
+                 bandwidth_bucket=BANDWIDTH_BUCKET):
+        self.size = size
+        self.buffer_bucket = buffer_bucket
+        # bandwidths vary over orders of magnitude, bucket the log
+        self.log_bandwidth_bucket = 0
+        if bandwidth_bucket > 0:
+            self.log_bandwidth_bucket = math.log(1 + bandwidth_bucket)
+        self.decisions = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.hit_time = 0.0
+        self.miss_time = 0.0
+
+    def get_key(self, buffer_size, last_quality, last_index, future_bandwidth):
+        log_bandwidth = math.log(max(future_bandwidth, 1e-9))
+        return (quantize(buffer_size, self.buffer_bucket), last_quality, last_index,
+                quantize(log_bandwidth, self.log_bandwidth_bucket))
+
+    def decide(self, buffer_size, last_quality, last_index, future_bandwidth, plan):
+        """
+        The cached decision for the bucket of this state, or plan()
+        (the MPC search on the exact state) on a miss.
+        """
+        start = time.time()
+        key = self.get_key(buffer_size, last_quality, last_index, future_bandwidth)
+
+        decision = self.decisions.pop(key, None)
+        if decision is not None:
+            self.decisions[key] = decision  # most recently used
+            self.hits += 1
+            self.hit_time += time.time() - start
+            return decision
+
+        decision = plan()
+        if len(self.decisions) >= self.size:
+            self.decisions.popitem(last=False)  # least recently used
+        self.decisions[key] = decision
+        self.misses += 1
+        self.miss_time += time.time() - start
+        return decision
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {'lookups': lookups,
+                'hit_rate': self.hits / float(max(lookups, 1)),
+                'hit_ms': self.hit_time / max(self.hits, 1) * M_IN_K,
+                'miss_ms': self.miss_time / max(self.misses, 1) * M_IN_K,
+                'decision_ms': (self.hit_time + self.miss_time) / max(lookups, 1) * M_IN_K}
@@ -0,0 +1,128 @@
+import sys
+import numpy as np
+import fixed_env as env
+import load_trace
+import video_sizes
+import mpc_planner
+import mpc_cache
+
+
+# runs robustMPC (as in rl_server/robust_mpc_server.py) over the traces
+# without and with the decision cache of mpc_cache.py for a grid of bucket
+# widths, and reports the reward lost to quantization, the hit rate and
+# the time per decision, to pick the buckets of the server
+# usage: python mpc_cache_loss.py [trace_folder]
+BUFFER_BUCKETS = [0.25, 0.5, 1.0, 2.0]  # sec
+BANDWIDTH_BUCKETS = [0.02, 0.05, 0.1, 0.2]  # relative
+CACHE_SIZE = mpc_cache.CACHE_SIZE
+MPC_FUTURE_CHUNK_COUNT = 5
+BITRATE_REWARD = [1, 2, 3, 12, 15, 20]  # hd reward of the server
+REBUF_PENALTY = 8
+CHUNK_TIL_VIDEO_END_CAP = 48.0
+TOTAL_VIDEO_CHUNKS = 48
+PAST_BANDWIDTHS = 5  # harmonic mean of the last 5 throughputs
+M_IN_K = 1000.0
+DEFAULT_QUALITY = 0
+VIDEO_SIZE_FILE = './video_size_'
+
+
+def run_robust_mpc(all_cooked_time, all_cooked_bw, video_size, decision_cache):
+    """
+    Plays every trace once, deciding with the cache if not None.
+    Returns the hd reward of every chunk.
+    """
+    net_env = env.Environment(all_cooked_time=all_cooked_time,
+                              all_cooked_bw=all_cooked_bw)
+    rewards = []
+    past_errors = []
+    past_bandwidth_ests = []
+    past_bandwidths = []
+
+    last_bit_rate = DEFAULT_QUALITY
+    bit_rate = DEFAULT_QUALITY
+    video_count = 0
+
+    while True:
+        delay, sleep_time, buffer_size, rebuf, \
+            video_chunk_size, next_video_chunk_sizes, \
+            end_of_video, video_chunk_remain = \
+            net_env.get_video_chunk(bit_rate)
+
+        rewards.append(BITRATE_REWARD[bit_rate] - REBUF_PENALTY * rebuf -
+                       np.abs(BITRATE_REWARD[bit_rate] - BITRATE_REWARD[last_bit_rate]))
+        last_bit_rate = bit_rate
+
+        # same bandwidth prediction as the server
+        bandwidth = float(video_chunk_size) / float(delay) / M_IN_K  # MB/sec
+        curr_error = 0
+        if len(past_bandwidth_ests) > 0:
+            curr_error = abs(past_bandwidth_ests[-1] - bandwidth) / float(bandwidth)
+        past_errors.append(curr_error)
+        past_bandwidths = (past_bandwidths + [bandwidth])[-PAST_BANDWIDTHS:]
+
+        bandwidth_sum = 0
+        for past_val in past_bandwidths:
+            bandwidth_sum += (1 / float(past_val))
+        harmonic_bandwidth = 1.0 / (bandwidth_sum / len(past_bandwidths))
+        max_error = float(max(past_errors[-PAST_BANDWIDTHS:]))
+        future_bandwidth = harmonic_bandwidth / (1 + max_error)
+        past_bandwidth_ests.append(harmonic_bandwidth)
+
+        last_index = int(CHUNK_TIL_VIDEO_END_CAP - video_chunk_remain)
+        future_chunk_length = MPC_FUTURE_CHUNK_COUNT
+        if TOTAL_VIDEO_CHUNKS - last_index < MPC_FUTURE_CHUNK_COUNT:
+            future_chunk_length = TOTAL_VIDEO_CHUNKS - last_index
+
+        def plan():
+            chunk_sizes = video_sizes.get_future_chunk_sizes(video_size, last_index, future_chunk_length)
+            download_times = mpc_planner.get_download_times(chunk_sizes, future_bandwidth)
+            quality, _ = mpc_planner.plan(download_times, bit_rate, buffer_size,
+                                          BITRATE_REWARD, REBUF_PENALTY, utility_scale=1.)
+            return quality
+
+        if decision_cache is None:
+            bit_rate = plan()
+        else:
+            bit_rate = decision_cache.decide(buffer_size, bit_rate, last_index,
+                                             future_bandwidth, plan)
+
+        if end_of_video:
+            last_bit_rate = DEFAULT_QUALITY
+            bit_rate = DEFAULT_QUALITY
+            past_bandwidths = []
+
+            video_count += 1
+            if video_count >= len(all_cooked_time):
+                break
+
+    return rewards
+
+
+def main():
+    trace_folder = load_trace.COOKED_TRACE_FOLDER
+    if len(sys.argv) > 1:
+        trace_folder = sys.argv[1]
+
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace(trace_folder)
+    video_size = video_sizes.load_video(path=VIDEO_SIZE_FILE)
+
+    exact = mpc_cache.DecisionCache(CACHE_SIZE, buffer_bucket=0, bandwidth_bucket=0)
+    exact_reward = np.mean(run_robust_mpc(all_cooked_time, all_cooked_bw, video_size, exact))
+    print('no quantization\treward: ' + str(exact_reward) +
+          '\tdecision: ' + str(exact.get_stats()['decision_ms']) + ' ms')
+
+    for buffer_bucket in BUFFER_BUCKETS:
+        for bandwidth_bucket in BANDWIDTH_BUCKETS:
+            decision_cache = mpc_cache.DecisionCache(CACHE_SIZE, buffer_bucket, bandwidth_bucket)
+            reward = np.mean(run_robust_mpc(all_cooked_time, all_cooked_bw,
+                                            video_size, decision_cache))
+            stats = decision_cache.get_stats()
+            print('buffer ' + str(buffer_bucket) + ' sec\tbandwidth ' + str(bandwidth_bucket) +
+                  '\treward: ' + str(reward) +
+                  '\tloss: ' + str((exact_reward - reward) / abs(exact_reward) * 100) + '%' +
+                  '\thit rate: ' + str(stats['hit_rate']) +
+                  '\tdecision: ' + str(stats['decision_ms']) + ' ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import itertools
+import numpy as np
+
+
+# exact branch and bound for the MPC horizon, in place of enumerating all
+# itertools.product(range(A_DIM), repeat=horizon) bitrate combinations.
+# the combinations are visited in the same order and their rewards are
+# accumulated with the same floating point operations as the enumeration,
+# a subtree is only cut when no combination in it can reach the best
+# reward, so the chosen bitrate is the one the enumeration would pick
+VIDEO_CHUNK_LEN = 4  # sec, buffer gained per downloaded chunk
+MAX_REWARD_INIT = -100000000
+BOUND_EPS = 1e-9  # slack on the bound for the rounding in the reward
+
+
+def get_download_times(chunk_sizes, future_bandwidth):
+    """
+    chunk_sizes[position][quality] in bytes of the chunks in the
+    horizon, future_bandwidth in MB/sec. Returns the download times
+    in sec, computed as in the enumeration.
+    """
+    download_times = []
+    for sizes in chunk_sizes:
+        download_times.append([(size / 1000000.) / future_bandwidth for size in sizes])
+    return download_times
+
+
+def get_reward_bounds(bitrate_utility, horizon):
+    """
+    bounds[r][q] is the most utility minus smoothness penalty that r more
+    chunks can add after quality q, regardless of rebuffering: a sequence
+    peaking at utility u earns at most r * u and pays at least |u - u_q|.
+    """
+    bounds = [[0] * len(bitrate_utility)]
+    for r in xrange(1, horizon + 1):
+        bounds.append([max([r * u - abs(u - u_q) for u in bitrate_utility])
+                       for u_q in bitrate_utility])
+    return bounds
+
+
+def get_combo_reward(combo, download_times, last_quality, start_buffer,
+                     bitrate_utility, rebuf_penalty, utility_scale=1.):
+    # the reward of one combination, as in the enumeration
+    curr_rebuffer_time = 0
+    curr_buffer = start_buffer
+    bitrate_sum = 0
+    smoothness_diffs = 0
+    for position in xrange(len(combo)):
+        chunk_quality = combo[position]
+        download_time = download_times[position][chunk_quality]
+        if curr_buffer < download_time:
+            curr_rebuffer_time += (download_time - curr_buffer)
+            curr_buffer = 0
+        else:
+            curr_buffer -= download_time
+        curr_buffer += VIDEO_CHUNK_LEN
+        bitrate_sum += bitrate_utility[chunk_quality]
+        smoothness_diffs += abs(bitrate_utility[chunk_quality] - bitrate_utility[last_quality])
+        last_quality = chunk_quality
+
+    return (bitrate_sum / utility_scale) - (rebuf_penalty * curr_rebuffer_time) \
+        - (smoothness_diffs / utility_scale)
+
+
+def plan(download_times, last_quality, start_buffer,
+         bitrate_utility, rebuf_penalty, utility_scale=1., later_wins=False):
+    """
+    Finds the bitrate combination over the horizon (one list of download
+    times per position) with the highest
+    bitrate_sum / utility_scale - rebuf_penalty * rebuffer - smoothness / utility_scale.
+    Among combinations with the same reward the first one in enumeration
+    order wins (reward > max_reward), or the last one with later_wins
+    (reward >= max_reward). Returns the first quality and the reward of
+    the combination, quality 0 for an empty horizon.
+    """
+    horizon = len(download_times)
+    if horizon == 0:
+        return 0, 0.0
+
+    num_qualities = len(bitrate_utility)
+    reward_bounds = get_reward_bounds(bitrate_utility, horizon)
+
+    # staying at one quality is usually close to the best, these rewards
+    # only tighten the bound, the choice is left to the search
+    bound = MAX_REWARD_INIT
+    for quality in xrange(num_qualities):
+        bound = max(bound, get_combo_reward([quality] * horizon, download_times,
+                                            last_quality, start_buffer,
+                                            bitrate_utility, rebuf_penalty, utility_scale))
+
+    # best reward and first quality so far, shared with search
+    best = [MAX_REWARD_INIT, None, bound]
+
+    def search(position, last_quality, curr_buffer, curr_rebuffer_time,
+               bitrate_sum, smoothness_diffs, first_quality):
+        remain = horizon - position
+        for chunk_quality in xrange(num_qualities):
+            download_time = download_times[position][chunk_quality]
+            rebuffer_time = curr_rebuffer_time
+            if curr_buffer < download_time:
+                rebuffer_time += (download_time - curr_buffer)
+                buffer_size = 0
+            else:
+                buffer_size = curr_buffer - download_time
+            buffer_size += VIDEO_CHUNK_LEN
+            chunk_bitrate_sum = bitrate_sum + bitrate_utility[chunk_quality]
+            chunk_smoothness_diffs = smoothness_diffs + \
+                abs(bitrate_utility[chunk_quality] - bitrate_utility[last_quality])
+            if position == 0:
+                first_quality = chunk_quality
+
+            if remain == 1:
+                reward = (chunk_bitrate_sum / utility_scale) - (rebuf_penalty * rebuffer_time) \
+                    - (chunk_smoothness_diffs / utility_scale)
+                if reward > best[0] or (later_wins and reward >= best[0]):
+                    best[0] = reward
+                    best[1] = first_quality
+                    best[2] = max(best[2], reward)
+                continue
+
+            # rebuffering never goes down, the rest is bounded by reward_bounds
+            upper_bound = ((chunk_bitrate_sum + reward_bounds[remain - 1][chunk_quality]) / utility_scale) \
+                - (rebuf_penalty * rebuffer_time) - (chunk_smoothness_diffs / utility_scale)
+            if upper_bound + BOUND_EPS < best[2]:
+                continue
+
+            search(position + 1, chunk_quality, buffer_size, rebuffer_time,
+                   chunk_bitrate_sum, chunk_smoothness_diffs, first_quality)
+
+    search(0, last_quality, start_buffer, 0, 0, 0, None)
+
+    return best[1], best[0]
+
+
+# all bitrate combinations as an int array per (number of qualities, horizon)
+combo_options = {}
+
+
+def get_combo_options(num_qualities, horizon):
+    """
+    The combinations of itertools.product(range(num_qualities),
+    repeat=horizon) as a [num_qualities ** horizon, horizon] array,
+    in the same order, built once per shape.
+    """
+    if (num_qualities, horizon) not in combo_options:
+        combo_options[(num_qualities, horizon)] = \
+            np.indices([num_qualities] * horizon, dtype=np.int8).reshape(horizon, -1).T.copy()
+    return combo_options[(num_qualities, horizon)]
+
+
+def plan_vectorized(download_times, last_quality, start_buffer,
+                    bitrate_utility, rebuf_penalty, utility_scale=1., later_wins=False):
+    """
+    Same as plan, but evaluates every combination at once with numpy,
+    one step of the buffer trajectory per position of the horizon.
+    """
+    horizon = len(download_times)
+    if horizon == 0:
+        return 0, 0.0
+
+    num_qualities = len(bitrate_utility)
+    combos = get_combo_options(num_qualities, horizon)
+    download_times = np.array(download_times, dtype=np.float64)
+    bitrate_utility = np.array(bitrate_utility)
+
+    curr_buffer = np.empty(len(combos))
+    curr_buffer.fill(start_buffer)
+    curr_rebuffer_time = np.zeros(len(combos))
+    for position in xrange(horizon):
+        download_time = download_times[position][combos[:, position]]
+        stall = curr_buffer < download_time
+        curr_rebuffer_time = np.where(stall, curr_rebuffer_time + (download_time - curr_buffer),
+                                      curr_rebuffer_time)
+        curr_buffer = np.where(stall, 0, curr_buffer - download_time)
+        curr_buffer += VIDEO_CHUNK_LEN
+
+    utility = bitrate_utility[combos]
+    bitrate_sum = np.sum(utility, axis=1)
+    smoothness_diffs = np.abs(utility[:, 0] - bitrate_utility[last_quality]) + \
+        np.sum(np.abs(np.diff(utility, axis=1)), axis=1)
+
+    rewards = (bitrate_sum / utility_scale) - (rebuf_penalty * curr_rebuffer_time) \
+        - (smoothness_diffs / utility_scale)
+
+    if later_wins:
+        best_combo = len(rewards) - 1 - np.argmax(rewards[::-1])
+    else:
+        best_combo = np.argmax(rewards)
+
+    return int(combos[best_combo, 0]), rewards[best_combo]
+
+
+def plan_brute_force(download_times, last_quality, start_buffer,
+                     bitrate_utility, rebuf_penalty, utility_scale=1., later_wins=False):
+    # reference for plan, enumerates every combination
+    max_reward = MAX_REWARD_INIT
+    best_quality = 0
+    for combo in itertools.product(range(len(bitrate_utility)), repeat=len(download_times)):
+        reward = get_combo_reward(combo, download_times, last_quality, start_buffer,
+                                  bitrate_utility, rebuf_penalty, utility_scale)
+        if reward > max_reward or (later_wins and reward >= max_reward):
+            max_reward = reward
+            best_quality = 0
+            if len(combo) > 0:
+                best_quality = combo[0]
+    return best_quality, max_reward
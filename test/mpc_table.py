@@ -0,0 +1,143 @@
+import os
+import sys
+import math
+import time
+import numpy as np
+import multiprocessing as mp
+import mpc_planner
+import video_sizes
+
+
+# offline FastMPC: solves the MPC of mpc_server.py for every state of a
+# discretized (chunk index, last quality, bandwidth, buffer) grid and
+# stores the first bitrate of each in an int8 table, the server then
+# answers with one array index instead of a search
+# usage: python mpc_table.py [num_workers] [video manifest or video_size_ prefix] [table]
+MPC_TABLE = './mpc_table.npz'
+NUM_WORKERS = 4
+A_DIM = 6
+MPC_FUTURE_CHUNK_COUNT = 5
+TOTAL_VIDEO_CHUNKS = 48
+BITRATE_REWARD = [1, 2, 3, 12, 15, 20]  # hd reward, as mpc_server.py
+REBUF_PENALTY = 8
+BUFFER_STEP = 1.0  # sec
+MAX_BUFFER = 60.0  # sec, the player keeps at most 60 sec
+MIN_BANDWIDTH = 0.02  # MB/sec
+MAX_BANDWIDTH = 8.0  # MB/sec
+NUM_BANDWIDTHS = 50  # spaced evenly in log
+
+
+def get_future_chunk_length(last_index):
+    # as mpc_server.py (try 4 if that many remaining)
+    future_chunk_length = MPC_FUTURE_CHUNK_COUNT
+    if TOTAL_VIDEO_CHUNKS - last_index < 4:
+        future_chunk_length = TOTAL_VIDEO_CHUNKS - last_index
+    return future_chunk_length
+
+
+def get_grid(buffer_step=BUFFER_STEP, max_buffer=MAX_BUFFER, min_bandwidth=MIN_BANDWIDTH,
+             max_bandwidth=MAX_BANDWIDTH, num_bandwidths=NUM_BANDWIDTHS):
+    # [buffer_step, num_buffers, log min bandwidth, log bandwidth step, num_bandwidths]
+    num_buffers = int(round(max_buffer / buffer_step)) + 1
+    log_step = (math.log(max_bandwidth) - math.log(min_bandwidth)) / (num_bandwidths - 1)
+    return np.array([buffer_step, num_buffers, math.log(min_bandwidth), log_step, num_bandwidths])
+
+
+def solve_chunk(video_size, grid, last_index):
+    """
+    The [last quality, bandwidth, buffer] slice of the table for one
+    chunk index, each entry planned at its grid point.
+    """
+    buffer_step, num_buffers, log_min_bandwidth, log_step, num_bandwidths = grid
+    num_buffers = int(num_buffers)
+    num_bandwidths = int(num_bandwidths)
+
+    chunk_sizes = video_sizes.get_future_chunk_sizes(
+        video_size, last_index, get_future_chunk_length(last_index))
+
+    table = np.zeros((A_DIM, num_bandwidths, num_buffers), dtype=np.int8)
+    for b in xrange(num_bandwidths):
+        future_bandwidth = math.exp(log_min_bandwidth + b * log_step)
+        download_times = mpc_planner.get_download_times(chunk_sizes, future_bandwidth)
+        for last_quality in xrange(A_DIM):
+            for n in xrange(num_buffers):
+                quality, _ = mpc_planner.plan(download_times, last_quality, n * buffer_step,
+                                              BITRATE_REWARD, REBUF_PENALTY, utility_scale=1.)
+                table[last_quality, b, n] = quality
+    return table
+
+
+def worker(worker_id, num_workers, video_size, grid, result_queue):
+    for last_index in xrange(worker_id, TOTAL_VIDEO_CHUNKS + 1, num_workers):
+        result_queue.put((last_index, solve_chunk(video_size, grid, last_index)))
+
+
+def build(video_size, grid, num_workers=NUM_WORKERS):
+    # chunk indices 0 to TOTAL_VIDEO_CHUNKS, split across the workers
+    result_queue = mp.Queue()
+    workers = []
+    for i in xrange(num_workers):
+        workers.append(mp.Process(target=worker,
+                                  args=(i, num_workers, video_size, grid, result_queue)))
+    for i in xrange(num_workers):
+        workers[i].start()
+
+    table = np.zeros((TOTAL_VIDEO_CHUNKS + 1, A_DIM, int(grid[4]), int(grid[1])), dtype=np.int8)
+    for _ in xrange(TOTAL_VIDEO_CHUNKS + 1):
+        last_index, chunk_table = result_queue.get()
+        table[last_index] = chunk_table
+
+    for i in xrange(num_workers):
+        workers[i].join()
+    return table
+
+
+def save_table(table_path, table, grid):
+    with open(table_path, 'wb') as f:
+        np.savez_compressed(f, table=table, grid=grid)
+
+
+def load_table(table_path=MPC_TABLE):
+    # the flat table and the grid, for lookup
+    with np.load(table_path) as data:
+        table = data['table']
+        grid = data['grid']
+    return [table.ravel().tolist(), table.shape, grid.tolist()]
+
+
+def lookup(mpc_table, last_index, last_quality, future_bandwidth, buffer_size):
+    # the first bitrate planned at the nearest grid point
+    table, shape, grid = mpc_table
+    buffer_step, num_buffers, log_min_bandwidth, log_step, num_bandwidths = grid
+
+    last_index = min(max(int(last_index), 0), shape[0] - 1)
+    b = int(round((math.log(max(future_bandwidth, 1e-9)) - log_min_bandwidth) / log_step))
+    b = min(max(b, 0), shape[2] - 1)
+    n = min(max(int(round(buffer_size / buffer_step)), 0), shape[3] - 1)
+    return table[((last_index * shape[1] + last_quality) * shape[2] + b) * shape[3] + n]
+
+
+def main():
+    num_workers = NUM_WORKERS
+    video_path = video_sizes.VIDEO_MANIFEST
+    table_path = MPC_TABLE
+    if len(sys.argv) > 1:
+        num_workers = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        video_path = sys.argv[2]
+    if len(sys.argv) > 3:
+        table_path = sys.argv[3]
+
+    video_size = video_sizes.load_video(path=video_path)
+    grid = get_grid()
+
+    start = time.time()
+    table = build(video_size, grid, num_workers)
+    save_table(table_path, table, grid)
+    print('table ' + str(table.shape) + ' (' + str(table.nbytes) + ' bytes) built in ' +
+          str(time.time() - start) + ' sec with ' + str(num_workers) + ' workers, saved to ' +
+          os.path.abspath(table_path))
+
+
+if __name__ == '__main__':
+    main()
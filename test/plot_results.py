@@ -1,6 +1,6 @@
-import os
 import numpy as np
 import matplotlib.pyplot as plt
+import results_loader
 
 
 RESULTS_FOLDER = './results/'
@@ -32,82 +32,51 @@ def main():
 		buff_all[scheme] = {}
 		bw_all[scheme] = {}
 
-	log_files = os.listdir(RESULTS_FOLDER)
-	for log_file in log_files:
-
-		time_ms = []
-		bit_rate = []
-		buff = []
-		bw = []
-		reward = []
+	all_videos = results_loader.load_results(RESULTS_FOLDER)
+	for log_file in all_videos:
 
 		print log_file
 
-		with open(RESULTS_FOLDER + log_file, 'rb') as f:
-			if SIM_DP in log_file:
-				last_t = 0
-				last_b = 0
-				last_q = 1
-				lines = []
-				for line in f:
-					lines.append(line)
-					parse = line.split()
-					if len(parse) >= 6:
-						time_ms.append(float(parse[3]))
-						bit_rate.append(VIDEO_BIT_RATE[int(parse[6])])
-						buff.append(float(parse[4]))
-						bw.append(float(parse[5]))
-				
-				for line in reversed(lines):
-					parse = line.split()
-					r = 0
-					if len(parse) > 1:
-						t = float(parse[3])
-						b = float(parse[4])
-						q = int(parse[6])
-						if b == 4:
-							rebuff = (t - last_t) - last_b
-							assert rebuff >= -1e-4
-							r -= REBUF_P * rebuff
-
-						r += VIDEO_BIT_RATE[q] / K_IN_M
-						r -= SMOOTH_P * np.abs(VIDEO_BIT_RATE[q] - VIDEO_BIT_RATE[last_q]) / K_IN_M
-						reward.append(r)
-
-						last_t = t
-						last_b = b
-						last_q = q
-
-			else:
-				for line in f:
-					parse = line.split()
-					if len(parse) <= 1:
-						break
-					time_ms.append(float(parse[0]))
-					bit_rate.append(int(parse[1]))
-					buff.append(float(parse[2]))
-					bw.append(float(parse[4]) / float(parse[5]) * BITS_IN_BYTE * MILLISEC_IN_SEC / M_IN_B)
-					reward.append(float(parse[6]))
-
-		if SIM_DP in log_file:
-			time_ms = time_ms[::-1]
-			bit_rate = bit_rate[::-1]
-			buff = buff[::-1]
-			bw = bw[::-1]
-		
-		time_ms = np.array(time_ms)
+		scheme, trace = results_loader.match_scheme(log_file, SCHEMES)
+		if scheme is None:
+			continue
+
+		if scheme == SIM_DP:
+			# from the first chunk to the last
+			_, rows = results_loader.load_dp_log(RESULTS_FOLDER + log_file, all_videos[log_file])
+			t = rows[:, results_loader.DP_TIME]
+			b = rows[:, results_loader.DP_BUFFER]
+			q = rows[:, results_loader.DP_BIT_RATE].astype(int)
+			time_ms = np.array(t)
+			bit_rate = np.array(VIDEO_BIT_RATE)[q]
+			buff = b
+			bw = rows[:, results_loader.DP_BANDWIDTH]
+
+			last_t = np.concatenate([[0], t[:-1]])
+			last_b = np.concatenate([[0], b[:-1]])
+			last_q = np.concatenate([[1], q[:-1]])
+			rebuff = np.where(b == 4, (t - last_t) - last_b, 0)
+			assert np.all(rebuff >= -1e-4)
+			reward = bit_rate / K_IN_M \
+				- REBUF_P * rebuff \
+				- SMOOTH_P * np.abs(bit_rate - np.array(VIDEO_BIT_RATE)[last_q]) / K_IN_M
+
+		else:
+			video = results_loader.get_video(all_videos[log_file])
+			time_ms = np.array(video[:, results_loader.TIME_STAMP])
+			bit_rate = video[:, results_loader.BIT_RATE].astype(int)
+			buff = video[:, results_loader.BUFFER_SIZE]
+			bw = video[:, results_loader.CHUNK_SIZE] / video[:, results_loader.DOWNLOAD_TIME] * \
+				BITS_IN_BYTE * MILLISEC_IN_SEC / M_IN_B
+			reward = video[:, results_loader.REWARD]
+
 		time_ms -= time_ms[0]
-		
-		# print log_file
 
-		for scheme in SCHEMES:
-			if scheme in log_file:
-				time_all[scheme][log_file[len('log_' + str(scheme) + '_'):]] = time_ms
-				bit_rate_all[scheme][log_file[len('log_' + str(scheme) + '_'):]] = bit_rate
-				buff_all[scheme][log_file[len('log_' + str(scheme) + '_'):]] = buff
-				bw_all[scheme][log_file[len('log_' + str(scheme) + '_'):]] = bw
-				raw_reward_all[scheme][log_file[len('log_' + str(scheme) + '_'):]] = reward
-				break
+		time_all[scheme][trace] = time_ms
+		bit_rate_all[scheme][trace] = bit_rate
+		buff_all[scheme][trace] = buff
+		bw_all[scheme][trace] = bw
+		raw_reward_all[scheme][trace] = reward
 
 	# ---- ---- ---- ----
 	# Reward records
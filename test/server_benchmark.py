@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import urllib2
+import httplib
+import subprocess
+import numpy as np
+import multiprocessing as mp
+import load_trace
+import fixed_env as env
+
+
+# plays videos on the traces with virtual dash.js players against the ABR
+# servers of rl_server/, without a browser: each player downloads chunks
+# with the download model of fixed_env.py, posts what dash.js posts after
+# every chunk and plays the bitrate the server answers. the players do not
+# wait for the video time to pass, so the servers get requests as fast as
+# they answer. prints the decisions per second and the latency percentiles
+# of every server, and the batch sizes of the servers that batch their
+# inference (STATS_PATH). only abr_server.py keeps a state per player (by
+# the sessionID of the POST), the other servers keep a single one that the
+# concurrent players interleave in: their throughput and latency hold, but
+# their decisions are not those of separate sessions, the report says so
+# usage: python server_benchmark.py [num_clients] [num_videos] ['server script [args]' ...]
+SERVERS = ['../rl_server/simple_server.py',
+           '../rl_server/mpc_server.py',
+           '../rl_server/robust_mpc_server.py',
+           '../rl_server/rl_server_no_training.py',
+           '../rl_server/abr_server.py mpc',
+           '../rl_server/abr_server.py robust_mpc',
+           '../rl_server/abr_server.py rl']
+MULTI_SESSION_SERVERS = ['abr_server.py']
+SERVER_URL = 'http://localhost:8333'
+STATS_PATH = '/stats'  # rl_server_no_training.py, the batch sizes of its inference
+SERVER_START_TIME = 10.0  # sec, wait before the first request
+NUM_CLIENTS = 8  # concurrent players
+NUM_VIDEOS = 2  # per player
+DEFAULT_QUALITY = 0  # the first chunk, as the servers assume
+TOTAL_VIDEO_CHUNKS = 48
+PERCENTILES = [50, 90, 99]
+M_IN_K = 1000.0
+RANDOM_SEED = 42
+
+
+def play(client_id, num_videos, all_cooked_time, all_cooked_bw, result_queue):
+    # player client_id starts on trace client_id, so that concurrent players
+    # see different networks
+    start = client_id % len(all_cooked_time)
+    net_env = env.Environment(all_cooked_time=all_cooked_time[start:] + all_cooked_time[:start],
+                              all_cooked_bw=all_cooked_bw[start:] + all_cooked_bw[:start],
+                              random_seed=RANDOM_SEED + client_id)
+    session_id = 'client_' + str(client_id)
+
+    latencies = []
+    errors = 0
+    for video in xrange(num_videos):
+        bit_rate = DEFAULT_QUALITY
+        time_stamp = 0  # ms
+        total_rebuf = 0  # ms
+        end_of_video = False
+        chunk_index = 0
+
+        while not end_of_video:
+            delay, sleep_time, buffer_size, rebuf, video_chunk_size, \
+                next_video_chunk_sizes, end_of_video, video_chunk_remain = \
+                net_env.get_video_chunk(bit_rate)
+            chunk_index += 1
+            total_rebuf += rebuf * M_IN_K
+
+            post_data = {'lastquality': bit_rate,
+                         'buffer': buffer_size,
+                         'RebufferTime': total_rebuf,
+                         'lastChunkStartTime': time_stamp,
+                         'lastChunkFinishTime': time_stamp + delay,
+                         'lastChunkSize': video_chunk_size,
+                         'lastRequest': chunk_index,
+                         'sessionID': session_id}
+            time_stamp += delay + sleep_time
+
+            request_start = time.time()
+            try:
+                response = urllib2.urlopen(SERVER_URL, json.dumps(post_data)).read()
+            except (urllib2.URLError, httplib.HTTPException, IOError):
+                errors += 1
+                continue
+            latencies.append(time.time() - request_start)
+
+            # simple_server.py only logs and answers nothing, the player keeps its bitrate
+            if response != 'REFRESH' and response != '':
+                bit_rate = int(response)
+
+    result_queue.put((latencies, errors))
+
+
+def run_clients(num_clients, num_videos, all_cooked_time, all_cooked_bw):
+    result_queue = mp.Queue()
+    clients = [mp.Process(target=play,
+                          args=(i, num_videos, all_cooked_time, all_cooked_bw, result_queue))
+               for i in xrange(num_clients)]
+
+    start = time.time()
+    for client in clients:
+        client.start()
+    latencies = []
+    errors = 0
+    for i in xrange(num_clients):
+        client_latencies, client_errors = result_queue.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    elapsed = time.time() - start
+    for client in clients:
+        client.join()
+
+    return np.array(latencies), errors, elapsed
+
+
+def get_batch_stats():
+    # the inference batch stats of the server, None if it has none
+    try:
+        return json.loads(urllib2.urlopen(SERVER_URL + STATS_PATH).read())
+    except (urllib2.URLError, httplib.HTTPException, IOError, ValueError):
+        return None
+
+
+def benchmark(server, num_clients, num_videos, all_cooked_time, all_cooked_bw):
+    # the script and its arguments, e.g. '../rl_server/abr_server.py mpc'
+    server_args = server.split()
+    per_session = os.path.basename(server_args[0]) in MULTI_SESSION_SERVERS
+
+    # the servers find ./results and ../video_server from their own folder
+    server_dir = os.path.dirname(os.path.abspath(server_args[0]))
+    with open(os.devnull, 'wb') as devnull:
+        server_process = subprocess.Popen([sys.executable, os.path.basename(server_args[0])] +
+                                          server_args[1:],
+                                          cwd=server_dir, stdout=devnull, stderr=devnull)
+    time.sleep(SERVER_START_TIME)
+
+    try:
+        if server_process.poll() is not None:
+            print(server + '\tdid not start')
+            return
+        latencies, errors, elapsed = run_clients(num_clients, num_videos,
+                                                 all_cooked_time, all_cooked_bw)
+        batch_stats = get_batch_stats()
+    finally:
+        if server_process.poll() is None:
+            server_process.terminate()
+            server_process.wait()
+
+    report = server + '\tplayers: ' + str(num_clients) + \
+             '\tsessions: ' + ('per player' if per_session else 'shared, decisions interleaved') + \
+             '\tdecisions: ' + str(len(latencies)) + \
+             '\terrors: ' + str(errors) + \
+             '\tdecisions/sec: ' + str(len(latencies) / elapsed)
+    if len(latencies) > 0:
+        for percentile in PERCENTILES:
+            report += '\tp' + str(percentile) + ': ' + \
+                      str(np.percentile(latencies, percentile) * M_IN_K) + ' ms'
+    if batch_stats is not None and batch_stats['batches'] > 0:
+        batch_sizes = batch_stats['batch_sizes']
+        report += '\tinference batches: ' + str(batch_stats['batches']) + \
+                  '\tmean batch: ' + \
+                  str(sum(int(size) * count for size, count in batch_sizes.items()) /
+                      float(batch_stats['batches'])) + \
+                  '\tmax batch: ' + str(max(int(size) for size in batch_sizes))
+    print(report)
+    sys.stdout.flush()
+
+
+def main():
+    num_clients = NUM_CLIENTS
+    num_videos = NUM_VIDEOS
+    servers = SERVERS
+    if len(sys.argv) > 1:
+        num_clients = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        num_videos = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        servers = sys.argv[3:]
+
+    all_cooked_time, all_cooked_bw, _ = load_trace.load_trace()
+    all_cooked_time = list(all_cooked_time)
+    all_cooked_bw = list(all_cooked_bw)
+
+    print(str(num_clients) + ' players, ' + str(num_videos) + ' videos each, ' +
+          str(TOTAL_VIDEO_CHUNKS) + ' chunks per video')
+    for server in servers:
+        benchmark(server, num_clients, num_videos, all_cooked_time, all_cooked_bw)
+
+
+if __name__ == '__main__':
+    main()